@@ -1,5 +1,6 @@
 import os
 import logging
+from datetime import datetime
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_apscheduler import APScheduler
@@ -15,6 +16,26 @@ logger = logging.getLogger('db_monitor')
 db = SQLAlchemy()
 scheduler = APScheduler()
 
+
+def _add_missing_columns():
+    """
+    为已存在的表补充模型中新增的列（create_all 不会修改已有表）
+    """
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                logger.info(f"Added column {table.name}.{column.name}")
+
 def create_app():
     app = Flask(__name__)
     
@@ -22,11 +43,121 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///monitor.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # 流式查询：每块行数、最大行数、最大字节数（0 表示不限制）
+    app.config['QUERY_STREAM_CHUNK_SIZE'] = int(os.environ.get('QUERY_STREAM_CHUNK_SIZE', 1000))
+    app.config['QUERY_STREAM_MAX_ROWS'] = int(os.environ.get('QUERY_STREAM_MAX_ROWS', 1000000))
+    app.config['QUERY_STREAM_MAX_BYTES'] = int(os.environ.get('QUERY_STREAM_MAX_BYTES', 512 * 1024 * 1024))
+    # 只读查询结果缓存：总字节上限、默认 TTL（秒）
+    app.config['QUERY_CACHE_MAX_BYTES'] = int(os.environ.get('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    app.config['QUERY_CACHE_TTL'] = int(os.environ.get('QUERY_CACHE_TTL', 300))
+    # 查询超时（秒，0 表示不限制）：手动查询默认值、定时任务默认值
+    app.config['QUERY_TIMEOUT'] = int(os.environ.get('QUERY_TIMEOUT', 300))
+    app.config['TASK_QUERY_TIMEOUT'] = int(os.environ.get('TASK_QUERY_TIMEOUT', 600))
+    # 定时任务执行时间超过该值（秒）时自动采集执行计划，0 表示仅按任务配置采集
+    app.config['TASK_PLAN_THRESHOLD'] = float(os.environ.get('TASK_PLAN_THRESHOLD', 0))
+    # 定时任务执行池：线程数、每个目标库默认的并发任务数、最多排队任务数
+    app.config['TASK_EXECUTOR_WORKERS'] = int(os.environ.get('TASK_EXECUTOR_WORKERS', 8))
+    app.config['TASK_DB_CONCURRENCY'] = int(os.environ.get('TASK_DB_CONCURRENCY', 2))
+    app.config['TASK_QUEUE_MAX'] = int(os.environ.get('TASK_QUEUE_MAX', 500))
+    # 后台查询任务：线程数、最多排队任务数、结果保留时间（秒）、最大行数
+    app.config['QUERY_JOB_WORKERS'] = int(os.environ.get('QUERY_JOB_WORKERS', 4))
+    app.config['QUERY_JOB_MAX_PENDING'] = int(os.environ.get('QUERY_JOB_MAX_PENDING', 50))
+    app.config['QUERY_JOB_RESULT_TTL'] = int(os.environ.get('QUERY_JOB_RESULT_TTL', 3600))
+    app.config['QUERY_JOB_MAX_ROWS'] = int(os.environ.get('QUERY_JOB_MAX_ROWS', 5000000))
+    # 服务端聚合：实时查询最多读取的行数
+    app.config['QUERY_AGG_MAX_ROWS'] = int(os.environ.get('QUERY_AGG_MAX_ROWS', 2000000))
+
+    # 多库并发查询：共享线程池大小、定时任务等待目标库并发名额的最长时间（秒）
+    app.config['FANOUT_MAX_WORKERS'] = int(os.environ.get('FANOUT_MAX_WORKERS', 8))
+    app.config['FANOUT_SLOT_TIMEOUT'] = int(os.environ.get('FANOUT_SLOT_TIMEOUT', 300))
+
+    # 定时任务结果归档：根目录、默认保留天数、每个任务的默认总大小上限（MB，0 表示不限制）
+    app.config['RESULT_ARCHIVE_DIR'] = os.environ.get('RESULT_ARCHIVE_DIR', os.path.join(os.getcwd(), 'results'))
+    app.config['RESULT_RETENTION_DAYS'] = int(os.environ.get('RESULT_RETENTION_DAYS', 30))
+    app.config['RESULT_RETENTION_MAX_MB'] = int(os.environ.get('RESULT_RETENTION_MAX_MB', 0))
+
+    # 目标库引擎缓存：最多缓存的引擎数、空闲释放时间（秒）
+    app.config['ENGINE_CACHE_MAX_SIZE'] = int(os.environ.get('ENGINE_CACHE_MAX_SIZE', 50))
+    app.config['ENGINE_IDLE_TIMEOUT'] = int(os.environ.get('ENGINE_IDLE_TIMEOUT', 1800))
+    # 只读副本连接失败后跳过的时间（秒）
+    app.config['REPLICA_RETRY_SECONDS'] = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+    # 表结构搜索索引：检查新增 / 修改的数据库的间隔、每个数据库的最长重新加载间隔（秒）、并发加载线程数
+    app.config['SCHEMA_CATALOG_INTERVAL'] = int(os.environ.get('SCHEMA_CATALOG_INTERVAL', 60))
+    app.config['SCHEMA_CATALOG_MAX_AGE'] = int(os.environ.get('SCHEMA_CATALOG_MAX_AGE', 600))
+    app.config['SCHEMA_CATALOG_WORKERS'] = int(os.environ.get('SCHEMA_CATALOG_WORKERS', 8))
+    # 数据库连通性检查：并发线程数、连接超时、读取超时（秒）
+    app.config['HEALTH_CHECK_WORKERS'] = int(os.environ.get('HEALTH_CHECK_WORKERS', 16))
+    app.config['HEALTH_CONNECT_TIMEOUT'] = float(os.environ.get('HEALTH_CONNECT_TIMEOUT', 5))
+    app.config['HEALTH_READ_TIMEOUT'] = float(os.environ.get('HEALTH_READ_TIMEOUT', 5))
+    # 连接预热：启动和添加/修改数据库时是否预热 min_idle 个连接；保活检查间隔（秒，0 表示不保活）
+    app.config['POOL_WARMUP'] = os.environ.get('POOL_WARMUP', '1') == '1'
+    app.config['POOL_KEEPALIVE_INTERVAL'] = int(os.environ.get('POOL_KEEPALIVE_INTERVAL', 60))
     
     # 初始化扩展
     db.init_app(app)
+    from app.utils.result_cache import result_cache
+    result_cache.configure(max_bytes=app.config['QUERY_CACHE_MAX_BYTES'],
+                           default_ttl=app.config['QUERY_CACHE_TTL'])
     scheduler.init_app(app)
     scheduler.start()
+
+    from app.utils.database_helper import DatabaseHelper
+    DatabaseHelper.configure_engine_cache(max_size=app.config['ENGINE_CACHE_MAX_SIZE'],
+                                          idle_timeout=app.config['ENGINE_IDLE_TIMEOUT'])
+    from app.utils.query_jobs import job_manager
+    job_manager.configure(max_workers=app.config['QUERY_JOB_WORKERS'],
+                          max_pending=app.config['QUERY_JOB_MAX_PENDING'],
+                          result_ttl=app.config['QUERY_JOB_RESULT_TTL'])
+    from app.utils.task_executor import task_executor
+    task_executor.configure(max_workers=app.config['TASK_EXECUTOR_WORKERS'],
+                            per_db_limit=app.config['TASK_DB_CONCURRENCY'],
+                            max_queue=app.config['TASK_QUEUE_MAX'])
+    from app.utils.replica_router import replica_router
+    replica_router.configure(retry_seconds=app.config['REPLICA_RETRY_SECONDS'])
+    from app.utils.schema_catalog import schema_catalog
+    schema_catalog.configure(max_age=app.config['SCHEMA_CATALOG_MAX_AGE'],
+                             max_workers=app.config['SCHEMA_CATALOG_WORKERS'])
+    from app.utils.fanout import fanout_runner
+    fanout_runner.configure(max_workers=app.config['FANOUT_MAX_WORKERS'],
+                            slot_timeout=app.config['FANOUT_SLOT_TIMEOUT'])
+    from app.utils.result_archive import result_archiver
+    result_archiver.configure(root=app.config['RESULT_ARCHIVE_DIR'],
+                              retention_days=app.config['RESULT_RETENTION_DAYS'],
+                              retention_max_mb=app.config['RESULT_RETENTION_MAX_MB'])
+    # 定期清理过期的后台查询结果
+    scheduler.add_job(
+        id='cleanup_query_jobs',
+        func='app.utils.query_jobs:job_manager.cleanup_expired',
+        trigger='interval',
+        minutes=5,
+        replace_existing=True
+    )
+    # 定期释放空闲的目标库连接池
+    scheduler.add_job(
+        id='evict_idle_engines',
+        func='app.utils.database_helper:DatabaseHelper.evict_idle_engines',
+        trigger='interval',
+        minutes=1,
+        replace_existing=True
+    )
+    # 定期检查保活连接，补足空闲连接数
+    if app.config['POOL_KEEPALIVE_INTERVAL']:
+        scheduler.add_job(
+            id='pool_keepalive',
+            func='app.utils.database_helper:DatabaseHelper.keep_alive',
+            trigger='interval',
+            seconds=app.config['POOL_KEEPALIVE_INTERVAL'],
+            replace_existing=True
+        )
+    # 每天按保留策略清理任务结果归档
+    scheduler.add_job(
+        id='cleanup_result_archive',
+        func='app.utils.result_archive:result_archiver.cleanup',
+        trigger='cron',
+        hour=3,
+        minute=30,
+        replace_existing=True
+    )
     
     # 注册蓝图
     from app.views.main import main_bp
@@ -38,6 +169,7 @@ def create_app():
     # 创建数据库表并加载任务
     with app.app_context():
         db.create_all()
+        _add_missing_columns()
         
         # 加载定时任务
         from app.models.database import ScheduledTask
@@ -60,5 +192,22 @@ def create_app():
                         logger.info(f"Scheduled task {task.id}: {task.name}")
         except Exception as e:
             logger.error(f"Failed to load scheduled tasks: {e}")
+
+        # 后台预热设置了 min_idle 的数据库连接
+        if app.config['POOL_WARMUP']:
+            from app.models.database import DatabaseConfig
+            for db_config in DatabaseConfig.query.filter(DatabaseConfig.min_idle > 0).all():
+                DatabaseHelper.warm_up(db_config, background=True)
+
+    # 后台构建并增量刷新表结构搜索索引（建表完成后立即执行一次）
+    if app.config['SCHEMA_CATALOG_INTERVAL']:
+        scheduler.add_job(
+            id='refresh_schema_catalog',
+            func='app.utils.schema_catalog:schema_catalog.refresh',
+            trigger='interval',
+            seconds=app.config['SCHEMA_CATALOG_INTERVAL'],
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
         
     return app
@@ -10,6 +10,23 @@ class DatabaseConfig(db.Model):
     username = db.Column(db.String(50))
     password = db.Column(db.String(100))
     database = db.Column(db.String(50))
+    # 连接池设置，为空时使用默认值
+    pool_size = db.Column(db.Integer)
+    max_overflow = db.Column(db.Integer)
+    pool_recycle = db.Column(db.Integer)  # seconds
+    pool_timeout = db.Column(db.Integer)  # seconds
+    min_idle = db.Column(db.Integer)  # 预热并保活的空闲连接数，为空时不预热（签出时 pre-ping）
+    task_concurrency = db.Column(db.Integer)  # 该库同时执行的定时任务数上限，为空时使用 TASK_DB_CONCURRENCY
+    # 查询准入控制：EXPLAIN 预估行数 / 代价上限，超出时 reject 或 confirm；无 LIMIT 的查询自动追加的行数
+    max_estimated_rows = db.Column(db.BigInteger)
+    max_estimated_cost = db.Column(db.Float)
+    admission_action = db.Column(db.String(10), default='confirm')
+    auto_limit = db.Column(db.Integer)
+    # 只读副本：逗号分隔的 host[:port]（账号和库名与主库相同），只读语句按策略路由到副本
+    replica_hosts = db.Column(db.String(500))
+    replica_policy = db.Column(db.String(20), default='round_robin')  # round_robin, least_latency
+    tags = db.Column(db.String(200))  # 逗号分隔的标签，用于多库并发查询
+    version = db.Column(db.Integer, default=1)  # 每次修改配置递增，用于引擎缓存键
     created_at = db.Column(db.DateTime, default=datetime.now)
 
 class SavedQuery(db.Model):
@@ -29,6 +46,8 @@ class QueryHistory(db.Model):
     result_count = db.Column(db.Integer)
     error_message = db.Column(db.Text)
     task_id = db.Column(db.Integer, db.ForeignKey('scheduled_task.id'), nullable=True)
+    plan = db.Column(db.Text)  # 执行计划（JSON），慢查询时自动采集
+    plan_hash = db.Column(db.String(40))  # 计划结构指纹，用于识别计划变化
     created_at = db.Column(db.DateTime, default=datetime.now)
 
 class SystemConfig(db.Model):
@@ -53,4 +72,22 @@ class ScheduledTask(db.Model):
     notify_dingtalk = db.Column(db.Boolean, default=False)
     notify_wechat = db.Column(db.Boolean, default=False)
     notify_rule = db.Column(db.String(20))  # failure, success, both, none
+    timeout = db.Column(db.Integer)  # 查询超时（秒），为空时使用系统默认值
+    result_format = db.Column(db.String(10), default='csv')  # 结果文件格式: csv, csv.gz, csv.zst, parquet, xlsx
+    retention_days = db.Column(db.Integer)  # 结果文件保留天数，为空时使用系统默认值
+    retention_max_mb = db.Column(db.Integer)  # 结果文件总大小上限（MB），为空时使用系统默认值
+    plan_threshold = db.Column(db.Float)  # 执行时间超过该值（秒）时采集执行计划，为空时不采集
+    # 多库并发执行：目标库 ID（逗号分隔）和/或标签，设置后忽略 db_config_id
+    target_db_ids = db.Column(db.String(500))
+    target_tag = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.now)
+
+class ResultArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('scheduled_task.id'), index=True)
+    history_id = db.Column(db.Integer, db.ForeignKey('query_history.id'), nullable=True)
+    format = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(500), nullable=False)  # 相对于归档根目录
+    size_bytes = db.Column(db.Integer, default=0)
+    row_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
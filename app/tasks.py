@@ -1,10 +1,12 @@
-import csv
-import os
+import json
 import logging
 from datetime import datetime
 from app import db
 from app.models.database import ScheduledTask, DatabaseConfig, QueryHistory
 from app.utils.database_helper import DatabaseHelper
+from app.utils.result_archive import result_archiver
+from app.utils.fanout import fanout_runner, resolve_targets
+from app.utils.task_executor import task_executor
 from app.utils.email_helper import send_email
 from app.utils.feishu_helper import send_feishu_message
 from app.utils.dingtalk_helper import send_dingtalk_message
@@ -42,7 +44,44 @@ def check_threshold(task, result):
     return False, "未知检查类型"
 
 
+def capture_plan(task, db_config, history, default_threshold=0):
+    """
+    执行时间超过任务的计划采集阈值时获取执行计划，保存到执行历史中
+    """
+    threshold = task.plan_threshold if task.plan_threshold is not None else default_threshold
+    if not threshold or history.execution_time < threshold:
+        return
+    result = DatabaseHelper.explain_query(db_config, task.sql_query)
+    if result['status'] != 'success':
+        logger.warning(f"Failed to capture plan for task {task.name}: {result.get('error')}")
+        return
+    history.plan = json.dumps({k: v for k, v in result.items() if k not in ('status', 'raw')}, default=str)
+    history.plan_hash = result['plan_hash']
+    logger.info(f"Captured plan for slow task {task.name} ({history.execution_time:.3f}s)")
+
+
 def execute_task(task_id):
+    """
+    定时任务入口（调度器触发）：放入 task_executor 排队，
+    由执行池按目标库的并发上限执行 run_task
+    """
+    from app import scheduler
+    with scheduler.app.app_context():
+        task = ScheduledTask.query.get(task_id)
+        if not task:
+            logger.warning(f"Task {task_id} not found")
+            return
+        db_id = db_limit = None
+        if not (task.target_db_ids or task.target_tag):
+            # 多库任务入队时不绑定目标库，执行时每个目标库通过 task_executor.acquire_db 占用名额
+            db_config = DatabaseConfig.query.get(task.db_config_id)
+            if db_config:
+                db_id, db_limit = db_config.id, db_config.task_concurrency
+        name = task.name
+    task_executor.submit(task_id, run_task, db_id=db_id, db_limit=db_limit, name=name)
+
+
+def run_task(task_id):
     """
     执行定时任务
     """
@@ -55,7 +94,11 @@ def execute_task(task_id):
             return
 
         logger.info(f"Executing task: {task.name}")
-        
+
+        if task.target_db_ids or task.target_tag:
+            execute_fanout_task(task)
+            return
+
         # 获取数据库配置
         db_config = DatabaseConfig.query.get(task.db_config_id)
         if not db_config:
@@ -64,7 +107,9 @@ def execute_task(task_id):
 
         # 执行查询
         start_time = datetime.now()
-        result = DatabaseHelper.execute_query(db_config, task.sql_query)
+        timeout = task.timeout or scheduler.app.config['TASK_QUERY_TIMEOUT']
+        run_id = f"task_{task.id}_{int(start_time.timestamp())}"
+        result = DatabaseHelper.execute_query(db_config, task.sql_query, timeout=timeout, run_id=run_id)
         end_time = datetime.now()
         execution_time = (end_time - start_time).total_seconds()
 
@@ -87,6 +132,7 @@ def execute_task(task_id):
             error_message=result.get('error') or (anomaly_desc if is_anomaly else None),
             task_id=task.id
         )
+        capture_plan(task, db_config, history, scheduler.app.config['TASK_PLAN_THRESHOLD'])
         db.session.add(history)
 
         # 更新任务最后运行时间和状态
@@ -95,84 +141,97 @@ def execute_task(task_id):
         
         db.session.commit()
 
-        # 发送通知
-        try:
-            should_notify = False
-            
-            if task.notify_rule == 'both':
-                should_notify = True
-            elif task.notify_rule == 'failure' and (status == 'error' or is_anomaly):
-                should_notify = True
-            elif task.notify_rule == 'success' and status == 'success' and not is_anomaly:
-                should_notify = True
-                
-            if should_notify:
-                status_label = "异常" if is_anomaly else status.upper()
-                subject = f"[{status_label}] 任务: {task.name}"
-                body = f"""
-                <h3>任务执行报告</h3>
-                <p><b>任务名称:</b> {task.name}</p>
-                <p><b>执行状态:</b> {status}</p>
-                <p><b>检查结果:</b> {anomaly_desc}</p>
-                <p><b>执行时间:</b> {end_time}</p>
-                <p><b>结果数量:</b> {result.get('count', 0)}</p>
-                <p><b>错误信息:</b> {result.get('error', '无')}</p>
-                """
-                text_msg = (
-                    f"状态: {status}\n"
-                    f"检查结果: {anomaly_desc}\n"
-                    f"时间: {end_time}\n"
-                    f"结果数: {result.get('count', 0)}\n"
-                    f"错误: {result.get('error', '无')}"
-                )
-                
-                if task.notify_email:
-                    send_email(task.notify_email, subject, body)
-                if task.notify_feishu:
-                    send_feishu_message(subject, text_msg)
-                if task.notify_dingtalk:
-                    send_dingtalk_message(subject, text_msg)
-                if task.notify_wechat:
-                    send_wechat_message(subject, text_msg)
-                    
-        except Exception as e:
-            logger.error(f"Failed to send notification: {e}")
-
-        # 保存结果为 CSV
-        save_result_to_csv(task, result)
-
-
-def save_result_to_csv(task, result):
+        notify_task(task, status, is_anomaly, anomaly_desc, end_time, result)
+
+        # 按任务配置的格式归档结果
+        result_archiver.archive(task, result, history_id=history.id)
+
+
+def execute_fanout_task(task):
     """
-    保存查询结果为 CSV 文件
+    多库任务：在 target_db_ids / target_tag 指定的所有数据库上并发执行，
+    每个库记录一条执行历史，按合并后的结果检查阈值，部分库失败时任务状态为 error
     """
-    # 创建结果目录
-    results_dir = os.path.join(os.getcwd(), 'results')
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
+    from app import scheduler
+    db_ids = task.target_db_ids.split(',') if task.target_db_ids else None
+    targets = resolve_targets(db_ids=db_ids, tag=task.target_tag)
+    if not targets:
+        logger.error(f"Task {task.name}: no target databases")
+        return
+
+    timeout = task.timeout or scheduler.app.config['TASK_QUERY_TIMEOUT']
+    result = fanout_runner.run(scheduler.app, targets, task.sql_query, timeout=timeout, task_slots=True)
+    end_time = datetime.now()
+
+    is_anomaly = False
+    anomaly_desc = ""
+    if result['status'] != 'error':
+        is_anomaly, anomaly_desc = check_threshold(task, result)
+        logger.info(f"Task {task.name}: {anomaly_desc} (anomaly={is_anomaly})")
+    status = 'success' if result['status'] == 'success' else 'error'
+
+    histories = []
+    for target in result['targets']:
+        history = QueryHistory(
+            db_config_id=target['db_id'],
+            sql_query=task.sql_query,
+            status=target['status'],
+            execution_time=target['elapsed'] or 0,
+            result_count=target['count'],
+            error_message=target['error'] or (anomaly_desc if is_anomaly else None),
+            task_id=task.id
+        )
+        db.session.add(history)
+        histories.append(history)
+    task.last_run = end_time
+    task.last_run_status = status
+    db.session.commit()
+
+    notify_task(task, status, is_anomaly, anomaly_desc, end_time, result)
+    result_archiver.archive(task, result, history_id=histories[0].id if histories else None)
 
-    # 生成文件名: 任务名称_日期时间.csv
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{task.name}_{timestamp}.csv"
-    filepath = os.path.join(results_dir, filename)
 
+def notify_task(task, status, is_anomaly, anomaly_desc, end_time, result):
+    """按任务的通知规则发送执行报告"""
     try:
-        with open(filepath, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile)
-            
-            if result.get('status') == 'success' and 'columns' in result:
-                # 写入表头
-                writer.writerow(result['columns'])
-                # 写入数据
-                writer.writerows(result['rows'])
-            else:
-                if result.get('status') == 'error':
-                     writer.writerow(['Error', result.get('error')])
-                else:
-                     if 'columns' in result:
-                         writer.writerow(result['columns'])
+        should_notify = False
         
-        logger.info(f"Result saved to {filepath}")
+        if task.notify_rule == 'both':
+            should_notify = True
+        elif task.notify_rule == 'failure' and (status == 'error' or is_anomaly):
+            should_notify = True
+        elif task.notify_rule == 'success' and status == 'success' and not is_anomaly:
+            should_notify = True
+            
+        if should_notify:
+            status_label = "异常" if is_anomaly else status.upper()
+            subject = f"[{status_label}] 任务: {task.name}"
+            body = f"""
+            <h3>任务执行报告</h3>
+            <p><b>任务名称:</b> {task.name}</p>
+            <p><b>执行状态:</b> {status}</p>
+            <p><b>检查结果:</b> {anomaly_desc}</p>
+            <p><b>执行时间:</b> {end_time}</p>
+            <p><b>结果数量:</b> {result.get('count', 0)}</p>
+            <p><b>错误信息:</b> {result.get('error', '无')}</p>
+            """
+            text_msg = (
+                f"状态: {status}\n"
+                f"检查结果: {anomaly_desc}\n"
+                f"时间: {end_time}\n"
+                f"结果数: {result.get('count', 0)}\n"
+                f"错误: {result.get('error', '无')}"
+            )
+            
+            if task.notify_email:
+                send_email(task.notify_email, subject, body)
+            if task.notify_feishu:
+                send_feishu_message(subject, text_msg)
+            if task.notify_dingtalk:
+                send_dingtalk_message(subject, text_msg)
+            if task.notify_wechat:
+                send_wechat_message(subject, text_msg)
+                
     except Exception as e:
-        logger.error(f"Failed to save CSV: {e}")
+        logger.error(f"Failed to send notification: {e}")
 
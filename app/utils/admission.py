@@ -0,0 +1,98 @@
+import logging
+import re
+from app.utils.database_helper import DatabaseHelper
+from app.utils.result_cache import _strip_literals, is_read_only
+
+logger = logging.getLogger('db_monitor')
+
+# 已带行数限制的语句：LIMIT n / FETCH FIRST|NEXT / TOP n
+_LIMIT_PATTERN = re.compile(r'\blimit\s+(\d+|:\w+|\?)|\bfetch\s+(first|next)\b|\btop\s*\(?\s*\d+', re.I)
+_PARENS_PATTERN = re.compile(r'\([^()]*\)')
+
+
+def _top_level(sql):
+    """去掉字面量、注释和括号内的子查询，只保留最外层语句"""
+    sql = _strip_literals(sql)
+    while True:
+        stripped = _PARENS_PATTERN.sub('()', sql)
+        if stripped == sql:
+            return sql
+        sql = stripped
+
+
+def has_limit(sql):
+    return bool(_LIMIT_PATTERN.search(_top_level(sql)))
+
+
+def can_auto_limit(sql):
+    """只对单条只读 SELECT / WITH 语句追加 LIMIT"""
+    if not is_read_only(sql):
+        return False
+    first = _strip_literals(sql).strip().split(None, 1)[0].lower()
+    return first in ('select', 'with') and not has_limit(sql)
+
+
+def add_limit(sql, limit):
+    # 换行追加，避免被末尾的单行注释吞掉
+    return f"{sql.strip().rstrip(';').rstrip()}\nLIMIT {int(limit)}"
+
+
+def _limits_exceeded(db_config, estimated_rows, total_cost):
+    reasons = []
+    if db_config.max_estimated_rows and estimated_rows is not None and estimated_rows > db_config.max_estimated_rows:
+        reasons.append(f"estimated rows {int(estimated_rows)} > limit {db_config.max_estimated_rows}")
+    if db_config.max_estimated_cost and total_cost is not None and total_cost > db_config.max_estimated_cost:
+        reasons.append(f"estimated cost {total_cost:g} > limit {db_config.max_estimated_cost:g}")
+    return reasons
+
+
+def check_admission(db_config, query, params=None, confirmed=False, auto_limit=True):
+    """
+    执行前的准入检查：
+      1. 未带 LIMIT 的只读查询按 DatabaseConfig.auto_limit 自动追加 LIMIT
+      2. 配置了 max_estimated_rows / max_estimated_cost 时执行 EXPLAIN，
+         预估值超出上限时按 admission_action 拒绝（reject）或要求确认（confirm）
+    返回 {'action': allow/confirm/reject, 'query': 实际执行的语句, 'auto_limit', 'estimated_rows',
+          'total_cost', 'full_scans', 'reasons'}
+    EXPLAIN 失败（如 DDL 语句）时放行
+    """
+    admission = {
+        'action': 'allow',
+        'query': query,
+        'auto_limit': None,
+        'estimated_rows': None,
+        'total_cost': None,
+        'full_scans': [],
+        'reasons': []
+    }
+    if auto_limit and db_config.auto_limit and can_auto_limit(query):
+        admission['query'] = add_limit(query, db_config.auto_limit)
+        admission['auto_limit'] = db_config.auto_limit
+
+    if not (db_config.max_estimated_rows or db_config.max_estimated_cost):
+        return admission
+
+    plan = DatabaseHelper.explain_query(db_config, admission['query'], params=params)
+    if plan['status'] != 'success':
+        logger.warning(f"Admission pre-flight skipped for {db_config.name}: {plan.get('error')}")
+        admission['preflight_error'] = plan.get('error')
+        return admission
+
+    estimated_rows = plan['estimated_rows']
+    if estimated_rows is None and plan['full_scans'] and not has_limit(admission['query']):
+        # 计划中没有行数估算（SQLite）时，用全表扫描表的目录统计行数估算
+        engine = DatabaseHelper._get_engine(db_config)
+        counts = [DatabaseHelper._estimate_row_count(engine, t) for t in plan['full_scans']]
+        counts = [c for c in counts if c is not None]
+        estimated_rows = sum(counts) if counts else None
+
+    admission.update(estimated_rows=estimated_rows, total_cost=plan['total_cost'], full_scans=plan['full_scans'])
+    reasons = _limits_exceeded(db_config, estimated_rows, plan['total_cost'])
+    if reasons:
+        admission['reasons'] = reasons
+        if (db_config.admission_action or 'confirm') == 'reject':
+            admission['action'] = 'reject'
+        elif not confirmed:
+            admission['action'] = 'confirm'
+        logger.info(f"Admission {admission['action']} on {db_config.name}: {'; '.join(reasons)}")
+    return admission
@@ -0,0 +1,181 @@
+import math
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# 支持的聚合函数
+AGG_FUNCS = ('count', 'sum', 'mean', 'min', 'max', 'median', 'std', 'var', 'nunique', 'first', 'last')
+# 支持的操作
+AGG_OPERATIONS = ('groupby', 'pivot', 'top_n', 'describe')
+# 返回给前端的最大行数
+AGG_MAX_OUTPUT_ROWS = 10000
+
+
+def result_to_frame(columns, rows):
+    """
+    将 columns + rows 结果转换为 DataFrame，Decimal 列转为 float64 以便向量化计算
+    """
+    if len(set(columns)) != len(columns):
+        raise ValueError('Duplicate column names in result, please use column aliases')
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        present = df[col].dropna()
+        if len(present) and all(isinstance(v, (Decimal, int, float)) and not isinstance(v, bool) for v in present):
+            df[col] = pd.to_numeric(df[col].astype(float))
+    return df
+
+
+def _to_python(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return _to_python(value.item())
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if value is pd.NaT:
+        return None
+    return value
+
+
+def frame_to_result(df, max_rows=AGG_MAX_OUTPUT_ROWS):
+    """将 DataFrame（含分组索引）转换为 columns + rows 结果"""
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    if not isinstance(df.index, pd.RangeIndex):
+        df = df.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['_'.join(str(p) for p in col if str(p) != '') for col in df.columns]
+
+    truncated = len(df) > max_rows
+    if truncated:
+        df = df.head(max_rows)
+    rows = [[_to_python(v) for v in row] for row in df.itertuples(index=False, name=None)]
+    return {
+        'columns': [str(c) for c in df.columns],
+        'rows': rows,
+        'count': len(rows),
+        'truncated': truncated
+    }
+
+
+def _require_columns(df, columns):
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown column(s): {', '.join(map(str, missing))}")
+
+
+def _as_list(value):
+    if value in (None, ''):
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _check_func(func):
+    if func not in AGG_FUNCS:
+        raise ValueError(f"Unsupported aggregate function: {func}")
+    return func
+
+
+def _groupby(df, spec):
+    group_by = _as_list(spec.get('group_by'))
+    metrics = spec.get('metrics') or [{'column': '*', 'func': 'count'}]
+    _require_columns(df, group_by)
+
+    named = {}
+    for metric in metrics:
+        column = metric.get('column') or '*'
+        func = _check_func(metric.get('func') or 'count')
+        if column == '*':
+            if func != 'count':
+                raise ValueError('Only count is supported for *')
+            name = metric.get('alias') or 'count'
+            named[name] = (df.columns[0], 'size')
+            continue
+        _require_columns(df, [column])
+        name = metric.get('alias') or f"{func}_{column}"
+        named[name] = (column, func)
+
+    if not group_by:
+        # 不分组时对整个结果聚合为一行
+        return df.groupby(np.zeros(len(df), dtype=int)).agg(**named).reset_index(drop=True)
+    out = df.groupby(group_by, dropna=False, sort=False).agg(**named)
+    sort_by = spec.get('sort_by')
+    if sort_by:
+        if sort_by not in out.columns and sort_by not in group_by:
+            raise ValueError(f"Unknown sort column: {sort_by}")
+        out = out.sort_values(sort_by, ascending=bool(spec.get('ascending', False)))
+    return out
+
+
+def _pivot(df, spec):
+    index = _as_list(spec.get('index'))
+    columns = _as_list(spec.get('columns'))
+    values = _as_list(spec.get('values'))
+    if not index or not columns:
+        raise ValueError('Pivot requires index and columns')
+    _require_columns(df, index + columns + values)
+    aggfunc = _check_func(spec.get('aggfunc') or ('sum' if values else 'count'))
+    if not values:
+        # 未指定值列时统计行数
+        return pd.crosstab([df[c] for c in index], [df[c] for c in columns])
+    return df.pivot_table(index=index, columns=columns, values=values, aggfunc=aggfunc,
+                          fill_value=spec.get('fill_value'), dropna=False, observed=True)
+
+
+def _top_n(df, spec):
+    sort_by = spec.get('sort_by')
+    if not sort_by:
+        raise ValueError('top_n requires sort_by')
+    _require_columns(df, [sort_by])
+    n = max(int(spec.get('n') or 10), 1)
+    ascending = bool(spec.get('ascending', False))
+    group_by = _as_list(spec.get('group_by'))
+    _require_columns(df, group_by)
+
+    if not group_by:
+        top = df.nsmallest(n, sort_by) if ascending else df.nlargest(n, sort_by)
+        return top.reset_index(drop=True)
+    # 每组取前 N 行
+    ordered = df.sort_values(sort_by, ascending=ascending, na_position='last')
+    return ordered.groupby(group_by, dropna=False, sort=False).head(n).reset_index(drop=True)
+
+
+def _describe(df, spec):
+    columns = _as_list(spec.get('columns'))
+    _require_columns(df, columns)
+    target = df[columns] if columns else df
+    return target.describe(include='all').transpose().rename_axis('column')
+
+
+def aggregate(df, spec):
+    """
+    对结果 DataFrame 执行服务端聚合，spec 为请求参数：
+      groupby  - group_by, metrics: [{column, func, alias}], sort_by, ascending
+      pivot    - index, columns, values, aggfunc, fill_value
+      top_n    - sort_by, n, ascending, group_by（每组前 N）
+      describe - columns
+    """
+    op = spec.get('op') or 'groupby'
+    if op == 'groupby':
+        out = _groupby(df, spec)
+    elif op == 'pivot':
+        out = _pivot(df, spec)
+    elif op == 'top_n':
+        out = _top_n(df, spec)
+    elif op == 'describe':
+        out = _describe(df, spec)
+    else:
+        raise ValueError(f"Unsupported operation: {op}")
+
+    limit = min(int(spec.get('limit') or AGG_MAX_OUTPUT_ROWS), AGG_MAX_OUTPUT_ROWS)
+    result = frame_to_result(out, max_rows=limit)
+    result['op'] = op
+    return result
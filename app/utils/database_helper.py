@@ -1,82 +1,679 @@
+import base64
+import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
 from app import db
-from sqlalchemy import create_engine, text, inspect
+from app.utils.result_cache import result_cache, is_read_only
+from app.utils.query_guard import QueryRun
+from app.utils.query_plan import explain
+from app.utils.pool_stats import instrument
+from app.utils.replica_router import is_replica_safe, replica_router, split_replica
+from app.utils.sql_script import split_statements
+from app.utils.table_filter import build_conditions, column_kinds, parse_order_by
+from app.utils.profiler import (PROFILE_MAX_SAMPLE_ROWS, PROFILE_SAMPLE_ROWS, PROFILE_TOP_N,
+                                profile_rows, read_sample)
+from sqlalchemy import create_engine, exc, text, inspect
+from sqlalchemy.pool import NullPool
 from contextlib import contextmanager
 
 logger = logging.getLogger('db_monitor')
 
 # 引擎缓存，避免每次查询都创建新引擎
-_engine_cache = {}
+# (db_config_id, version) -> {'engine', 'name', 'last_used'}，按最近使用顺序排列
+_engine_cache = OrderedDict()
+_engine_lock = threading.RLock()
+# 最多缓存的引擎数、引擎空闲多久后释放（秒）
+ENGINE_CACHE_MAX_SIZE = 50
+ENGINE_IDLE_TIMEOUT = 1800
+
+# 连接池参数对应的 DatabaseConfig 字段
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_recycle', 'pool_timeout')
+
+# 脚本模式每条语句最多返回的行数
+SCRIPT_MAX_ROWS = 1000
+
+# 流式查询默认参数：每块行数、最大行数、最大字节数（0 表示不限制）
+STREAM_CHUNK_SIZE = 1000
+STREAM_MAX_ROWS = 0
+STREAM_MAX_BYTES = 0
+
+# 精确行数缓存：(db_config_id, 表名, 条件, 参数) -> (总数, 计算时间)
+_count_cache = {}
+_count_pending = set()
+_count_lock = threading.Lock()
+_count_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='row-count')
+COUNT_CACHE_TTL = 300
+
+# 只读副本的连接超时（秒），超时后标记为不可用并回退
+REPLICA_CONNECT_TIMEOUT = 3
+
+# 连通性检查默认参数：并发线程数、连接超时、读取超时（秒）
+HEALTH_CHECK_WORKERS = 16
+HEALTH_CONNECT_TIMEOUT = 5
+HEALTH_READ_TIMEOUT = 5
+# 连通性检查结果排序：失败的排在前面
+HEALTH_STATUS_ORDER = {'error': 0, 'timeout': 1, 'ok': 2}
+
+# 表结构元数据缓存：db_config_id -> {'loaded_at', 'tables', 'columns', 'keys', 'profiles'}
+_schema_cache = {}
+_schema_lock = threading.Lock()
+SCHEMA_CACHE_TTL = 600
+
+
+def _estimate_row_bytes(row):
+    """粗略估算一行数据的字节数，用于流式查询的字节预算"""
+    return sum(len(str(cell)) for cell in row if cell is not None) + len(row)
+
+
+class QueryStream:
+    """
+    流式查询结果：使用服务端游标按块迭代行，
+    迭代结束、达到上限或调用 close() 时释放连接
+    """
+
+    def __init__(self, conn, result, chunk_size=STREAM_CHUNK_SIZE, max_rows=0, max_bytes=0, run=None):
+        self._conn = conn
+        self._result = result
+        self._run = run
+        self.columns = list(result.keys())
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows or 0
+        self.max_bytes = max_bytes or 0
+        self.count = 0
+        self.bytes = 0
+        self.truncated = False
+        self._exhausted = False
+
+    def __iter__(self):
+        try:
+            for partition in self._result.partitions(self.chunk_size):
+                chunk = []
+                for row in partition:
+                    if self.max_rows and self.count >= self.max_rows:
+                        self.truncated = True
+                        break
+                    row = list(row)
+                    if self.max_bytes:
+                        self.bytes += _estimate_row_bytes(row)
+                        if self.bytes > self.max_bytes:
+                            self.truncated = True
+                            break
+                    chunk.append(row)
+                    self.count += 1
+                if chunk:
+                    yield chunk
+                if self.truncated:
+                    break
+            else:
+                self._exhausted = True
+        finally:
+            self.close()
+
+    @property
+    def run_id(self):
+        return self._run.run_id if self._run is not None else None
+
+    def error_message(self, error):
+        """读取过程中出错时的可读信息（区分超时/取消）"""
+        return self._run.error_message(error) if self._run is not None else str(error)
+
+    def close(self):
+        """
+        释放连接。未读完就关闭（截断、客户端断开）时，MySQL 的非缓冲游标关闭结果集会读完剩余的行，
+        因此直接作废该连接，不放回连接池
+        """
+        if self._conn is None:
+            return
+        try:
+            if not self._exhausted and self._conn.engine.dialect.name == 'mysql':
+                self._conn.invalidate()
+            else:
+                self._result.close()
+            if self._run is not None:
+                self._run.detach()
+        finally:
+            self._conn.close()
+            self._conn = None
+
 
 class DatabaseHelper:
     @staticmethod
-    def get_connection_url(db_config):
+    def get_connection_url(db_config, host=None, port=None):
+        """连接串；host / port 用于连接只读副本（账号和库名与主库相同）"""
+        host = host or db_config.host
+        port = port or db_config.port
         if db_config.db_type == 'sqlite':
-            return f'sqlite:///{db_config.host}'
+            return f'sqlite:///{host}'
         elif db_config.db_type == 'mysql':
-            return f'mysql+pymysql://{db_config.username}:{db_config.password}@{db_config.host}:{db_config.port}/{db_config.database}'
+            return f'mysql+pymysql://{db_config.username}:{db_config.password}@{host}:{port}/{db_config.database}'
         elif db_config.db_type == 'postgresql':
-            return f'postgresql://{db_config.username}:{db_config.password}@{db_config.host}:{db_config.port}/{db_config.database}'
+            return f'postgresql://{db_config.username}:{db_config.password}@{host}:{port}/{db_config.database}'
         else:
             raise ValueError("Unsupported database type")
 
+    @staticmethod
+    def _engine_key(db_config):
+        """引擎缓存键：配置 ID + 配置版本，不包含连接串中的密码"""
+        return (db_config.id, db_config.version or 0)
+
+    @staticmethod
+    def get_pool_options(db_config):
+        """从配置中读取连接池参数，未设置的项使用 SQLAlchemy 默认值"""
+        options = {}
+        for name in POOL_OPTIONS:
+            value = getattr(db_config, name, None)
+            if value is not None:
+                options[name] = value
+        return options
+
     @classmethod
-    def _get_engine(cls, db_config):
-        """获取或创建引擎（带缓存）"""
-        url = cls.get_connection_url(db_config)
-        if url not in _engine_cache:
-            _engine_cache[url] = create_engine(url, pool_pre_ping=True)
-            logger.info(f"Created new engine for: {db_config.name}")
-        return _engine_cache[url]
+    def configure_engine_cache(cls, max_size=None, idle_timeout=None):
+        global ENGINE_CACHE_MAX_SIZE, ENGINE_IDLE_TIMEOUT
+        if max_size is not None:
+            ENGINE_CACHE_MAX_SIZE = max_size
+        if idle_timeout is not None:
+            ENGINE_IDLE_TIMEOUT = idle_timeout
+
+    @classmethod
+    def _get_engine(cls, db_config, replica=None):
+        """
+        获取或创建引擎（带缓存，按 LRU 和空闲时间淘汰）。
+        replica 为只读副本标识时返回该副本的引擎（连接超时 REPLICA_CONNECT_TIMEOUT，不预热）
+        """
+        key = cls._engine_key(db_config) + ((replica,) if replica else ())
+        with _engine_lock:
+            entry = _engine_cache.get(key)
+            if entry is None:
+                if replica:
+                    host, port = split_replica(db_config, replica)
+                    url = cls.get_connection_url(db_config, host=host, port=port)
+                    min_idle = 0
+                    connect_args = cls.get_timeout_connect_args(db_config.db_type, REPLICA_CONNECT_TIMEOUT)
+                    name = f"{db_config.name} (replica {replica})"
+                else:
+                    url = cls.get_connection_url(db_config)
+                    min_idle = db_config.min_idle or 0
+                    connect_args = {}
+                    name = db_config.name
+                # 保活的引擎由后台定期检查空闲连接，签出时不再 pre-ping
+                engine = create_engine(url, pool_pre_ping=not min_idle, connect_args=connect_args,
+                                       **cls.get_pool_options(db_config))
+                entry = {'engine': engine, 'name': name, 'min_idle': min_idle, 'stats': instrument(engine)}
+                _engine_cache[key] = entry
+                logger.info(f"Created new engine for: {name}")
+            entry['last_used'] = time.time()
+            _engine_cache.move_to_end(key)
+            cls._evict_engines(keep=key)
+            return entry['engine']
+
+    @classmethod
+    def _evict_engines(cls, keep=None):
+        """释放超出数量上限（最久未使用优先）或空闲超时的引擎（保活的引擎不按空闲时间释放）"""
+        now = time.time()
+        with _engine_lock:
+            expired = [k for k, e in _engine_cache.items()
+                       if k != keep and not e['min_idle'] and now - e['last_used'] > ENGINE_IDLE_TIMEOUT]
+            overflow = len(_engine_cache) - len(expired) - ENGINE_CACHE_MAX_SIZE
+            for k in _engine_cache:
+                if overflow <= 0:
+                    break
+                if k != keep and k not in expired:
+                    expired.append(k)
+                    overflow -= 1
+            for k in expired:
+                entry = _engine_cache.pop(k)
+                cls._discard_engine(k[0], entry['engine'])
+                logger.info(f"Evicted idle engine for: {entry['name']}")
+
+    @staticmethod
+    def _discard_engine(db_id, engine):
+        """
+        释放引擎，同时丢弃绑定在该引擎上的表结构缓存项（其中的 inspector 持有引擎引用，
+        继续使用会在缓存之外重新建立连接池）
+        """
+        with _schema_lock:
+            entry = _schema_cache.get(db_id)
+            if entry and entry['inspector'].bind is engine:
+                del _schema_cache[db_id]
+        engine.dispose()
+
+    @classmethod
+    def evict_idle_engines(cls):
+        """定时清理空闲引擎（由调度器周期调用）"""
+        cls._evict_engines()
+
+    @classmethod
+    def _connect(cls, db_config, read_only=False):
+        """
+        获取执行用的连接，返回 (engine, conn, replica)。
+        只读语句且配置了只读副本时按 replica_policy 选择副本，副本连接失败时标记为不可用并尝试下一个（连接池等待超时只跳过，不标记），
+        全部不可用时回退到主库（replica 为 None）
+        """
+        if read_only and db_config.replica_hosts:
+            for replica in replica_router.candidates(db_config):
+                engine = cls._get_engine(db_config, replica=replica)
+                try:
+                    return engine, engine.connect(), replica
+                except exc.TimeoutError:
+                    # 副本连接池已满（等待超时）：副本本身可用，不标记为不可用，直接尝试下一个
+                    logger.info(f"Replica {replica} of database {db_config.id} pool exhausted, trying next")
+                except exc.DBAPIError as e:
+                    replica_router.mark_down(db_config.id, replica, e)
+        engine = cls._get_engine(db_config)
+        return engine, engine.connect(), None
+
+    @staticmethod
+    def _ping_connections(engine, count):
+        """
+        同时签出 count 个连接并执行 SELECT 1（同时持有，保证是池中不同的连接），
+        失效的连接作废后重新建立。返回 {'alive', 'replaced'}
+        """
+        conns = []
+        replaced = 0
+        try:
+            for _ in range(count):
+                conn = engine.connect()
+                try:
+                    conn.exec_driver_sql('SELECT 1')
+                except exc.DBAPIError:
+                    conn.invalidate()
+                    conn.close()
+                    replaced += 1
+                    conn = engine.connect()
+                    conn.exec_driver_sql('SELECT 1')
+                conns.append(conn)
+        finally:
+            for conn in conns:
+                conn.close()
+        return {'alive': len(conns), 'replaced': replaced}
+
+    @classmethod
+    def warm_up(cls, db_config, count=None, background=False):
+        """
+        预先建立连接（默认 min_idle 个，不超过 pool_size），避免第一次查询承担建连和认证的开销。
+        background=True 时在后台线程中执行
+        """
+        engine = cls._get_engine(db_config)
+        count = count or db_config.min_idle or 0
+        if hasattr(engine.pool, 'size'):
+            count = min(count, engine.pool.size())
+        if count <= 0:
+            return None
+        name = db_config.name
+
+        def run():
+            start = time.time()
+            try:
+                result = cls._ping_connections(engine, count)
+                logger.info(f"Warmed up {result['alive']} connections for {name} ({time.time() - start:.3f}s)")
+                return result
+            except Exception as e:
+                logger.warning(f"Failed to warm up connections for {name}: {e}")
+                return None
+
+        if background:
+            threading.Thread(target=run, name=f"warm-up-{db_config.id}", daemon=True).start()
+            return None
+        return run()
+
+    @classmethod
+    def keep_alive(cls):
+        """
+        连接保活（由调度器周期调用）：对设置了 min_idle 的引擎检查池中所有空闲连接
+        （这类引擎签出时不 pre-ping，连接池按 FIFO 取出，任何一个空闲连接都可能被下一次查询拿到），
+        断开的连接重建，并补足到 min_idle 个。只使用当前空闲的容量，不与正在执行的查询争抢连接
+        """
+        with _engine_lock:
+            entries = [e for e in _engine_cache.values() if e['min_idle']]
+        for entry in entries:
+            pool = entry['engine'].pool
+            if not hasattr(pool, 'size'):
+                continue
+            count = min(max(entry['min_idle'], pool.checkedin()), pool.size() - pool.checkedout())
+            if count <= 0:
+                continue
+            try:
+                result = cls._ping_connections(entry['engine'], count)
+                if result['replaced']:
+                    logger.info(f"Keepalive replaced {result['replaced']} stale connections for {entry['name']}")
+            except Exception as e:
+                logger.warning(f"Keepalive failed for {entry['name']}: {e}")
+
+    @classmethod
+    def get_pool_stats(cls, db_config):
+        """当前引擎的连接池统计（引擎创建以来），引擎尚未创建时返回 None"""
+        with _engine_lock:
+            entry = _engine_cache.get(cls._engine_key(db_config))
+        if entry is None:
+            return None
+        return {**entry['stats'].snapshot(), 'min_idle': entry['min_idle']}
 
     @classmethod
     def dispose_engine(cls, db_config):
-        """清理指定数据库的引擎缓存"""
+        """清理指定数据库（所有版本）的引擎缓存"""
         try:
-            url = cls.get_connection_url(db_config)
-            if url in _engine_cache:
-                _engine_cache[url].dispose()
-                del _engine_cache[url]
-                logger.info(f"Disposed engine for: {db_config.name}")
+            with _engine_lock:
+                for key in [k for k in _engine_cache if k[0] == db_config.id]:
+                    cls._discard_engine(db_config.id, _engine_cache.pop(key)['engine'])
+                    logger.info(f"Disposed engine for: {db_config.name}")
         except Exception as e:
             logger.error(f"Failed to dispose engine: {e}")
 
     @classmethod
-    def execute_query(cls, db_config, query):
+    def execute_query(cls, db_config, query, params=None, use_cache=False, cache_ttl=None,
+                      timeout=None, run_id=None):
+        """
+        执行查询。use_cache=True 时只读查询结果按 (db_config_id, 规范化 SQL, 参数) 缓存，
+        返回结果中 cache 字段为 hit/miss/bypass。
+        timeout 为语句超时（秒），run_id 用于通过 query_guard.cancel_query 取消执行
+        """
+        if use_cache:
+            if not is_read_only(query):
+                result = cls.execute_query(db_config, query, params, timeout=timeout, run_id=run_id)
+                result['cache'] = 'bypass'
+                return result
+
+            key = result_cache.make_key(db_config.id, query, params)
+            entry = result_cache.get(key)
+            if entry:
+                return {
+                    **entry['result'],
+                    'cache': 'hit',
+                    'cached_at': datetime.fromtimestamp(entry['cached_at']).strftime('%Y-%m-%d %H:%M:%S')
+                }
+
+            result = cls.execute_query(db_config, query, params, timeout=timeout, run_id=run_id)
+            if result['status'] == 'success':
+                result_cache.set(key, {k: v for k, v in result.items() if k != 'run_id'}, ttl=cache_ttl)
+            return {**result, 'cache': 'miss'}
+
+        run = None
+        try:
+            engine, conn, replica = cls._connect(db_config, read_only=is_replica_safe(query))
+            run = QueryRun(engine, db_config, timeout=timeout, run_id=run_id)
+            with conn:
+                run.attach(conn)
+                try:
+                    start_time = time.time()
+                    result = conn.execute(text(query), params or {})
+                    if result.returns_rows:
+                        columns = list(result.keys())
+                        rows = [list(row) for row in result.fetchall()]
+                        if replica:
+                            replica_router.record(db_config.id, replica, time.time() - start_time)
+
+                        return {
+                            'status': 'success',
+                            'columns': columns,
+                            'rows': rows,
+                            'count': len(rows),
+                            'replica': replica,
+                            'run_id': run.run_id
+                        }
+                    else:
+                        conn.commit()
+                        return {
+                            'status': 'success',
+                            'message': 'Query executed successfully (no rows returned)',
+                            'count': 0,
+                            'run_id': run.run_id
+                        }
+                finally:
+                    run.detach()
+        except Exception as e:
+            error = run.error_message(e) if run else str(e)
+            logger.error(f"Query execution error: {error}")
+            return {
+                'status': 'error',
+                'error': error,
+                'run_id': run.run_id if run else run_id
+            }
+
+    @classmethod
+    def execute_script(cls, db_config, script, transaction=False, stop_on_error=True,
+                       max_rows=SCRIPT_MAX_ROWS, timeout=None, run_id=None):
+        """
+        在同一个连接上依次执行脚本中的多条语句（按方言拆分，见 sql_script.split_statements）。
+        transaction=True 时所有语句在一个事务中执行，每条语句使用 SAVEPOINT，出错时只回滚该语句；
+        stop_on_error=True 且有语句失败时整体回滚，否则提交。transaction=False 时每条语句单独提交。
+        每条语句返回状态、耗时、行数和最多 max_rows 行结果；timeout 作用于整个脚本。
+        注意 MySQL 的 DDL 会隐式提交事务
+        """
         engine = cls._get_engine(db_config)
-        
+        run = QueryRun(engine, db_config, timeout=timeout, run_id=run_id)
+        statements = split_statements(script, engine.dialect.name)
+        if not statements:
+            return {'status': 'error', 'error': 'No statements found', 'run_id': run.run_id}
+
+        results = []
+        committed = False
+        start_time = time.time()
         try:
             with engine.connect() as conn:
-                result = conn.execute(text(query))
-                if result.returns_rows:
-                    columns = list(result.keys())
-                    rows = [list(row) for row in result.fetchall()]
-                    
-                    return {
-                        'status': 'success',
-                        'columns': columns,
-                        'rows': rows,
-                        'count': len(rows)
-                    }
-                else:
-                    conn.commit()
-                    return {
-                        'status': 'success',
-                        'message': 'Query executed successfully (no rows returned)',
-                        'count': 0
-                    }
+                run.attach(conn)
+                try:
+                    if transaction and engine.dialect.name == 'sqlite':
+                        # pysqlite 不会在 SAVEPOINT 前开启事务，需显式 BEGIN
+                        conn.exec_driver_sql('BEGIN')
+                    for index, statement in enumerate(statements, 1):
+                        item = cls._execute_statement(conn, run, statement, transaction, max_rows)
+                        item['index'] = index
+                        results.append(item)
+                        if item['status'] == 'error' and (stop_on_error or run.reason):
+                            break
+
+                    failed = any(r['status'] == 'error' for r in results)
+                    if transaction:
+                        if failed and stop_on_error:
+                            conn.rollback()
+                        else:
+                            conn.commit()
+                            committed = True
+                    else:
+                        committed = True
+                finally:
+                    run.detach()
+        except Exception as e:
+            error = run.error_message(e)
+            logger.error(f"Script execution error: {error}")
+            return {'status': 'error', 'error': error, 'statements': results, 'run_id': run.run_id}
+
+        failed = sum(1 for r in results if r['status'] == 'error')
+        return {
+            'status': 'error' if failed else 'success',
+            'error': next((r['error'] for r in results if r['status'] == 'error'), None),
+            'statements': results,
+            'total': len(statements),
+            'executed': len(results),
+            'failed': failed,
+            'committed': committed,
+            'transaction': transaction,
+            'elapsed': round(time.time() - start_time, 4),
+            'count': sum(r.get('count', 0) for r in results),
+            'run_id': run.run_id
+        }
+
+    @staticmethod
+    def _execute_statement(conn, run, statement, transaction, max_rows):
+        """执行脚本中的一条语句，不解析绑定参数（避免字面量中的冒号被当作参数）"""
+        item = {'statement': statement}
+        begin = time.time()
+        savepoint = conn.begin_nested() if transaction else None
+        try:
+            if not transaction:
+                # 上一条语句提交后超时设置已失效
+                run.reapply_timeout()
+            result = conn.exec_driver_sql(statement)
+            if result.returns_rows:
+                rows = result.fetchmany(max_rows + 1)
+                result.close()
+                item.update(columns=list(result.keys()), rows=[list(r) for r in rows[:max_rows]],
+                            truncated=len(rows) > max_rows)
+                item['count'] = len(item['rows'])
+            else:
+                item['count'] = max(result.rowcount, 0)
+            if savepoint is not None:
+                savepoint.commit()
+            else:
+                conn.commit()
+            item['status'] = 'success'
+        except Exception as e:
+            if savepoint is not None:
+                savepoint.rollback()
+            else:
+                conn.rollback()
+            item.update(status='error', error=run.error_message(e))
+        item['elapsed'] = round(time.time() - begin, 4)
+        return item
+
+    @classmethod
+    def stream_query(cls, db_config, query, chunk_size=STREAM_CHUNK_SIZE,
+                     max_rows=STREAM_MAX_ROWS, max_bytes=STREAM_MAX_BYTES, timeout=None, run_id=None):
+        """
+        流式执行查询，使用服务端游标 (stream_results/yield_per) 逐块读取。
+        成功时返回 {'status': 'success', 'stream': QueryStream}，
+        非查询语句与 execute_query 返回格式一致。超时与取消对整个读取过程有效
+        """
+        engine = cls._get_engine(db_config)
+        run = QueryRun(engine, db_config, timeout=timeout, run_id=run_id)
+        conn = None
+        try:
+            conn = engine.connect().execution_options(stream_results=True, yield_per=chunk_size)
+            run.attach(conn)
+            result = conn.execute(text(query))
+            if result.returns_rows:
+                stream = QueryStream(conn, result, chunk_size, max_rows, max_bytes, run=run)
+                return {'status': 'success', 'columns': stream.columns, 'stream': stream, 'run_id': run.run_id}
+
+            conn.commit()
+            run.detach()
+            conn.close()
+            return {
+                'status': 'success',
+                'message': 'Query executed successfully (no rows returned)',
+                'count': 0,
+                'run_id': run.run_id
+            }
         except Exception as e:
-            logger.error(f"Query execution error: {e}")
+            error = run.error_message(e)
+            run.detach()
+            if conn is not None:
+                conn.close()
+            logger.error(f"Query execution error: {error}")
             return {
                 'status': 'error',
-                'error': str(e)
+                'error': error,
+                'run_id': run.run_id
             }
 
+    @classmethod
+    def explain_query(cls, db_config, query, params=None):
+        """
+        获取查询的执行计划（不执行语句本身），返回归一化的计划树，
+        格式见 query_plan.explain，失败时返回 {'status': 'error', 'error': ...}
+        """
+        engine = cls._get_engine(db_config)
+        try:
+            with engine.connect() as conn:
+                return {'status': 'success', **explain(conn, engine.dialect.name, query, params)}
+        except Exception as e:
+            logger.error(f"Explain error: {e}")
+            return {'status': 'error', 'error': str(e)}
+
+    @staticmethod
+    def get_timeout_connect_args(db_type, connect_timeout, read_timeout=None):
+        """
+        按驱动设置连接超时和读取超时（read_timeout 为 None 时不限制），
+        避免连接不可达的主机时等待操作系统的 TCP 超时
+        """
+        args = {}
+        if db_type == 'mysql':
+            args['connect_timeout'] = max(int(connect_timeout), 1)
+            if read_timeout:
+                args.update(read_timeout=max(int(read_timeout), 1), write_timeout=max(int(read_timeout), 1))
+        elif db_type == 'postgresql':
+            args['connect_timeout'] = max(int(connect_timeout), 1)
+            if read_timeout:
+                args['options'] = f"-c statement_timeout={int(read_timeout * 1000)}"
+        elif db_type == 'sqlite' and read_timeout:
+            args['timeout'] = read_timeout
+        return args
+
+    @classmethod
+    def _create_probe_engine(cls, db_config, connect_timeout, read_timeout):
+        """不缓存、不复用连接的临时引擎，带连接 / 读取超时"""
+        return create_engine(cls.get_connection_url(db_config), poolclass=NullPool,
+                             connect_args=cls.get_timeout_connect_args(db_config.db_type, connect_timeout,
+                                                                       read_timeout))
+
+    @classmethod
+    def probe_connection(cls, db_config, connect_timeout=HEALTH_CONNECT_TIMEOUT, read_timeout=HEALTH_READ_TIMEOUT):
+        """
+        检查单个数据库的连通性和延迟。始终使用带驱动级连接 / 读取超时的临时引擎：
+        缓存引擎的连接没有超时，主机不可达时检查线程会一直挂起。
+        返回 {'status': ok/error, 'connect_ms', 'query_ms', 'latency_ms', 'error'}
+        """
+        engine = cls._create_probe_engine(db_config, connect_timeout, read_timeout)
+        result = {'connect_ms': None, 'query_ms': None, 'latency_ms': None, 'error': None}
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                connected = time.perf_counter()
+                run = QueryRun(engine, db_config, timeout=read_timeout)
+                run.attach(conn)
+                try:
+                    conn.exec_driver_sql('SELECT 1').scalar()
+                except Exception as e:
+                    raise RuntimeError(run.error_message(e)) from e
+                finally:
+                    run.detach()
+                done = time.perf_counter()
+            result.update(status='ok',
+                          connect_ms=round((connected - start) * 1000, 2),
+                          query_ms=round((done - connected) * 1000, 2),
+                          latency_ms=round((done - start) * 1000, 2))
+        except Exception as e:
+            result.update(status='error', error=str(e).split('\n')[0],
+                          latency_ms=round((time.perf_counter() - start) * 1000, 2))
+        finally:
+            engine.dispose()
+        return result
+
+    @classmethod
+    def check_health(cls, db_configs, connect_timeout=HEALTH_CONNECT_TIMEOUT, read_timeout=HEALTH_READ_TIMEOUT,
+                     max_workers=HEALTH_CHECK_WORKERS):
+        """
+        并发检查多个数据库的连通性，单个库超过 连接超时 + 读取超时 仍未返回时标记为 timeout
+        （不等待其线程结束）。结果按状态排序（失败在前），同状态按延迟从高到低
+        """
+        deadline = connect_timeout + read_timeout + 1
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(db_configs) or 1)),
+                                      thread_name_prefix='health-check')
+        futures = {executor.submit(cls.probe_connection, c, connect_timeout, read_timeout): c for c in db_configs}
+        done, _ = wait(futures, timeout=deadline)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        for future, config in futures.items():
+            item = {'db_id': config.id, 'name': config.name, 'type': config.db_type, 'host': config.host}
+            if future in done:
+                item.update(future.result())
+            else:
+                item.update(status='timeout', connect_ms=None, query_ms=None,
+                            latency_ms=round(deadline * 1000, 2),
+                            error=f"No response within {deadline}s")
+            results.append(item)
+        results.sort(key=lambda r: (HEALTH_STATUS_ORDER.get(r['status'], 0), -(r['latency_ms'] or 0)))
+        return results
+
     @classmethod
     def test_connection(cls, db_config):
         """测试数据库连接是否成功"""
-        url = cls.get_connection_url(db_config)
-        engine = create_engine(url)
+        engine = cls._create_probe_engine(db_config, HEALTH_CONNECT_TIMEOUT, HEALTH_READ_TIMEOUT)
         try:
             with engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
@@ -86,73 +683,423 @@ class DatabaseHelper:
         finally:
             engine.dispose()
 
+    @classmethod
+    def _get_schema_entry(cls, db_config):
+        """获取（必要时加载）指定数据库的表结构缓存项，过期后重新加载表名列表"""
+        with _schema_lock:
+            entry = _schema_cache.get(db_config.id)
+        if entry and time.time() - entry['loaded_at'] < SCHEMA_CACHE_TTL:
+            return entry
+
+        inspector = inspect(cls._get_engine(db_config))
+        entry = {
+            'loaded_at': time.time(),
+            'inspector': inspector,
+            'tables': inspector.get_table_names(),
+            'columns': {},
+            'keys': {},
+            # 表数据概况，(表名, 采样行数, top_n) -> 结果，随表结构缓存一起过期
+            'profiles': {}
+        }
+        with _schema_lock:
+            _schema_cache[db_config.id] = entry
+        return entry
+
+    @classmethod
+    def get_table_names(cls, db_config):
+        """获取表名列表（带缓存）"""
+        return cls._get_schema_entry(db_config)['tables']
+
+    @classmethod
+    def get_columns(cls, db_config, table_name):
+        """获取表的列信息（带缓存），表不存在时返回 None"""
+        entry = cls._get_schema_entry(db_config)
+        if table_name not in entry['tables']:
+            return None
+        columns = entry['columns'].get(table_name)
+        if columns is None:
+            columns = entry['inspector'].get_columns(table_name)
+            entry['columns'][table_name] = columns
+        return columns
+
+    @classmethod
+    def get_all_columns(cls, db_config):
+        """
+        获取所有表的列信息（写入表结构缓存），返回 {表名: 列信息列表}。
+        未缓存的表通过 get_multi_columns 批量读取（PostgreSQL / MySQL 一次查询系统目录）
+        """
+        entry = cls._get_schema_entry(db_config)
+        missing = [t for t in entry['tables'] if t not in entry['columns']]
+        if missing:
+            names = None if len(missing) == len(entry['tables']) else missing
+            for (_, table_name), columns in entry['inspector'].get_multi_columns(filter_names=names).items():
+                entry['columns'][table_name] = columns
+        return {t: entry['columns'].get(t, []) for t in entry['tables']}
+
+    @classmethod
+    def get_unique_keys(cls, db_config, table_name):
+        """
+        获取表的唯一键列表（带缓存），第一项为主键（如果有）。
+        返回 {'primary': [...], 'unique': [[...], ...]}
+        """
+        entry = cls._get_schema_entry(db_config)
+        keys = entry['keys'].get(table_name)
+        if keys is None:
+            inspector = entry['inspector']
+            pk = inspector.get_pk_constraint(table_name).get('constrained_columns') or []
+            unique = [uc['column_names'] for uc in inspector.get_unique_constraints(table_name)]
+            unique += [idx['column_names'] for idx in inspector.get_indexes(table_name) if idx.get('unique')]
+            keys = {'primary': pk, 'unique': unique}
+            entry['keys'][table_name] = keys
+        return keys
+
+    @classmethod
+    def profile_table(cls, db_config, table_name, sample_rows=PROFILE_SAMPLE_ROWS, top_n=PROFILE_TOP_N,
+                      refresh=False):
+        """
+        表数据概况：对有界样本逐列计算空值比例、近似去重数（HyperLogLog）、最小 / 最大值和高频值。
+        PostgreSQL 使用 TABLESAMPLE，其他数据库在整数主键上随机取若干区间，没有整数主键时读取前 N 行。
+        结果缓存在表结构缓存项中，refresh=True 时重新采样
+        """
+        try:
+            columns_info = cls.get_columns(db_config, table_name)
+            if columns_info is None:
+                return {'status': 'error', 'message': 'Table not found'}
+            sample_rows = max(1, min(int(sample_rows), PROFILE_MAX_SAMPLE_ROWS))
+
+            entry = cls._get_schema_entry(db_config)
+            key = (table_name, sample_rows, top_n)
+            cached = entry['profiles'].get(key)
+            if cached and not refresh:
+                return {**cached, 'cached': True}
+
+            kinds = column_kinds(columns_info)
+            pk = cls.get_unique_keys(db_config, table_name)['primary']
+            pk = pk[0] if len(pk) == 1 and kinds.get(pk[0]) == 'number' else None
+
+            start_time = time.time()
+            engine, conn, replica = cls._connect(db_config, read_only=True)
+            with conn:
+                row_estimate = cls._estimate_row_count(engine, table_name, conn=conn)
+                columns, rows, method = read_sample(conn, table_name, engine.dialect.name, pk,
+                                                    row_estimate, sample_rows)
+            profiles = profile_rows(columns, rows, top_n)
+            for name, profile in profiles.items():
+                profile['type'] = kinds.get(name, 'text')
+
+            result = {
+                'status': 'success',
+                'table': table_name,
+                'sample_method': method,
+                'sample_rows': len(rows),
+                'row_estimate': row_estimate,
+                'columns': [{'name': name, **profiles[name]} for name in columns],
+                'elapsed': round(time.time() - start_time, 3),
+                'profiled_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            entry['profiles'][key] = result
+            return {**result, 'cached': False}
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    @classmethod
+    def invalidate_schema(cls, db_config):
+        """清理指定数据库的表结构缓存和行数缓存"""
+        with _schema_lock:
+            _schema_cache.pop(db_config.id, None)
+        with _count_lock:
+            for key in [k for k in _count_cache if k[0] == db_config.id]:
+                del _count_cache[key]
+
     @classmethod
     def get_tables(cls, db_config):
         """获取数据库所有表名"""
         try:
-            engine = cls._get_engine(db_config)
-            inspector = inspect(engine)
-            return {'status': 'success', 'tables': inspector.get_table_names()}
+            return {'status': 'success', 'tables': cls.get_table_names(db_config)}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
 
+    @staticmethod
+    def encode_cursor(values, direction):
+        """将键值编码为不透明的分页游标"""
+        payload = json.dumps({'k': values, 'd': direction}, default=str)
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(token):
+        """解析分页游标，返回 (键值列表, 方向)"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            values, direction = payload['k'], payload.get('d', 'next')
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if direction not in ('next', 'prev') or not isinstance(values, list):
+            raise ValueError('Invalid cursor')
+        return values, direction
+
     @classmethod
-    def get_table_data(cls, db_config, table_name, limit=100, offset=0, filters=None):
-        """获取表数据，支持分页和列筛选"""
+    def _get_key_columns(cls, db_config, table_name, key_columns=None):
+        """
+        获取键集分页使用的有序唯一键：优先使用指定的唯一索引列，否则使用主键
+        """
+        keys = cls.get_unique_keys(db_config, table_name)
+        pk = keys['primary']
+
+        if key_columns:
+            key_columns = list(key_columns)
+            unique_keys = ([pk] if pk else []) + keys['unique']
+            return key_columns if key_columns in unique_keys else None
+        return pk or None
+
+    @staticmethod
+    def _keyset_condition(key_columns, op):
+        """
+        构建 (k1, k2, ...) op (:c0, :c1, ...) 的展开形式，兼容不支持行值比较的数据库
+        """
+        clauses = []
+        for i, col in enumerate(key_columns):
+            parts = [f"{key_columns[j]} = :cursor_{j}" for j in range(i)]
+            parts.append(f"{col} {op} :cursor_{i}")
+            clauses.append("(" + " AND ".join(parts) + ")")
+        return "(" + " OR ".join(clauses) + ")"
+
+    @staticmethod
+    def _build_table_query(columns_info, table_name, filters=None):
+        """
+        构建带列筛选的基础查询，返回 (query_str, params, conditions)。
+        筛选条件按列类型生成（等值 / IN / 范围 / 前缀 / IS NULL），见 table_filter.build_conditions
+        """
+        query_str = f"SELECT * FROM {table_name}"
+        conditions, params = build_conditions(columns_info, filters)
+
+        if conditions:
+            query_str += " WHERE " + " AND ".join(conditions)
+
+        return query_str, params, conditions
+
+    @classmethod
+    def get_table_count(cls, db_config, table_name, filters=None, count='estimate'):
+        """获取表（带筛选条件）的总行数，count 策略见 _resolve_count"""
         try:
             engine = cls._get_engine(db_config)
-            
+            columns_info = cls.get_columns(db_config, table_name)
+            if columns_info is None:
+                return {'status': 'error', 'message': 'Table not found'}
+
+            query_str, params, conditions = cls._build_table_query(columns_info, table_name, filters)
+            count_info = cls._resolve_count(engine, db_config, table_name, query_str, params, conditions, count)
+            return {'status': 'success', **count_info}
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    @classmethod
+    def get_table_data(cls, db_config, table_name, limit=100, offset=0, filters=None,
+                       cursor=None, keyset=False, key_columns=None, count='estimate', order_by=None):
+        """
+        获取表数据，支持分页、列筛选和排序。
+        keyset=True 或传入 cursor 时使用键集分页（按主键或指定唯一索引 seek），
+        深分页代价与首页相同；表没有可用唯一键或指定了 order_by 时回退到 LIMIT/OFFSET。
+        order_by 为 "col1,-col2" 格式（- 表示降序），列名按表结构校验。
+        count 为总数策略，见 _resolve_count
+        """
+        try:
             # 验证表名是否存在，防止注入
-            inspector = inspect(engine)
-            if table_name not in inspector.get_table_names():
+            columns_info = cls.get_columns(db_config, table_name)
+            if columns_info is None:
                 return {'status': 'error', 'message': 'Table not found'}
             
             # 构建查询
-            query_str = f"SELECT * FROM {table_name}"
-            params = {}
-            conditions = []
-            
-            columns_info = inspector.get_columns(table_name)
-            col_names = [c['name'] for c in columns_info]
-            
-            # 列筛选
-            if filters:
-                for col, val in filters.items():
-                    # 验证列名是否存在
-                    if col in col_names and val is not None:
-                        val_str = str(val).strip()
-                        if val_str:
-                            param_name = f"filter_{col}"
-                            conditions.append(f"{col} LIKE :{param_name}")
-                            params[param_name] = f"%{val_str}%"
-
-            if conditions:
-                query_str += " WHERE " + " AND ".join(conditions)
-
-            # 获取总数 (用于分页)
-            count_query = f"SELECT COUNT(*) FROM ({query_str}) as subquery"
-            
-            # 添加分页
-            query_str += f" LIMIT {limit} OFFSET {offset}"
-            
-            with engine.connect() as conn:
-                # 执行总数查询
-                total_result = conn.execute(text(count_query), params)
-                total = total_result.scalar()
-                
-                # 执行数据查询
-                result = conn.execute(text(query_str), params)
-                columns = list(result.keys())
-                rows = [list(row) for row in result.fetchall()]
-                
-                return {
-                    'status': 'success',
-                    'columns': columns,
-                    'rows': rows,
-                    'total': total,
-                    'limit': limit,
-                    'offset': offset
-                }
+            query_str, params, conditions = cls._build_table_query(columns_info, table_name, filters)
+            order = parse_order_by(columns_info, order_by)
+
+            keys = None
+            if (keyset or cursor) and not order:
+                keys = cls._get_key_columns(db_config, table_name, key_columns)
+                if key_columns and not keys:
+                    return {'status': 'error', 'message': 'Key columns must be a primary key or unique index'}
+
+            # 数据和总数查询优先走只读副本
+            engine, conn, replica = cls._connect(db_config, read_only=True)
+            with conn:
+                if keys:
+                    page = cls._fetch_keyset_page(conn, query_str, params, conditions, keys, limit, cursor)
+                else:
+                    page_query = query_str
+                    if order:
+                        # 追加主键保证分页顺序稳定
+                        order_cols = [c for c, _ in order]
+                        primary = cls.get_unique_keys(db_config, table_name)['primary']
+                        order += [(k, 'ASC') for k in primary if k not in order_cols]
+                        page_query += " ORDER BY " + ", ".join(f"{c} {d}" for c, d in order)
+                    # 添加分页
+                    page_query += f" LIMIT {limit} OFFSET {offset}"
+
+                    # 执行数据查询
+                    result = conn.execute(text(page_query), params)
+                    page = {
+                        'status': 'success',
+                        'columns': list(result.keys()),
+                        'rows': [list(row) for row in result.fetchall()],
+                        'limit': limit,
+                        'offset': offset,
+                        'paging': 'offset'
+                    }
+            if page['status'] != 'success':
+                return page
+
+            # 释放数据查询的连接后再计算总数（估算 / 精确计数各自签出连接），避免单个请求同时占用两个连接
+            count_info = cls._resolve_count(engine, db_config, table_name, query_str, params, conditions, count)
+            if replica:
+                count_info['replica'] = replica
+            count_info['column_types'] = column_kinds(columns_info)
+            if order:
+                count_info['order_by'] = order_by
+            return {**page, **count_info}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
 
+    @classmethod
+    def _fetch_keyset_page(cls, conn, query_str, params, conditions, keys, limit, cursor):
+        """按键集游标读取一页数据，多取一行用于判断是否还有下一页/上一页"""
+        direction = 'next'
+        params = dict(params)
+        if cursor:
+            values, direction = cls.decode_cursor(cursor)
+            if len(values) != len(keys):
+                return {'status': 'error', 'message': 'Invalid cursor'}
+            for i, value in enumerate(values):
+                params[f"cursor_{i}"] = value
+            seek = cls._keyset_condition(keys, '>' if direction == 'next' else '<')
+            query_str += (" AND " if conditions else " WHERE ") + seek
+
+        order = 'ASC' if direction == 'next' else 'DESC'
+        query_str += " ORDER BY " + ", ".join(f"{k} {order}" for k in keys)
+        query_str += f" LIMIT {limit + 1}"
+
+        result = conn.execute(text(query_str), params)
+        columns = list(result.keys())
+        rows = [list(row) for row in result.fetchall()]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'prev':
+            rows.reverse()
+
+        key_idx = [columns.index(k) for k in keys]
+        first_key = [rows[0][i] for i in key_idx] if rows else None
+        last_key = [rows[-1][i] for i in key_idx] if rows else None
+
+        if direction == 'next':
+            has_next, has_prev = has_more, cursor is not None
+        else:
+            has_next, has_prev = True, has_more
+
+        return {
+            'status': 'success',
+            'columns': columns,
+            'rows': rows,
+            'limit': limit,
+            'paging': 'keyset',
+            'key_columns': keys,
+            'next_cursor': cls.encode_cursor(last_key, 'next') if has_next and rows else None,
+            'prev_cursor': cls.encode_cursor(first_key, 'prev') if has_prev and rows else None
+        }
+
+    @staticmethod
+    def _estimate_row_count(engine, table_name, conn=None):
+        """
+        从系统目录读取估算行数：PostgreSQL 的 pg_class.reltuples、
+        MySQL 的 information_schema.TABLES.TABLE_ROWS、SQLite 的 sqlite_stat1。
+        传入 conn 时复用该连接，否则单独签出一个。统计信息不可用时返回 None
+        """
+        dialect = engine.dialect.name
+        if dialect == 'postgresql':
+            sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"
+        elif dialect == 'mysql':
+            sql = ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table")
+        elif dialect == 'sqlite':
+            sql = "SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"
+        else:
+            return None
+
+        try:
+            if conn is not None:
+                # 在嵌套事务中读取，统计表不存在等错误不影响调用方连接上的事务
+                with conn.begin_nested():
+                    value = conn.execute(text(sql), {'table': table_name}).scalar()
+            else:
+                with engine.connect() as own_conn:
+                    value = own_conn.execute(text(sql), {'table': table_name}).scalar()
+        except Exception as e:
+            logger.debug(f"Row estimate unavailable for {table_name}: {e}")
+            return None
+
+        if value is None:
+            return None
+        if dialect == 'sqlite':
+            # stat 格式为 "行数 每个索引列的平均重复数..."
+            value = str(value).split()[0]
+        value = int(float(value))
+        # PostgreSQL 未 ANALYZE 的表 reltuples 为 -1
+        return value if value >= 0 else None
+
+    @staticmethod
+    def _count_cache_key(db_config, table_name, query_str, params):
+        return (db_config.id, table_name, query_str, tuple(sorted(params.items())))
+
+    @staticmethod
+    def _get_cached_count(key):
+        with _count_lock:
+            cached = _count_cache.get(key)
+        if cached and time.time() - cached[1] < COUNT_CACHE_TTL:
+            return cached[0]
+        return None
+
+    @staticmethod
+    def _run_exact_count(engine, key, query_str, params):
+        """执行 COUNT(*) 并写入缓存"""
+        count_query = f"SELECT COUNT(*) FROM ({query_str}) as subquery"
+        try:
+            with engine.connect() as conn:
+                total = conn.execute(text(count_query), params).scalar()
+            with _count_lock:
+                _count_cache[key] = (total, time.time())
+            return total
+        finally:
+            with _count_lock:
+                _count_pending.discard(key)
+
+    @classmethod
+    def _resolve_count(cls, engine, db_config, table_name, query_str, params, conditions, count='estimate'):
+        """
+        计算分页总数，返回 {'total', 'total_type', 'count_pending'}。
+        conditions 为 _build_table_query 生成的筛选条件（IS NULL 等条件没有绑定参数，不能只看 params）。
+        count 策略：
+          estimate - 优先使用缓存的精确值；无筛选条件时使用系统目录估算值，否则同步精确计数
+          async    - 同 estimate，但返回估算值的同时在后台计算精确值并缓存
+          exact    - 同步精确计数（结果缓存）
+          none     - 不计算总数
+        """
+        if count == 'none':
+            return {'total': None, 'total_type': 'none', 'count_pending': False}
+
+        key = cls._count_cache_key(db_config, table_name, query_str, params)
+        cached = cls._get_cached_count(key)
+        if cached is not None:
+            return {'total': cached, 'total_type': 'exact', 'count_pending': False}
+
+        if count in ('estimate', 'async') and not conditions:
+            estimate = cls._estimate_row_count(engine, table_name)
+            if estimate is not None:
+                pending = False
+                if count == 'async':
+                    with _count_lock:
+                        pending = True
+                        if key not in _count_pending:
+                            _count_pending.add(key)
+                            _count_executor.submit(cls._run_exact_count, engine, key, query_str, params)
+                return {'total': estimate, 'total_type': 'estimated', 'count_pending': pending}
+
+        total = cls._run_exact_count(engine, key, query_str, params)
+        return {'total': total, 'total_type': 'exact', 'count_pending': False}
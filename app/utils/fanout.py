@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app.utils.query_guard import WATCHDOG_GRACE, cancel_query
+from app.utils.task_executor import task_executor
+
+logger = logging.getLogger('db_monitor')
+
+# 合并结果中标识来源数据库的列名
+SOURCE_COLUMN = '_source_db'
+
+
+def parse_tags(value):
+    """逗号分隔的标签字符串 -> 去重后的标签列表"""
+    tags = []
+    for tag in (value or '').split(','):
+        tag = tag.strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def resolve_targets(db_ids=None, tag=None):
+    """按 ID 列表和/或标签查找目标数据库配置（按 ID 排序，去重），忽略空白的 ID"""
+    from app.models.database import DatabaseConfig
+
+    targets = {}
+    ids = [int(i) for i in db_ids or [] if str(i).strip()]
+    if ids:
+        for config in DatabaseConfig.query.filter(DatabaseConfig.id.in_(ids)).all():
+            targets[config.id] = config
+    if tag:
+        for config in DatabaseConfig.query.filter(DatabaseConfig.tags.isnot(None)).all():
+            if tag in parse_tags(config.tags):
+                targets[config.id] = config
+    return [targets[k] for k in sorted(targets)]
+
+
+def merge_results(results, source_column=SOURCE_COLUMN):
+    """
+    合并各目标库的结果：列为来源列 + 各结果列的并集（按首次出现顺序），
+    某个库缺少的列填 None
+    """
+    columns = []
+    for item in results:
+        for col in item.get('columns') or []:
+            if col not in columns:
+                columns.append(col)
+    rows = []
+    for item in results:
+        if not item.get('columns'):
+            continue
+        if item['columns'] == columns:
+            rows.extend([item['name']] + row for row in item['rows'])
+        else:
+            positions = [item['columns'].index(c) if c in item['columns'] else None for c in columns]
+            rows.extend([item['name']] + [row[p] if p is not None else None for p in positions]
+                        for row in item['rows'])
+    return [source_column] + columns if columns else None, rows
+
+
+class FanOutRunner:
+    """
+    在多个数据库上并发执行同一查询：共享固定大小的线程池，
+    每个目标库单独超时，部分目标失败时仍返回其余结果
+    """
+
+    def __init__(self, max_workers=8, slot_timeout=300):
+        self.max_workers = max_workers
+        # 定时任务等待目标库并发名额的最长时间（秒）
+        self.slot_timeout = slot_timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None, slot_timeout=None):
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if slot_timeout is not None:
+            self.slot_timeout = slot_timeout
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fan-out')
+            return self._executor
+
+    def run(self, app, db_configs, query, params=None, timeout=None, source_column=SOURCE_COLUMN,
+            task_slots=False):
+        """
+        返回 {'status': success/partial/error, 'columns', 'rows', 'count', 'targets': [每个库的状态], ...}
+        timeout 为每个目标库的超时（秒）；排队等待的时间不计入。
+        task_slots=True（定时任务）时在调用线程中占用 task_executor 中各目标库的并发名额，
+        占到名额后才提交到共享线程池（等待名额不占用池中的线程），执行结束后释放；
+        超过 slot_timeout 仍未占到名额的目标库记为失败
+        """
+        batch_id = uuid.uuid4().hex[:12]
+        start_time = time.time()
+        executor = self._get_executor()
+        futures = {}
+        targets = {}
+        for config in db_configs:
+            run_id = f"fanout_{batch_id}_{config.id}"
+            targets[config.id] = {'db_id': config.id, 'name': config.name, 'run_id': run_id,
+                                  'status': 'queued', 'started_at': None}
+
+        def submit(config):
+            future = executor.submit(self._run_one, app, config.id, query, params, timeout, targets[config.id])
+            if task_slots:
+                # 取消或完成时都释放名额
+                future.add_done_callback(lambda _, db_id=config.id: task_executor.release_db(db_id))
+            futures[future] = config.id
+            pending.add(future)
+
+        pending = set()
+        waiting = list(db_configs) if task_slots else []
+        slot_deadline = start_time + self.slot_timeout
+        if not task_slots:
+            for config in db_configs:
+                submit(config)
+
+        while pending or waiting:
+            for config in list(waiting):
+                if task_executor.acquire_db(config.id, config.task_concurrency, timeout=0):
+                    waiting.remove(config)
+                    submit(config)
+            if waiting and time.time() >= slot_deadline:
+                for config in waiting:
+                    targets[config.id].update(status='error', finished=True,
+                                              error=f"Timed out after {self.slot_timeout}s waiting for a task slot")
+                waiting = []
+            if pending:
+                done, pending = wait(pending, timeout=0.5)
+            elif waiting:
+                task_executor.wait_released(0.5)
+            if not timeout:
+                continue
+            # 目标库开始执行后超过 timeout + 宽限时间仍未返回的，取消并标记超时
+            now = time.time()
+            for future in list(pending):
+                target = targets[futures[future]]
+                if target['started_at'] and now - target['started_at'] > timeout + WATCHDOG_GRACE * 2:
+                    cancel_query(target['run_id'])
+                    future.cancel()
+                    target.update(status='error', error=f"Timed out after {timeout}s", finished=True,
+                                  elapsed=round(now - target['started_at'], 3))
+                    pending.discard(future)
+
+        results = []
+        by_target = {db_id: future for future, db_id in futures.items()}
+        for db_id, target in targets.items():
+            future = by_target.get(db_id)
+            if not target.get('finished'):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'status': 'error', 'error': str(e)}
+                target.update(status=result['status'], error=result.get('error'), finished=True)
+                if result['status'] == 'success':
+                    target.update(columns=result.get('columns'), rows=result.get('rows', []))
+            target['count'] = len(target.get('rows') or [])
+            results.append(target)
+
+        columns, rows = merge_results([t for t in results if t['status'] == 'success'], source_column)
+        succeeded = sum(1 for t in results if t['status'] == 'success')
+        failed = len(results) - succeeded
+        if not results or succeeded == 0:
+            status = 'error'
+        else:
+            status = 'partial' if failed else 'success'
+        errors = [f"{t['name']}: {t['error']}" for t in results if t['status'] != 'success']
+
+        summary = {
+            'status': status,
+            'count': len(rows),
+            'targets': [{k: t.get(k) for k in ('db_id', 'name', 'status', 'count', 'elapsed', 'error')}
+                        for t in results],
+            'succeeded': succeeded,
+            'failed': failed,
+            'elapsed': round(time.time() - start_time, 3)
+        }
+        if columns:
+            summary.update(columns=columns, rows=rows)
+        if errors:
+            summary['error'] = '; '.join(errors)
+        logger.info(f"Fan-out query on {len(results)} databases: {succeeded} succeeded, {failed} failed "
+                    f"({summary['elapsed']}s)")
+        return summary
+
+    @staticmethod
+    def _run_one(app, db_id, query, params, timeout, target):
+        from app.models.database import DatabaseConfig
+        from app.utils.database_helper import DatabaseHelper
+
+        target['started_at'] = time.time()
+        target['status'] = 'running'
+        with app.app_context():
+            db_config = DatabaseConfig.query.get(db_id)
+            if db_config is None:
+                result = {'status': 'error', 'error': 'Database not found'}
+            else:
+                result = DatabaseHelper.execute_query(db_config, query, params=params, timeout=timeout,
+                                                      run_id=target['run_id'])
+        target['elapsed'] = round(time.time() - target['started_at'], 3)
+        return result
+
+
+fanout_runner = FanOutRunner()
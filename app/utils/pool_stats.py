@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+
+# 用于计算等待时间分位数的最近签出样本数
+WAIT_SAMPLES = 1000
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(int(len(sorted_values) * pct / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class PoolStats:
+    """
+    单个引擎连接池的统计：通过连接池事件记录签出、归还、新建连接、连接失效和溢出使用，
+    通过包装 pool.connect() 记录签出等待时间（含等待空闲连接、新建连接和 pre-ping）
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.since = time.time()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.checkout_timeouts = 0
+        self.checkout_errors = 0
+        self.checked_out_peak = 0
+        self.overflow_peak = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._lock = threading.Lock()
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        pool = self.engine.pool
+        checked_out = pool.checkedout() if hasattr(pool, 'checkedout') else 0
+        overflow = max(pool.overflow(), 0) if hasattr(pool, 'overflow') else 0
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out_peak = max(self.checked_out_peak, checked_out)
+            self.overflow_peak = max(self.overflow_peak, overflow)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def record_wait(self, seconds, error=None):
+        """记录一次签出耗时，签出失败（如连接池超时）时同时计数"""
+        with self._lock:
+            if isinstance(error, exc.TimeoutError):
+                self.checkout_timeouts += 1
+            elif error is not None:
+                self.checkout_errors += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+
+    def snapshot(self):
+        pool = self.engine.pool
+        current = {}
+        for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+            if hasattr(pool, name):
+                current[name] = getattr(pool, name)()
+        if 'overflow' in current:
+            current['overflow'] = max(current['overflow'], 0)
+
+        with self._lock:
+            waits = sorted(self._waits)
+            measured = len(self._waits)
+            return {
+                'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.since)),
+                'pool_class': type(pool).__name__,
+                'pool_size': current.get('size'),
+                'checked_out': current.get('checkedout'),
+                'idle': current.get('checkedin'),
+                'overflow': current.get('overflow'),
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'checkout_timeouts': self.checkout_timeouts,
+                'checkout_errors': self.checkout_errors,
+                'checked_out_peak': self.checked_out_peak,
+                'overflow_peak': self.overflow_peak,
+                'wait_avg_ms': round(sum(waits) / measured * 1000, 3) if measured else None,
+                'wait_p50_ms': round(_percentile(waits, 50) * 1000, 3) if measured else None,
+                'wait_p95_ms': round(_percentile(waits, 95) * 1000, 3) if measured else None,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'wait_total_s': round(self.wait_total, 3)
+            }
+
+
+def instrument(engine):
+    """为引擎的连接池注册事件监听并包装 connect()，返回 PoolStats"""
+    stats = PoolStats(engine)
+    event.listen(engine, 'connect', stats._on_connect)
+    event.listen(engine, 'checkout', stats._on_checkout)
+    event.listen(engine, 'checkin', stats._on_checkin)
+    event.listen(engine, 'invalidate', stats._on_invalidate)
+    event.listen(engine, 'soft_invalidate', stats._on_invalidate)
+
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            connection = connect()
+        except Exception as e:
+            stats.record_wait(time.perf_counter() - start, error=e)
+            raise
+        stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    pool.connect = timed_connect
+    return stats
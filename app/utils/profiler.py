@@ -0,0 +1,172 @@
+import math
+import random
+from datetime import date, datetime, time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app.utils.aggregation import result_to_frame
+
+# 默认采样行数和上限
+PROFILE_SAMPLE_ROWS = 10000
+PROFILE_MAX_SAMPLE_ROWS = 100000
+# 随机主键区间采样的区间数
+PROFILE_SAMPLE_CHUNKS = 10
+# 每列返回的高频值个数
+PROFILE_TOP_N = 5
+# 高频值过长时截断
+PROFILE_VALUE_MAX_LEN = 100
+# HyperLogLog 寄存器位数（2^12 个寄存器，标准误差约 1.6%）
+HLL_PRECISION = 12
+
+
+def _bit_length(values):
+    """uint64 数组每个元素的二进制位数（向量化）"""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.uint64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        shift = np.uint64(shift)
+        high = (values >> shift) > 0
+        values = np.where(high, values >> shift, values)
+        length += np.where(high, shift, np.uint64(0))
+    return length + (values > 0).astype(np.uint64)
+
+
+def hll_estimate(hashes, precision=HLL_PRECISION):
+    """
+    HyperLogLog 基数估算：hashes 为 uint64 哈希数组，
+    高 precision 位选择寄存器，剩余位的前导零个数 + 1 为该元素的 rank
+    """
+    if len(hashes) == 0:
+        return 0
+    m = 1 << precision
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    rank = (np.uint64(64 - precision) - _bit_length(rest) + np.uint64(1)).astype(np.int64)
+    registers = np.zeros(m, dtype=np.int64)
+    np.maximum.at(registers, index, rank)
+
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.power(2.0, -registers))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # 小基数时使用线性计数修正
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def _hash_series(series):
+    try:
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+    except TypeError:
+        # 不可哈希的值（如 JSON 列返回的 dict / list）按字符串处理
+        return pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy()
+
+
+def _scalar(value):
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        value = value.hex()
+    if isinstance(value, (int, float, bool)):
+        return value
+    text = str(value)
+    return text[:PROFILE_VALUE_MAX_LEN] + '...' if len(text) > PROFILE_VALUE_MAX_LEN else text
+
+
+def profile_column(series, top_n=PROFILE_TOP_N):
+    """单列概况：空值比例、近似去重数、最小 / 最大值和高频值"""
+    total = len(series)
+    present = series.dropna()
+    non_null = len(present)
+    result = {
+        'nulls': total - non_null,
+        'null_ratio': round((total - non_null) / total, 4) if total else None,
+        'distinct_approx': hll_estimate(_hash_series(present)),
+        'min': None,
+        'max': None,
+        'top_values': []
+    }
+    if non_null:
+        result['distinct_ratio'] = round(min(result['distinct_approx'], non_null) / non_null, 4)
+        try:
+            result['min'] = _scalar(present.min())
+            result['max'] = _scalar(present.max())
+        except TypeError:
+            # 混合类型无法比较
+            pass
+        try:
+            counts = present.value_counts(sort=True).head(top_n)
+        except TypeError:
+            counts = present.astype(str).value_counts(sort=True).head(top_n)
+        result['top_values'] = [{'value': _scalar(v), 'count': int(c), 'ratio': round(int(c) / non_null, 4)}
+                                for v, c in counts.items()]
+    return result
+
+
+def profile_frame(df, top_n=PROFILE_TOP_N):
+    return {str(col): profile_column(df[col], top_n) for col in df.columns}
+
+
+def sample_plan(dialect, row_estimate, sample_rows):
+    """
+    选择采样方式：
+      full        - 表行数不超过采样行数，读取全表（LIMIT 保护）
+      tablesample - PostgreSQL 按估算行数计算 TABLESAMPLE SYSTEM 百分比
+      pk_range    - 其他数据库在整数主键上随机选取若干区间
+    """
+    if row_estimate is not None and row_estimate <= sample_rows:
+        return 'full', None
+    if dialect == 'postgresql' and row_estimate:
+        # 按块采样，放大比例以抵消块内行数不均，最终由 LIMIT 截断
+        return 'tablesample', min(100.0, sample_rows * 150.0 / row_estimate)
+    return 'pk_range', None
+
+
+def read_sample(conn, table_name, dialect, pk, row_estimate, sample_rows):
+    """
+    读取有界样本，返回 (columns, rows, method)。
+    pk 为单列整数主键名，没有时 pk_range 回退为读取前 sample_rows 行
+    """
+    method, percent = sample_plan(dialect, row_estimate, sample_rows)
+    if method == 'tablesample':
+        result = conn.execute(text(f"SELECT * FROM {table_name} TABLESAMPLE SYSTEM ({percent:.6f}) "
+                                   f"LIMIT {sample_rows}"))
+        return list(result.keys()), [list(r) for r in result.fetchall()], method
+
+    if method == 'pk_range' and pk:
+        low, high = conn.execute(text(f"SELECT MIN({pk}), MAX({pk}) FROM {table_name}")).fetchone()
+        if low is not None and high - low + 1 > sample_rows:
+            chunk = max(sample_rows // PROFILE_SAMPLE_CHUNKS, 1)
+            starts = sorted(random.randint(int(low), int(high)) for _ in range(PROFILE_SAMPLE_CHUNKS))
+            columns, rows, seen = None, [], set()
+            for start in starts:
+                result = conn.execute(text(f"SELECT * FROM {table_name} WHERE {pk} >= :start "
+                                           f"ORDER BY {pk} LIMIT {chunk}"), {'start': start})
+                if columns is None:
+                    columns = list(result.keys())
+                    pk_index = columns.index(pk)
+                for row in result.fetchall():
+                    if row[pk_index] not in seen:
+                        seen.add(row[pk_index])
+                        rows.append(list(row))
+            return columns, rows, method
+
+    result = conn.execute(text(f"SELECT * FROM {table_name} LIMIT {sample_rows}"))
+    rows = [list(r) for r in result.fetchall()]
+    return list(result.keys()), rows, 'full' if len(rows) < sample_rows else 'head'
+
+
+def profile_rows(columns, rows, top_n=PROFILE_TOP_N):
+    """将样本转换为 DataFrame 并逐列计算概况"""
+    df = result_to_frame(columns, rows)
+    return profile_frame(df, top_n)
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+import uuid
+from sqlalchemy import text
+
+logger = logging.getLogger('db_monitor')
+
+# 正在执行的查询：run_id -> QueryRun
+_running_queries = {}
+_running_lock = threading.Lock()
+
+# 超时看门狗在原生超时之后多等待的秒数，正常情况下由数据库自身的超时机制先生效
+WATCHDOG_GRACE = 1.0
+
+
+class QueryRun:
+    """
+    单次查询的超时与取消控制，按方言使用原生机制：
+      PostgreSQL - SET LOCAL statement_timeout，取消时调用驱动的 cancel()
+      MySQL      - SET SESSION MAX_EXECUTION_TIME（仅对 SELECT 生效），取消/超时时 KILL QUERY
+      SQLite     - progress handler 检查截止时间和取消标记
+    """
+
+    def __init__(self, engine, db_config, timeout=None, run_id=None):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.db_name = db_config.name
+        self.timeout = timeout or 0
+        self.run_id = run_id or uuid.uuid4().hex
+        # 调用方指定了 run_id 时才可能通过 cancel_query 取消
+        self._cancellable = run_id is not None
+        self.started_at = None
+        self.deadline = None
+        self.reason = None  # cancelled / timeout
+        self._conn = None
+        self._dbapi_conn = None
+        self._backend_id = None
+        self._timer = None
+
+    def attach(self, conn):
+        """在连接上启用超时设置并登记为运行中"""
+        self._conn = conn
+        self._dbapi_conn = conn.connection.dbapi_connection
+        self.started_at = time.time()
+        if self.timeout:
+            self.deadline = self.started_at + self.timeout
+
+        if self.dialect == 'postgresql':
+            if self.timeout:
+                conn.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}"))
+        elif self.dialect == 'mysql':
+            # 驱动握手时已拿到连接 ID，只有在驱动不提供时才查询
+            thread_id = getattr(self._dbapi_conn, 'thread_id', None)
+            if thread_id is not None:
+                self._backend_id = thread_id()
+            elif self.timeout or self._cancellable:
+                self._backend_id = conn.execute(text("SELECT CONNECTION_ID()")).scalar()
+            if self.timeout:
+                conn.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(self.timeout * 1000)}"))
+        elif self.dialect == 'sqlite':
+            self._dbapi_conn.set_progress_handler(self._sqlite_progress, 1000)
+
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout + WATCHDOG_GRACE, self.cancel, args=('timeout',))
+            self._timer.daemon = True
+            self._timer.start()
+
+        with _running_lock:
+            _running_queries[self.run_id] = self
+        return self
+
+    def reapply_timeout(self):
+        """
+        事务提交后重新设置 PostgreSQL 的语句超时（SET LOCAL 只在当前事务内有效），取剩余时间，
+        用于逐条提交的脚本
+        """
+        if self.dialect == 'postgresql' and self.deadline and self._conn is not None:
+            remaining = max(self.deadline - time.time(), 0.001)
+            self._conn.execute(text(f"SET LOCAL statement_timeout = {max(int(remaining * 1000), 1)}"))
+
+    def detach(self):
+        """恢复连接设置并注销"""
+        with _running_lock:
+            _running_queries.pop(self.run_id, None)
+        if self._timer:
+            self._timer.cancel()
+        if self._conn is None:
+            return
+        try:
+            if self.dialect == 'mysql' and self.timeout and not (self._conn.closed or self._conn.invalidated):
+                self._conn.execute(text("SET SESSION MAX_EXECUTION_TIME = 0"))
+            elif self.dialect == 'sqlite':
+                self._dbapi_conn.set_progress_handler(None, 0)
+        except Exception as e:
+            logger.debug(f"Failed to reset query guard settings: {e}")
+        self._conn = None
+
+    def _sqlite_progress(self):
+        # 返回非零值时 SQLite 中断当前语句
+        if self.reason:
+            return 1
+        if self.deadline and time.time() > self.deadline:
+            self.reason = 'timeout'
+            return 1
+        return 0
+
+    def cancel(self, reason='cancelled'):
+        """中断正在执行的语句（可从其他线程调用）"""
+        if self._conn is None or self.reason:
+            return False
+        self.reason = reason
+        try:
+            if self.dialect == 'postgresql':
+                self._dbapi_conn.cancel()
+            elif self.dialect == 'mysql' and self._backend_id:
+                with self.engine.connect() as kill_conn:
+                    kill_conn.execute(text(f"KILL QUERY {int(self._backend_id)}"))
+            elif self.dialect == 'sqlite':
+                self._dbapi_conn.interrupt()
+            logger.info(f"Query {self.run_id} on {self.db_name} {reason}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to cancel query {self.run_id}: {e}")
+            return False
+
+    def error_message(self, error):
+        """将驱动抛出的中断错误转换为可读信息"""
+        if self.reason is None and self.deadline and time.time() >= self.deadline:
+            self.reason = 'timeout'
+        if self.reason == 'timeout':
+            return f"Query timed out after {self.timeout} seconds"
+        if self.reason == 'cancelled':
+            return "Query cancelled"
+        return str(error)
+
+
+def cancel_query(run_id):
+    """按 run_id 取消正在执行的查询，返回是否找到并取消"""
+    with _running_lock:
+        run = _running_queries.get(run_id)
+    if run is None:
+        return False
+    return run.cancel('cancelled')
+
+
+def list_running_queries():
+    with _running_lock:
+        runs = list(_running_queries.values())
+    now = time.time()
+    return [{
+        'run_id': r.run_id,
+        'db_name': r.db_name,
+        'elapsed': round(now - r.started_at, 3) if r.started_at else 0,
+        'timeout': r.timeout
+    } for r in runs]
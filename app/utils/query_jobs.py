@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger('db_monitor')
+
+# 结果在内存中最多保留的行数，超出后写入磁盘
+JOB_MEMORY_ROWS = 10000
+# 磁盘文件中每隔多少行记录一次偏移量，用于分页定位
+JOB_INDEX_STEP = 1000
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class QueryJob:
+    """
+    后台查询任务及其结果存储：结果行先保存在内存中，
+    超过 JOB_MEMORY_ROWS 后整体转存到磁盘（每行一个 JSON），按偏移量分页读取
+    """
+
+    def __init__(self, db_config_id, query, results_dir):
+        self.job_id = uuid.uuid4().hex
+        self.db_config_id = db_config_id
+        self.query = query
+        self.status = 'queued'  # queued, running, success, error, cancelled
+        self.columns = None
+        self.count = 0
+        self.truncated = False
+        self.message = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._results_dir = results_dir
+        self._rows = []
+        self._path = None
+        self._offsets = []
+        self._lock = threading.Lock()
+
+    def append(self, rows):
+        with self._lock:
+            if self._path is None and len(self._rows) + len(rows) > JOB_MEMORY_ROWS:
+                self._spill()
+            if self._path is None:
+                self._rows.extend(rows)
+            else:
+                self._write(rows)
+            self.count += len(rows)
+
+    def _spill(self):
+        os.makedirs(self._results_dir, exist_ok=True)
+        self._path = os.path.join(self._results_dir, f"{self.job_id}.jsonl")
+        open(self._path, 'w').close()
+        rows, self._rows = self._rows, []
+        self._write(rows, start=0)
+
+    def _write(self, rows, start=None):
+        index = self.count if start is None else start
+        with open(self._path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                if index % JOB_INDEX_STEP == 0:
+                    self._offsets.append(f.tell())
+                f.write(json.dumps(row, default=str) + '\n')
+                index += 1
+
+    def read(self, offset=0, limit=100):
+        """读取 [offset, offset + limit) 范围内的结果行"""
+        with self._lock:
+            if self._path is None:
+                return self._rows[offset:offset + limit]
+            path = self._path
+            count = self.count
+            block = offset // JOB_INDEX_STEP
+            if offset >= count or block >= len(self._offsets):
+                return []
+            start = self._offsets[block]
+
+        rows = []
+        skip = offset - block * JOB_INDEX_STEP
+        with open(path, 'r', encoding='utf-8') as f:
+            f.seek(start)
+            for line in f:
+                if skip:
+                    skip -= 1
+                    continue
+                rows.append(json.loads(line))
+                if len(rows) >= limit or offset + len(rows) >= count:
+                    break
+        return rows
+
+    def discard(self):
+        with self._lock:
+            self._rows = []
+            if self._path and os.path.exists(self._path):
+                os.remove(self._path)
+            self._path = None
+
+    @property
+    def finished(self):
+        return self.status in ('success', 'error', 'cancelled')
+
+    def to_dict(self):
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            'job_id': self.job_id,
+            'db_config_id': self.db_config_id,
+            'status': self.status,
+            'columns': self.columns,
+            'count': self.count,
+            'truncated': self.truncated,
+            'message': self.message,
+            'error': self.error,
+            'created_at': fmt(self.created_at),
+            'started_at': fmt(self.started_at),
+            'finished_at': fmt(self.finished_at),
+            'elapsed': elapsed
+        }
+
+
+class QueryJobManager:
+    """
+    后台查询任务管理：固定大小的线程池执行，排队任务数有上限，完成的任务结果在 TTL 后清理
+    """
+
+    def __init__(self, max_workers=4, max_pending=50, result_ttl=3600, results_dir=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.results_dir = results_dir or os.path.join(os.getcwd(), 'job_results')
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None, max_pending=None, result_ttl=None, results_dir=None):
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if result_ttl is not None:
+            self.result_ttl = result_ttl
+        if results_dir is not None:
+            self.results_dir = results_dir
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='query-job')
+        return self._executor
+
+    def submit(self, app, db_config, query, timeout=None, max_rows=0):
+        self.cleanup_expired()
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs ({pending})")
+            job = QueryJob(db_config.id, query, self.results_dir)
+            self._jobs[job.job_id] = job
+        self._get_executor().submit(self._run, app, job, timeout, max_rows)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        from app.utils.query_guard import cancel_query
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            return True
+        return cancel_query(job.job_id)
+
+    def remove(self, job_id):
+        self.cancel(job_id)
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job:
+            job.discard()
+        return job is not None
+
+    def cleanup_expired(self):
+        """清理超过 TTL 的已完成任务及其磁盘文件"""
+        now = time.time()
+        with self._lock:
+            expired = [j for j in self._jobs.values()
+                       if j.finished and j.finished_at and now - j.finished_at > self.result_ttl]
+            for job in expired:
+                del self._jobs[job.job_id]
+        for job in expired:
+            job.discard()
+
+    def _run(self, app, job, timeout, max_rows):
+        from app import db
+        from app.models.database import DatabaseConfig, QueryHistory
+        from app.utils.database_helper import DatabaseHelper
+
+        if job.status == 'cancelled':
+            return
+
+        with app.app_context():
+            job.status = 'running'
+            job.started_at = time.time()
+            db_config = DatabaseConfig.query.get(job.db_config_id)
+            try:
+                if db_config is None:
+                    raise ValueError('Database not found')
+                result = DatabaseHelper.stream_query(db_config, job.query, max_rows=max_rows,
+                                                     timeout=timeout, run_id=job.job_id)
+                if result['status'] != 'success':
+                    job.error = result.get('error')
+                elif 'stream' not in result:
+                    job.message = result.get('message')
+                else:
+                    stream = result['stream']
+                    job.columns = stream.columns
+                    try:
+                        for chunk in stream:
+                            job.append(chunk)
+                    except Exception as e:
+                        job.error = stream.error_message(e)
+                    finally:
+                        stream.close()
+                    job.truncated = stream.truncated
+            except Exception as e:
+                job.error = str(e)
+
+            if job.error:
+                job.status = 'cancelled' if job.error == 'Query cancelled' else 'error'
+                logger.error(f"Query job {job.job_id} failed: {job.error}")
+            else:
+                job.status = 'success'
+            job.finished_at = time.time()
+
+            try:
+                history = QueryHistory(
+                    db_config_id=job.db_config_id,
+                    sql_query=job.query,
+                    status='success' if job.status == 'success' else 'error',
+                    execution_time=job.finished_at - job.started_at,
+                    result_count=job.count,
+                    error_message=job.error
+                )
+                db.session.add(history)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to record job history: {e}")
+
+
+job_manager = QueryJobManager()
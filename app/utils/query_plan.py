@@ -0,0 +1,180 @@
+import hashlib
+import json
+import re
+from sqlalchemy import text
+
+# 执行计划树中每个节点的字段：
+#   operation       - 操作类型（如 SCAN、Seq Scan、ALL/ref）
+#   object          - 涉及的表名，没有时为 None
+#   detail          - 索引、过滤条件等补充说明
+#   estimated_rows  - 预估行数（SQLite 不提供）
+#   cost            - 预估代价（SQLite 不提供）
+#   children        - 子节点列表
+
+_SQLITE_OBJECT = re.compile(r'^(?:SCAN|SEARCH)(?: TABLE)? (\S+)', re.I)
+# SQLite 中表示全表扫描的计划（SCAN 且未使用索引）
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN(?: TABLE)? \S+(?: AS \S+)?$', re.I)
+
+
+def _node(operation, obj=None, detail=None, estimated_rows=None, cost=None, children=None):
+    return {
+        'operation': operation,
+        'object': obj,
+        'detail': detail,
+        'estimated_rows': estimated_rows,
+        'cost': cost,
+        'children': children or []
+    }
+
+
+def _float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _explain_sqlite(conn, query, params):
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {query}"), params or {}).fetchall()
+    nodes = {0: _node('QUERY')}
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[-1]
+        operation = detail.split(' USING ')[0].split(' (')[0]
+        match = _SQLITE_OBJECT.match(detail)
+        node = _node(operation.split(' ')[0] if match else operation,
+                     obj=match.group(1) if match else None,
+                     detail=detail)
+        if match and _SQLITE_FULL_SCAN.match(detail):
+            node['full_scan'] = True
+        nodes[node_id] = node
+        nodes.get(parent, nodes[0])['children'].append(node)
+    root = nodes[0]
+    return root['children'][0] if len(root['children']) == 1 else root, [list(r) for r in rows]
+
+
+def _pg_node(plan):
+    detail = []
+    for key in ('Index Name', 'Index Cond', 'Filter', 'Hash Cond', 'Join Filter', 'Sort Key', 'Group Key'):
+        if key in plan:
+            value = plan[key]
+            detail.append(f"{key}: {', '.join(value) if isinstance(value, list) else value}")
+    node = _node(plan.get('Node Type'),
+                 obj=plan.get('Relation Name'),
+                 detail='; '.join(detail) or None,
+                 estimated_rows=_float_or_none(plan.get('Plan Rows')),
+                 cost=_float_or_none(plan.get('Total Cost')),
+                 children=[_pg_node(p) for p in plan.get('Plans', [])])
+    if plan.get('Node Type') == 'Seq Scan':
+        node['full_scan'] = True
+    return node
+
+
+def _explain_postgresql(conn, query, params):
+    raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}"), params or {}).scalar()
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return _pg_node(raw[0]['Plan']), raw
+
+
+def _mysql_table_node(table):
+    cost_info = table.get('cost_info', {})
+    detail = []
+    if table.get('key'):
+        detail.append(f"key: {table['key']}")
+    if table.get('attached_condition'):
+        detail.append(f"condition: {table['attached_condition']}")
+    node = _node(table.get('access_type'),
+                 obj=table.get('table_name'),
+                 detail='; '.join(detail) or None,
+                 estimated_rows=_float_or_none(table.get('rows_produced_per_join') or table.get('rows_examined_per_scan')),
+                 cost=_float_or_none(cost_info.get('prefix_cost') or cost_info.get('read_cost')))
+    if table.get('access_type') == 'ALL':
+        node['full_scan'] = True
+    return node
+
+
+# MySQL JSON 计划中包裹子计划的操作
+_MYSQL_WRAPPERS = ('ordering_operation', 'grouping_operation', 'duplicates_removal',
+                   'windowing', 'buffer_result', 'materialized_from_subquery')
+
+
+def _mysql_children(block):
+    children = []
+    for key, value in block.items():
+        if key == 'table':
+            children.append(_mysql_table_node(value))
+            nested = value.get('materialized_from_subquery')
+            if nested:
+                children[-1]['children'] = _mysql_children(nested.get('query_block', nested))
+        elif key == 'nested_loop':
+            children.append(_node('nested_loop', children=[c for item in value for c in _mysql_children(item)]))
+        elif key in _MYSQL_WRAPPERS and isinstance(value, dict):
+            detail = 'using filesort' if value.get('using_filesort') else None
+            children.append(_node(key, detail=detail, children=_mysql_children(value)))
+        elif key in ('union_result', 'query_specifications'):
+            specs = value.get('query_specifications', []) if isinstance(value, dict) else value
+            children.append(_node('union', children=[_mysql_block(s.get('query_block', s)) for s in specs]))
+        elif key.endswith('subqueries') and isinstance(value, list):
+            children.extend(_mysql_block(s.get('query_block', s)) for s in value)
+    return children
+
+
+def _mysql_block(block):
+    return _node('query_block', detail=f"select#{block.get('select_id')}" if 'select_id' in block else None,
+                 cost=_float_or_none(block.get('cost_info', {}).get('query_cost')),
+                 children=_mysql_children(block))
+
+
+def _explain_mysql(conn, query, params):
+    raw = json.loads(conn.execute(text(f"EXPLAIN FORMAT=JSON {query}"), params or {}).scalar())
+    root = _mysql_block(raw.get('query_block', raw))
+    # 根节点的预估行数取所有表节点中的最大值
+    rows = [n['estimated_rows'] for n in iter_nodes(root) if n['estimated_rows'] is not None]
+    root['estimated_rows'] = max(rows) if rows else None
+    return root, raw
+
+
+EXPLAINERS = {
+    'sqlite': _explain_sqlite,
+    'postgresql': _explain_postgresql,
+    'mysql': _explain_mysql,
+}
+
+
+def iter_nodes(node):
+    yield node
+    for child in node['children']:
+        yield from iter_nodes(child)
+
+
+def plan_hash(plan):
+    """计划结构的指纹（忽略行数和代价），用于判断计划是否发生变化"""
+    def shape(node):
+        return [node['operation'], node['object'], [shape(c) for c in node['children']]]
+    return hashlib.sha1(json.dumps(shape(plan)).encode('utf-8')).hexdigest()
+
+
+def summarize(plan):
+    """从计划树中提取总代价、预估行数和全表扫描的表"""
+    return {
+        'total_cost': plan.get('cost'),
+        'estimated_rows': plan.get('estimated_rows'),
+        'full_scans': sorted({n['object'] for n in iter_nodes(plan) if n.get('full_scan') and n['object']})
+    }
+
+
+def explain(conn, dialect, query, params=None):
+    """
+    按方言执行 EXPLAIN（不实际执行语句），返回归一化的计划树、原始输出和摘要
+    """
+    explainer = EXPLAINERS.get(dialect)
+    if explainer is None:
+        raise ValueError(f"EXPLAIN is not supported for {dialect}")
+    plan, raw = explainer(conn, query.strip().rstrip(';'), params)
+    return {
+        'dialect': dialect,
+        'plan': plan,
+        'raw': raw,
+        'plan_hash': plan_hash(plan),
+        **summarize(plan)
+    }
@@ -0,0 +1,144 @@
+import logging
+import re
+import threading
+import time
+
+from app.utils.result_cache import _strip_literals, is_read_only
+
+logger = logging.getLogger('db_monitor')
+
+# 只读副本选择策略
+REPLICA_POLICIES = ('round_robin', 'least_latency')
+# 延迟的指数滑动平均系数
+LATENCY_ALPHA = 0.3
+
+# 行锁子句（PostgreSQL FOR [NO KEY] UPDATE / FOR [KEY] SHARE，MySQL FOR UPDATE / FOR SHARE）
+LOCKING_PATTERN = re.compile(r'\bfor\s+(no\s+key\s+update|update|key\s+share|share)\b')
+# SELECT 中有副作用、需要写事务或依赖会话状态的函数，这类语句始终在主库执行
+PRIMARY_ONLY_FUNCTIONS = re.compile(
+    r'\b(nextval|setval|currval|lastval|last_insert_id|txid_current|pg_current_xact_id'
+    r'|pg_(try_)?advisory_\w+|get_lock|release_lock|release_all_locks|pg_notify|set_config'
+    r'|pg_terminate_backend|pg_cancel_backend|lo_\w+|dblink_exec)\s*\('
+)
+
+
+def is_replica_safe(sql):
+    """
+    语句是否可以路由到只读副本：在 is_read_only 的基础上排除行锁子句、
+    有副作用或依赖会话状态的函数（nextval、advisory lock、GET_LOCK 等）和 PRAGMA（可能修改设置）
+    """
+    if not is_read_only(sql):
+        return False
+    stripped = _strip_literals(sql).lower()
+    if stripped.split(None, 1)[0] == 'pragma':
+        return False
+    return not (LOCKING_PATTERN.search(stripped) or PRIMARY_ONLY_FUNCTIONS.search(stripped))
+
+
+def parse_replicas(db_config):
+    """
+    解析 DatabaseConfig.replica_hosts（逗号分隔的 host[:port]，SQLite 为文件路径），
+    返回副本标识列表，未写端口的使用主库端口
+    """
+    replicas = []
+    for item in (db_config.replica_hosts or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if db_config.db_type != 'sqlite' and ':' not in item and db_config.port:
+            item = f"{item}:{db_config.port}"
+        if item not in replicas:
+            replicas.append(item)
+    return replicas
+
+
+def split_replica(db_config, replica):
+    """副本标识 -> (host, port)"""
+    if db_config.db_type == 'sqlite':
+        return replica, None
+    host, _, port = replica.rpartition(':')
+    return host, int(port)
+
+
+class ReplicaRouter:
+    """
+    只读语句的副本路由：按 round_robin 或 least_latency 选择副本，
+    连接失败的副本在 retry_seconds 内跳过，所有副本不可用时由调用方回退到主库
+    """
+
+    def __init__(self, retry_seconds=30):
+        self.retry_seconds = retry_seconds
+        # (db_config_id, 副本) -> {'down_until', 'latency', 'failures', 'last_error', 'queries'}
+        self._state = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def configure(self, retry_seconds=None):
+        if retry_seconds is not None:
+            self.retry_seconds = retry_seconds
+
+    def _get_state(self, db_id, replica):
+        return self._state.setdefault((db_id, replica), {
+            'down_until': 0, 'latency': None, 'failures': 0, 'last_error': None, 'queries': 0
+        })
+
+    def candidates(self, db_config):
+        """按策略排序的可用副本列表（不含当前标记为不可用的副本）"""
+        replicas = parse_replicas(db_config)
+        if not replicas:
+            return []
+        now = time.time()
+        with self._lock:
+            available = [r for r in replicas if self._get_state(db_config.id, r)['down_until'] <= now]
+            if not available:
+                return []
+            if db_config.replica_policy == 'least_latency':
+                # 尚无延迟数据的副本优先，以便获得测量值
+                return sorted(available, key=lambda r: self._get_state(db_config.id, r)['latency'] or 0)
+            start = self._counters.get(db_config.id, 0)
+            self._counters[db_config.id] = start + 1
+            start %= len(available)
+            return available[start:] + available[:start]
+
+    def record(self, db_id, replica, seconds):
+        with self._lock:
+            state = self._get_state(db_id, replica)
+            state['queries'] += 1
+            state['failures'] = 0
+            previous = state['latency']
+            state['latency'] = seconds if previous is None else previous + LATENCY_ALPHA * (seconds - previous)
+
+    def mark_down(self, db_id, replica, error):
+        with self._lock:
+            state = self._get_state(db_id, replica)
+            state['failures'] += 1
+            state['last_error'] = str(error).split('\n')[0]
+            state['down_until'] = time.time() + self.retry_seconds
+        logger.warning(f"Replica {replica} of database {db_id} unavailable for {self.retry_seconds}s: {error}")
+
+    def reset(self, db_id):
+        """配置修改后清除该数据库的副本状态"""
+        with self._lock:
+            for key in [k for k in self._state if k[0] == db_id]:
+                del self._state[key]
+            self._counters.pop(db_id, None)
+
+    def status(self, db_config):
+        now = time.time()
+        with self._lock:
+            result = []
+            for replica in parse_replicas(db_config):
+                state = self._get_state(db_config.id, replica)
+                result.append({
+                    'replica': replica,
+                    'available': state['down_until'] <= now,
+                    'retry_in': max(round(state['down_until'] - now, 1), 0),
+                    'latency_ms': round(state['latency'] * 1000, 2) if state['latency'] is not None else None,
+                    'queries': state['queries'],
+                    'failures': state['failures'],
+                    'last_error': state['last_error']
+                })
+            return result
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,233 @@
+import csv
+import gzip
+import io
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+from app.utils.xlsx_export import write_xlsx
+
+try:
+    import zstandard
+except ImportError:  # zstd 压缩为可选依赖
+    zstandard = None
+
+logger = logging.getLogger('db_monitor')
+
+# 格式 -> {'ext': 文件扩展名, 'writer': 写入函数, 'available': 依赖检查}
+ARCHIVE_WRITERS = {}
+# 所选格式不可用时的回退格式
+FALLBACK_FORMAT = 'csv.gz'
+# 每批写入的行数
+WRITE_BATCH_ROWS = 10000
+
+_UNSAFE_NAME = re.compile(r'[^\w\-.]+', re.U)
+
+
+def register_writer(fmt, ext, available=None):
+    """
+    注册结果文件格式。writer(path, columns, rows) 负责把结果写入 path，
+    available() 返回 False 时该格式不可用（缺少可选依赖）
+    """
+    def decorator(func):
+        ARCHIVE_WRITERS[fmt] = {'ext': ext, 'writer': func, 'available': available or (lambda: True)}
+        return func
+    return decorator
+
+
+def available_formats():
+    return [fmt for fmt, w in ARCHIVE_WRITERS.items() if w['available']()]
+
+
+def _write_csv(f, columns, rows):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for i in range(0, len(rows), WRITE_BATCH_ROWS):
+        writer.writerows(rows[i:i + WRITE_BATCH_ROWS])
+
+
+@register_writer('csv', 'csv')
+def write_csv(path, columns, rows):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        _write_csv(f, columns, rows)
+
+
+@register_writer('csv.gz', 'csv.gz')
+def write_csv_gzip(path, columns, rows):
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        _write_csv(f, columns, rows)
+
+
+@register_writer('csv.zst', 'csv.zst', available=lambda: zstandard is not None)
+def write_csv_zstd(path, columns, rows):
+    with open(path, 'wb') as raw:
+        with zstandard.ZstdCompressor(level=3).stream_writer(raw) as compressed:
+            with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as f:
+                _write_csv(f, columns, rows)
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        pass
+    try:
+        import fastparquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+@register_writer('parquet', 'parquet', available=_parquet_available)
+def write_parquet(path, columns, rows):
+    from app.utils.aggregation import result_to_frame
+    df = result_to_frame(columns, rows)
+    # 混合类型的 object 列转为字符串，避免 parquet 类型推断失败
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v if v is None or isinstance(v, str) else str(v))
+    df.to_parquet(path, index=False, compression='snappy')
+
+
+@register_writer('xlsx', 'xlsx')
+def write_excel(path, columns, rows):
+    chunks = (rows[i:i + WRITE_BATCH_ROWS] for i in range(0, len(rows), WRITE_BATCH_ROWS))
+    write_xlsx(path, columns, chunks, sheet_title='Result')
+
+
+class ResultArchiver:
+    """
+    定时任务结果归档：按 <任务ID>/<年>/<月>/<日>/ 分区存放，每个文件在 ResultArchive 表中建立索引，
+    按保留天数和总大小清理旧文件
+    """
+
+    def __init__(self, root=None, retention_days=30, retention_max_mb=0):
+        self.root = root or os.path.join(os.getcwd(), 'results')
+        self.retention_days = retention_days
+        self.retention_max_mb = retention_max_mb
+
+    def configure(self, root=None, retention_days=None, retention_max_mb=None):
+        if root is not None:
+            self.root = root
+        if retention_days is not None:
+            self.retention_days = retention_days
+        if retention_max_mb is not None:
+            self.retention_max_mb = retention_max_mb
+
+    def resolve_format(self, fmt):
+        fmt = fmt or 'csv'
+        writer = ARCHIVE_WRITERS.get(fmt)
+        if writer is None or not writer['available']():
+            logger.warning(f"Result format {fmt} unavailable, falling back to {FALLBACK_FORMAT}")
+            return FALLBACK_FORMAT
+        return fmt
+
+    def full_path(self, record):
+        return os.path.join(self.root, record.path)
+
+    def archive(self, task, result, history_id=None):
+        """保存任务结果并写入索引，返回 ResultArchive 记录；无结果集时不归档（多库查询的部分结果也归档）"""
+        from app import db
+        from app.models.database import ResultArchive
+
+        if result.get('status') not in ('success', 'partial') or 'columns' not in result:
+            return None
+
+        fmt = self.resolve_format(task.result_format)
+        now = datetime.now()
+        rel_dir = os.path.join(str(task.id), now.strftime('%Y'), now.strftime('%m'), now.strftime('%d'))
+        name = _UNSAFE_NAME.sub('_', task.name).strip('_') or 'task'
+        rel_path = os.path.join(rel_dir, f"{name}_{now.strftime('%H%M%S_%f')}.{ARCHIVE_WRITERS[fmt]['ext']}")
+        path = os.path.join(self.root, rel_path)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            rows = result.get('rows', [])
+            ARCHIVE_WRITERS[fmt]['writer'](path, result['columns'], rows)
+            record = ResultArchive(
+                task_id=task.id,
+                history_id=history_id,
+                format=fmt,
+                path=rel_path,
+                size_bytes=os.path.getsize(path),
+                row_count=len(rows),
+                created_at=now
+            )
+            db.session.add(record)
+            db.session.commit()
+            logger.info(f"Result saved to {path}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to archive result for task {task.name}: {e}")
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+
+        self.apply_retention(task)
+        return record
+
+    def delete(self, record, commit=True):
+        from app import db
+        path = self.full_path(record)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.error(f"Failed to remove result file {path}: {e}")
+        db.session.delete(record)
+        if commit:
+            db.session.commit()
+
+    def apply_retention(self, task):
+        """按任务（或系统默认）的保留天数和总大小上限清理该任务的旧结果，返回删除数量"""
+        from app import db
+        from app.models.database import ResultArchive
+
+        days = task.retention_days if task.retention_days is not None else self.retention_days
+        max_mb = task.retention_max_mb if task.retention_max_mb is not None else self.retention_max_mb
+        removed = 0
+        try:
+            if days:
+                cutoff = datetime.now() - timedelta(days=days)
+                for record in ResultArchive.query.filter(ResultArchive.task_id == task.id,
+                                                         ResultArchive.created_at < cutoff).all():
+                    self.delete(record, commit=False)
+                    removed += 1
+                db.session.flush()
+
+            if max_mb:
+                limit = max_mb * 1024 * 1024
+                total = 0
+                # 从新到旧累加，超出上限的旧文件删除
+                for record in ResultArchive.query.filter_by(task_id=task.id) \
+                        .order_by(ResultArchive.created_at.desc()).all():
+                    total += record.size_bytes or 0
+                    if total > limit:
+                        self.delete(record, commit=False)
+                        removed += 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to apply result retention for task {task.id}: {e}")
+        if removed:
+            logger.info(f"Removed {removed} archived results of task {task.id}")
+        return removed
+
+    def cleanup(self):
+        """定时清理：对所有任务执行保留策略，并移除已删除任务的结果"""
+        from app import db, scheduler
+        from app.models.database import ResultArchive, ScheduledTask
+
+        with scheduler.app.app_context():
+            for task in ScheduledTask.query.all():
+                self.apply_retention(task)
+            task_ids = db.session.query(ScheduledTask.id)
+            orphans = ResultArchive.query.filter(~ResultArchive.task_id.in_(task_ids)).all()
+            for record in orphans:
+                self.delete(record, commit=False)
+            db.session.commit()
+
+
+result_archiver = ResultArchiver()
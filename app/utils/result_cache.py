@@ -0,0 +1,147 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# 只读语句的起始关键字
+READ_ONLY_KEYWORDS = ('select', 'with', 'show', 'values', 'table', 'pragma', 'describe', 'desc')
+
+# 出现这些关键字的语句视为有副作用，不缓存（用于 WITH ... / SELECT ... INTO / FOR UPDATE 等）
+WRITE_PATTERN = re.compile(
+    r'\b(insert|update|delete|merge|replace|create|alter|drop|truncate|grant|revoke|into|lock|call|exec|execute)\b'
+)
+
+_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_COMMENT_PATTERN = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def _strip_literals(sql):
+    """去掉注释和字符串字面量，仅用于关键字判断"""
+    sql = _COMMENT_PATTERN.sub(' ', sql)
+    return _STRING_PATTERN.sub("''", sql)
+
+
+def normalize_sql(sql):
+    """
+    规范化 SQL 作为缓存键：去掉注释和末尾分号，合并字符串字面量之外的空白
+    """
+    sql = _COMMENT_PATTERN.sub(' ', sql).strip().rstrip(';').strip()
+    parts = []
+    last = 0
+    for match in _STRING_PATTERN.finditer(sql):
+        parts.append(_WHITESPACE_PATTERN.sub(' ', sql[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(_WHITESPACE_PATTERN.sub(' ', sql[last:]))
+    return ''.join(parts)
+
+
+def is_read_only(sql):
+    """判断语句是否为可缓存的只读查询（单条 SELECT 类语句）"""
+    stripped = _strip_literals(sql).strip().rstrip(';').lower()
+    if not stripped or ';' in stripped:
+        return False
+    first = stripped.split(None, 1)[0]
+    if first not in READ_ONLY_KEYWORDS:
+        return False
+    if 'for update' in stripped or 'for share' in stripped:
+        return False
+    return not WRITE_PATTERN.search(stripped)
+
+
+def estimate_result_bytes(result):
+    """粗略估算查询结果占用的字节数"""
+    size = sum(len(str(c)) for c in result.get('columns', []))
+    for row in result.get('rows', []):
+        size += sum(len(str(cell)) for cell in row if cell is not None) + 8 * len(row)
+    return size + 256
+
+
+class ResultCache:
+    """
+    只读查询结果缓存：按 (db_config_id, 规范化 SQL, 参数) 缓存，
+    每项带 TTL，总字节数超出上限时按 LRU 淘汰
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, default_ttl=300):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_bytes=None, default_ttl=None):
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if default_ttl is not None:
+            self.default_ttl = default_ttl
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def make_key(db_config_id, sql, params=None):
+        return (db_config_id, normalize_sql(sql), json.dumps(params or {}, sort_keys=True, default=str))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['expires_at'] < time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, result, ttl=None):
+        size = estimate_result_bytes(result)
+        if size > self.max_bytes:
+            return False
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'result': result,
+                'size': size,
+                'cached_at': now,
+                'expires_at': now + (ttl or self.default_ttl)
+            }
+            self._bytes += size
+            self._evict()
+        return True
+
+    def invalidate(self, db_config_id=None):
+        """清理指定数据库（或全部）的缓存项"""
+        with self._lock:
+            for key in [k for k in self._entries if db_config_id is None or k[0] == db_config_id]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+
+result_cache = ResultCache()
@@ -0,0 +1,306 @@
+import bisect
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('db_monitor')
+
+# 搜索结果类型，同分时按此顺序排列
+ENTRY_KINDS = ('database', 'table', 'column')
+# 模糊匹配的最低三元组相似度（Jaccard）
+FUZZY_MIN_SIMILARITY = 0.3
+SEARCH_MAX_LIMIT = 500
+
+
+def _trigrams(name):
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+class SchemaCatalog:
+    """
+    所有数据库的表名 / 列名索引，用于跨库搜索：
+      - 每个数据库单独加载和替换（增量刷新），配置版本变化、新增或超过 max_age 的数据库才重新加载
+      - 名称（小写）-> 各数据库的条目；排序后的名称列表用于前缀查找，三元组倒排索引用于子串和模糊匹配
+    """
+
+    def __init__(self, max_age=600, max_workers=8):
+        self.max_age = max_age
+        self.max_workers = max_workers
+        # db_id -> {'name', 'version', 'loaded_at', 'tables', 'columns', 'elapsed', 'error', 'names'}
+        self._databases = {}
+        # 名称 -> {db_id: [条目]}，条目为 (类型, db_id, 表名, 列名, 列类型)
+        self._names = {}
+        # 名称 -> 三元组个数、各类型条目数（用于模糊匹配打分和快速计数）
+        self._gram_counts = {}
+        self._kind_counts = {}
+        self._trigrams = {}
+        self._sorted = None
+        self._stale = set()
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def configure(self, max_age=None, max_workers=None):
+        if max_age is not None:
+            self.max_age = max_age
+        if max_workers is not None:
+            self.max_workers = max_workers
+
+    # ---------- 索引维护 ----------
+
+    def _remove_names(self, db_id, names):
+        for name in names:
+            owners = self._names.get(name)
+            if owners is None:
+                continue
+            for entry in owners.pop(db_id, ()):
+                self._kind_counts[name][entry[0]] -= 1
+            if not owners:
+                del self._names[name]
+                del self._gram_counts[name]
+                del self._kind_counts[name]
+                for gram in _trigrams(name):
+                    postings = self._trigrams.get(gram)
+                    if postings is not None:
+                        postings.discard(name)
+                        if not postings:
+                            del self._trigrams[gram]
+                self._sorted = None
+
+    def _add_entry(self, name, entry):
+        owners = self._names.get(name)
+        if owners is None:
+            owners = self._names[name] = {}
+            grams = _trigrams(name)
+            for gram in grams:
+                self._trigrams.setdefault(gram, set()).add(name)
+            self._gram_counts[name] = len(grams)
+            self._kind_counts[name] = dict.fromkeys(ENTRY_KINDS, 0)
+            self._sorted = None
+        owners.setdefault(entry[1], []).append(entry)
+        self._kind_counts[name][entry[0]] += 1
+
+    def _replace_database(self, db_id, info, tables):
+        """用新加载的表结构替换该数据库的条目"""
+        entries = [(info['name'].lower(), ('database', db_id, None, None, None))]
+        column_count = 0
+        for table_name, columns in tables.items():
+            entries.append((table_name.lower(), ('table', db_id, table_name, None, None)))
+            for col in columns:
+                entries.append((col['name'].lower(),
+                                ('column', db_id, table_name, col['name'], str(col.get('type', '')))))
+            column_count += len(columns)
+
+        with self._lock:
+            old = self._databases.get(db_id)
+            if old:
+                self._remove_names(db_id, old['names'])
+            for name, entry in entries:
+                self._add_entry(name, entry)
+            info.update(tables=len(tables), columns=column_count, names={name for name, _ in entries})
+            self._databases[db_id] = info
+            self._stale.discard(db_id)
+
+    def remove(self, db_id):
+        """删除数据库配置后移除其条目"""
+        with self._lock:
+            old = self._databases.pop(db_id, None)
+            if old:
+                self._remove_names(db_id, old['names'])
+            self._stale.discard(db_id)
+
+    def invalidate(self, db_id):
+        """标记数据库需要在下次刷新时重新加载（修改配置、手动刷新表结构后调用）"""
+        with self._lock:
+            self._stale.add(db_id)
+
+    # ---------- 加载 ----------
+
+    def _load_database(self, app, db_id):
+        from app.models.database import DatabaseConfig
+        from app.utils.database_helper import DatabaseHelper
+
+        start = time.time()
+        with app.app_context():
+            db_config = DatabaseConfig.query.get(db_id)
+            if db_config is None:
+                self.remove(db_id)
+                return
+            info = {'name': db_config.name, 'version': db_config.version or 0, 'loaded_at': time.time(),
+                    'error': None}
+            try:
+                tables = DatabaseHelper.get_all_columns(db_config)
+            except Exception as e:
+                logger.warning(f"Schema catalog: failed to load {db_config.name}: {e}")
+                with self._lock:
+                    current = self._databases.get(db_id)
+                    if current:
+                        # 保留上一次成功加载的条目，记录错误后下次刷新重试
+                        current.update(error=str(e).split('\n')[0], loaded_at=time.time())
+                        self._stale.add(db_id)
+                        return
+                tables = {}
+                info['error'] = str(e).split('\n')[0]
+        info['elapsed'] = round(time.time() - start, 3)
+        self._replace_database(db_id, info, tables)
+        if info['error']:
+            with self._lock:
+                self._stale.add(db_id)
+
+    def refresh(self, app=None, db_ids=None, force=False):
+        """
+        增量刷新（由调度器周期调用）：只重新加载新增、配置版本变化、被标记或超过 max_age 的数据库，
+        移除已删除的数据库。db_ids 指定时只刷新这些数据库
+        """
+        if app is None:
+            from app import scheduler
+            app = scheduler.app
+        from app.models.database import DatabaseConfig
+
+        if not self._refresh_lock.acquire(blocking=False):
+            logger.info("Schema catalog refresh already running, skipped")
+            return
+        try:
+            self._refreshing = True
+            start = time.time()
+            with app.app_context():
+                configs = {c.id: c.version or 0 for c in DatabaseConfig.query.all()}
+            now = time.time()
+            with self._lock:
+                for db_id in [i for i in self._databases if i not in configs]:
+                    self._remove_names(db_id, self._databases.pop(db_id)['names'])
+                targets = []
+                for db_id, version in configs.items():
+                    if db_ids is not None and db_id not in db_ids:
+                        continue
+                    info = self._databases.get(db_id)
+                    if (force or info is None or db_id in self._stale or info['version'] != version
+                            or now - info['loaded_at'] > self.max_age):
+                        targets.append(db_id)
+            if not targets:
+                return
+            if len(targets) == 1:
+                self._load_database(app, targets[0])
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets)),
+                                        thread_name_prefix='schema-catalog') as executor:
+                    list(executor.map(lambda db_id: self._load_database(app, db_id), targets))
+            logger.info(f"Schema catalog refreshed {len(targets)} databases ({time.time() - start:.3f}s)")
+        finally:
+            self._refreshing = False
+            self._refresh_lock.release()
+
+    def refresh_async(self, app, db_ids=None, force=False):
+        threading.Thread(target=self.refresh, args=(app, db_ids, force),
+                         name='schema-catalog-refresh', daemon=True).start()
+
+    # ---------- 搜索 ----------
+
+    def _sorted_names(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._names)
+        return self._sorted
+
+    def _match_names(self, query, fuzzy=True, limit=50):
+        """
+        返回 {名称: 得分}：完全匹配 1.0，前缀 0.9，子串 0.7；
+        前缀和子串匹配的名称不足 limit 个时，按三元组相似度补充模糊匹配（得分不超过 0.6）
+        """
+        scores = {}
+        if query in self._names:
+            scores[query] = 1.0
+
+        names = self._sorted_names()
+        i = bisect.bisect_left(names, query)
+        while i < len(names) and names[i].startswith(query):
+            if names[i] != query:
+                # 同为前缀匹配时名称越短越靠前
+                scores[names[i]] = 0.9 - min(len(names[i]) - len(query), 50) * 0.001
+            i += 1
+
+        grams = _trigrams(query)
+        if not grams:
+            return scores
+        postings = sorted((self._trigrams.get(gram, set()) for gram in grams), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        for name in candidates:
+            if name not in scores and query in name:
+                scores[name] = 0.7 - min(len(name) - len(query), 50) * 0.001
+
+        if fuzzy and len(scores) < limit:
+            shared = Counter()
+            for posting in postings:
+                shared.update(posting)
+            # 相似度不可能达到阈值的名称直接跳过
+            min_shared = FUZZY_MIN_SIMILARITY * len(grams)
+            for name, count in shared.items():
+                if count < min_shared or name in scores:
+                    continue
+                similarity = count / (len(grams) + self._gram_counts[name] - count)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    scores[name] = round(0.6 * similarity, 4)
+        return scores
+
+    def search(self, query, kind=None, db_id=None, limit=50, fuzzy=True):
+        """
+        按名称搜索数据库 / 表 / 列，支持前缀、子串和模糊（三元组）匹配。
+        kind 限定结果类型，db_id 限定数据库
+        """
+        start = time.perf_counter()
+        query = (query or '').strip().lower()
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+        results = []
+        total = 0
+        databases = {}
+        if query:
+            with self._lock:
+                databases = {i: info['name'] for i, info in self._databases.items()}
+                matches = self._match_names(query, fuzzy, limit)
+                # 先按得分对名称排序，只展开填满 limit 所需的条目，其余只计数
+                for name, score in sorted(matches.items(), key=lambda x: (-x[1], x[0])):
+                    owners = self._names[name]
+                    if db_id is not None:
+                        count = sum(1 for e in owners.get(db_id, ()) if not kind or e[0] == kind)
+                    elif kind:
+                        count = self._kind_counts[name][kind]
+                    else:
+                        count = sum(self._kind_counts[name].values())
+                    total += count
+                    if not count or len(results) >= limit:
+                        continue
+                    owner_ids = [db_id] if db_id is not None else sorted(owners, key=lambda i: databases.get(i, ''))
+                    for owner in owner_ids:
+                        entries = sorted((e for e in owners.get(owner, ()) if not kind or e[0] == kind),
+                                         key=lambda e: (ENTRY_KINDS.index(e[0]), e[2] or '', e[3] or ''))
+                        results.extend((score, entry) for entry in entries[:limit - len(results)])
+                        if len(results) >= limit:
+                            break
+
+        return {
+            'total': total,
+            'results': [{'type': entry[0], 'db_id': entry[1], 'db_name': databases.get(entry[1]),
+                         'table': entry[2], 'column': entry[3], 'column_type': entry[4],
+                         'score': round(score, 4)}
+                        for score, entry in results],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def status(self):
+        with self._lock:
+            databases = [{'db_id': db_id, 'name': info['name'], 'tables': info['tables'],
+                          'columns': info['columns'], 'elapsed': info.get('elapsed'), 'error': info['error'],
+                          'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info['loaded_at']))}
+                         for db_id, info in sorted(self._databases.items())]
+            return {
+                'databases': len(databases),
+                'tables': sum(d['tables'] for d in databases),
+                'columns': sum(d['columns'] for d in databases),
+                'names': len(self._names),
+                'refreshing': self._refreshing,
+                'errors': [d for d in databases if d['error']]
+            }
+
+
+schema_catalog = SchemaCatalog()
@@ -0,0 +1,126 @@
+import re
+
+_DELIMITER_PATTERN = re.compile(r'^[ \t]*delimiter[ \t]+(\S+)[ \t]*$', re.I | re.M)
+_DOLLAR_TAG = re.compile(r'\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$')
+_WORD = re.compile(r'\w+')
+
+
+def _skip_quoted(sql, i, quote, backslash_escape):
+    """从引号起始位置 i 跳到字面量结束之后"""
+    n = len(sql)
+    i += 1
+    while i < n:
+        ch = sql[i]
+        if backslash_escape and ch == '\\':
+            i += 2
+            continue
+        if ch == quote:
+            if i + 1 < n and sql[i + 1] == quote:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    return n
+
+
+def _skip_block_comment(sql, i, nested):
+    n = len(sql)
+    depth = 1
+    i += 2
+    while i < n and depth:
+        if nested and sql.startswith('/*', i):
+            depth += 1
+            i += 2
+        elif sql.startswith('*/', i):
+            depth -= 1
+            i += 2
+        else:
+            i += 1
+    return i
+
+
+def split_statements(sql, dialect):
+    """
+    按方言将 SQL 脚本拆分为单条语句，忽略字符串、标识符、注释中的分号：
+      PostgreSQL - 支持 $tag$...$tag$ 美元引用和嵌套块注释
+      MySQL      - 支持反引号、反斜杠转义、# 注释和 DELIMITER 指令
+      SQLite     - CREATE TRIGGER ... BEGIN ... END 作为一条语句
+    返回去掉结尾分隔符的语句列表（空语句和纯注释被忽略）
+    """
+    statements = []
+    mysql = dialect == 'mysql'
+    postgresql = dialect == 'postgresql'
+    delimiter = ';'
+    n = len(sql)
+    i = 0
+    start = 0
+    # SQLite 触发器体内的 BEGIN ... END 嵌套层数，head 为当前语句的前几个关键字
+    block_depth = 0
+    head = []
+    has_code = False
+
+    def flush(end):
+        text = sql[start:end].strip()
+        if has_code and text:
+            statements.append(text)
+
+    while i < n:
+        ch = sql[i]
+
+        # MySQL 客户端的 DELIMITER 指令（必须独占一行）
+        if mysql and (i == 0 or sql[i - 1] == '\n'):
+            match = _DELIMITER_PATTERN.match(sql, i)
+            if match:
+                flush(i)
+                delimiter = match.group(1)
+                i = start = match.end()
+                has_code = False
+                continue
+
+        if ch in ("'", '"') or (mysql and ch == '`'):
+            i = _skip_quoted(sql, i, ch, backslash_escape=mysql and ch != '`')
+            has_code = True
+            continue
+        if sql.startswith('--', i) or (mysql and ch == '#'):
+            end = sql.find('\n', i)
+            i = n if end == -1 else end + 1
+            continue
+        if sql.startswith('/*', i):
+            i = _skip_block_comment(sql, i, nested=postgresql)
+            continue
+        if postgresql and ch == '$':
+            match = _DOLLAR_TAG.match(sql, i)
+            if match:
+                end = sql.find(match.group(0), match.end())
+                i = n if end == -1 else end + len(match.group(0))
+                has_code = True
+                continue
+
+        if dialect == 'sqlite' and ch.isalpha() and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == '_')):
+            word = _WORD.match(sql, i).group(0)
+            upper = word.upper()
+            if len(head) < 3:
+                head.append(upper)
+            if head[0] == 'CREATE' and 'TRIGGER' in head[1:3]:
+                if upper in ('BEGIN', 'CASE'):
+                    block_depth += 1
+                elif upper == 'END':
+                    block_depth = max(block_depth - 1, 0)
+            i += len(word)
+            has_code = True
+            continue
+
+        if sql.startswith(delimiter, i) and not block_depth:
+            flush(i)
+            i += len(delimiter)
+            start = i
+            head = []
+            has_code = False
+            continue
+
+        if not ch.isspace():
+            has_code = True
+        i += 1
+
+    flush(n)
+    return statements
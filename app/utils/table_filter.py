@@ -0,0 +1,197 @@
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+# 筛选操作符：
+#   eq / ne / gt / gte / lt / lte - 比较（可使用索引）
+#   in                            - 值列表
+#   between                       - 范围 [min, max]，任一端为 null 表示开区间，用于数值和日期范围
+#   prefix                        - 前缀匹配 LIKE 'v%'（可使用索引）
+#   contains                      - 子串匹配 LIKE '%v%'（全表扫描，兼容旧的字符串筛选）
+#   is_null / not_null
+FILTER_OPS = ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'between', 'prefix', 'contains', 'is_null', 'not_null')
+COMPARE_OPS = {'eq': '=', 'ne': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+# 各类型列允许的操作符
+KIND_OPS = {
+    'number': ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'between', 'is_null', 'not_null'),
+    'date': ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'between', 'is_null', 'not_null'),
+    'datetime': ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'between', 'is_null', 'not_null'),
+    'time': ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'between', 'is_null', 'not_null'),
+    'bool': ('eq', 'ne', 'is_null', 'not_null'),
+    'text': FILTER_OPS,
+}
+# IN 列表的最大长度
+MAX_IN_VALUES = 1000
+# LIKE 转义字符（不使用反斜杠，避免 MySQL 字符串转义差异）
+LIKE_ESCAPE = '!'
+
+
+def column_kind(col_type):
+    """根据 inspector 返回的列类型判断筛选类型：number / date / datetime / time / bool / text"""
+    try:
+        python_type = col_type.python_type
+    except (NotImplementedError, AttributeError):
+        return 'text'
+    if python_type is bool:
+        return 'bool'
+    if issubclass(python_type, (int, float, Decimal)):
+        return 'number'
+    if issubclass(python_type, datetime):
+        return 'datetime'
+    if issubclass(python_type, date):
+        return 'date'
+    if issubclass(python_type, time):
+        return 'time'
+    return 'text'
+
+
+def column_kinds(columns_info):
+    return {c['name']: column_kind(c['type']) for c in columns_info}
+
+
+def _coerce(value, kind, python_type):
+    """将前端传入的值转换为列类型对应的 Python 值，无法转换时抛出 ValueError"""
+    if isinstance(value, str):
+        value = value.strip()
+    if kind == 'number':
+        if isinstance(value, bool):
+            raise ValueError
+        if python_type is int:
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError
+            return int(value)
+        try:
+            number = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError
+        if not number.is_finite():
+            raise ValueError
+        # DECIMAL 列以字符串传参，保留精度（sqlite3 不支持直接绑定 Decimal）
+        return float(number) if python_type is float else str(number)
+    if kind == 'bool':
+        if isinstance(value, bool):
+            return value
+        text = str(value).lower()
+        if text in ('1', 'true', 't', 'yes', 'y'):
+            return True
+        if text in ('0', 'false', 'f', 'no', 'n'):
+            return False
+        raise ValueError
+    if kind == 'datetime':
+        return datetime.fromisoformat(str(value))
+    if kind == 'date':
+        return date.fromisoformat(str(value)[:10])
+    if kind == 'time':
+        return time.fromisoformat(str(value))
+    return str(value)
+
+
+def _convert(value, kind, python_type, col):
+    try:
+        return _coerce(value, kind, python_type)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid {kind} value for column {col}: {value}")
+
+
+def _escape_like(value):
+    return (value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+                 .replace('%', LIKE_ESCAPE + '%')
+                 .replace('_', LIKE_ESCAPE + '_'))
+
+
+def normalize_filter(value):
+    """
+    筛选条件统一为 {'op', 'value'}：
+    旧格式的字符串值按子串匹配（contains），新格式为 {'op': ..., 'value': ...}
+    """
+    if isinstance(value, dict):
+        return {'op': value.get('op') or 'eq', 'value': value.get('value')}
+    return {'op': 'contains', 'value': value}
+
+
+def build_conditions(columns_info, filters):
+    """
+    按列类型构建 WHERE 条件，返回 (conditions, params)。
+    列名必须存在于表结构中；操作符与列类型不匹配或值无法转换时抛出 ValueError
+    """
+    conditions = []
+    params = {}
+    columns = {c['name']: c for c in columns_info}
+    for col, raw in (filters or {}).items():
+        if col not in columns or raw is None:
+            continue
+        spec = normalize_filter(raw)
+        op, value = spec['op'], spec['value']
+        kind = column_kind(columns[col]['type'])
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator: {op}")
+        if op not in KIND_OPS[kind]:
+            raise ValueError(f"Operator {op} is not supported for {kind} column {col}")
+        try:
+            python_type = columns[col]['type'].python_type
+        except (NotImplementedError, AttributeError):
+            python_type = str
+        param = f"filter_{col}"
+
+        if op == 'is_null':
+            conditions.append(f"{col} IS NULL")
+        elif op == 'not_null':
+            conditions.append(f"{col} IS NOT NULL")
+        elif op in ('prefix', 'contains'):
+            text = '' if value is None else str(value).strip()
+            if not text:
+                continue
+            pattern = _escape_like(text) + '%'
+            params[param] = pattern if op == 'prefix' else '%' + pattern
+            conditions.append(f"{col} LIKE :{param} ESCAPE '{LIKE_ESCAPE}'")
+        elif op == 'in':
+            values = value if isinstance(value, (list, tuple)) else str(value or '').split(',')
+            values = [v for v in values if v is not None and str(v).strip() != '']
+            if not values:
+                continue
+            if len(values) > MAX_IN_VALUES:
+                raise ValueError(f"Too many values for column {col} (max {MAX_IN_VALUES})")
+            names = []
+            for i, v in enumerate(values):
+                params[f"{param}_{i}"] = _convert(v, kind, python_type, col)
+                names.append(f":{param}_{i}")
+            conditions.append(f"{col} IN ({', '.join(names)})")
+        elif op == 'between':
+            low, high = (list(value) + [None, None])[:2] if isinstance(value, (list, tuple)) else (value, None)
+            if low not in (None, ''):
+                params[f"{param}_min"] = _convert(low, kind, python_type, col)
+                conditions.append(f"{col} >= :{param}_min")
+            if high not in (None, ''):
+                params[f"{param}_max"] = _convert(high, kind, python_type, col)
+                # 只给出日期的上界包含当天
+                if kind == 'datetime' and len(str(high).strip()) <= 10:
+                    params[f"{param}_max"] = datetime.combine(params[f"{param}_max"].date(), time.max)
+                conditions.append(f"{col} <= :{param}_max")
+        else:
+            if value is None or str(value).strip() == '':
+                continue
+            params[param] = _convert(value, kind, python_type, col)
+            conditions.append(f"{col} {COMPARE_OPS[op]} :{param}")
+    return conditions, params
+
+
+def parse_order_by(columns_info, order_by):
+    """
+    解析排序参数："col1,-col2"（- 前缀表示降序），列名必须存在于表结构中。
+    返回 [(col, 'ASC' / 'DESC'), ...]
+    """
+    if not order_by:
+        return []
+    names = {c['name'] for c in columns_info}
+    items = order_by if isinstance(order_by, (list, tuple)) else str(order_by).split(',')
+    result = []
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        direction = 'DESC' if item.startswith('-') else 'ASC'
+        col = item.lstrip('+-').strip()
+        if col not in names:
+            raise ValueError(f"Unknown order by column: {col}")
+        if col not in [c for c, _ in result]:
+            result.append((col, direction))
+    return result
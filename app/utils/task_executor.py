@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('db_monitor')
+
+
+class TaskExecutor:
+    """
+    定时任务执行池：调度器触发时只入队，由固定大小的线程池执行。
+    每个目标数据库同时运行的任务数受限（DatabaseConfig.task_concurrency，未设置时使用 per_db_limit），
+    超出的任务排队等待；调度时跳过目标库已满的任务，不阻塞其他库的任务。
+    多库任务在每个目标库上执行前通过 acquire_db / release_db 占用同一组名额。
+    同一任务最多排队一次，重复触发的会被合并
+    """
+
+    def __init__(self, max_workers=8, per_db_limit=2, max_queue=500):
+        self.max_workers = max_workers
+        self.per_db_limit = per_db_limit
+        self.max_queue = max_queue
+        self._executor = None
+        self._queue = deque()
+        # task_id -> 条目；条目为 {'task_id', 'name', 'db_id', 'db_limit', 'func', 'queued_at', 'started_at'}
+        self._queued = {}
+        self._running = {}
+        # db_id -> 正在占用的名额数（单库任务 + 多库任务的目标库）、最近使用的并发上限
+        self._db_running = {}
+        self._db_limits = {}
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+
+    def configure(self, max_workers=None, per_db_limit=None, max_queue=None):
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if per_db_limit is not None:
+            self.per_db_limit = per_db_limit
+        if max_queue is not None:
+            self.max_queue = max_queue
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='task-exec')
+        return self._executor
+
+    def submit(self, task_id, func, db_id=None, db_limit=None, name=None):
+        """
+        任务入队。db_id 为单库任务的目标库（多库任务为 None，只占用执行线程），
+        db_limit 为该库的并发上限。返回 'queued' / 'merged' / 'rejected'
+        """
+        with self._lock:
+            if task_id in self._queued:
+                logger.info(f"Task {task_id} is already queued, merged with the pending run")
+                return 'merged'
+            if len(self._queue) >= self.max_queue:
+                logger.error(f"Task queue is full ({self.max_queue}), task {task_id} rejected")
+                return 'rejected'
+            item = {'task_id': task_id, 'name': name, 'db_id': db_id, 'db_limit': db_limit or self.per_db_limit,
+                    'func': func, 'queued_at': time.time(), 'started_at': None}
+            self._queue.append(item)
+            self._queued[task_id] = item
+        self._dispatch()
+        return 'queued'
+
+    def _dispatch(self):
+        """按入队顺序启动可运行的任务：执行线程有空闲且目标库未达到并发上限"""
+        with self._lock:
+            blocked = set()
+            for item in list(self._queue):
+                if len(self._running) >= self.max_workers:
+                    break
+                if item['task_id'] in self._running:
+                    # 同一任务上一次执行尚未结束，保持排队
+                    continue
+                db_id = item['db_id']
+                if db_id is not None:
+                    # 同一目标库按入队顺序启动
+                    if db_id in blocked or self._db_running.get(db_id, 0) >= item['db_limit']:
+                        blocked.add(db_id)
+                        continue
+                    self._db_running[db_id] = self._db_running.get(db_id, 0) + 1
+                    self._db_limits[db_id] = item['db_limit']
+                self._queue.remove(item)
+                del self._queued[item['task_id']]
+                item['started_at'] = time.time()
+                self._running[item['task_id']] = item
+                self._get_executor().submit(self._run, item)
+
+    def _run(self, item):
+        try:
+            waited = item['started_at'] - item['queued_at']
+            if waited >= 1:
+                logger.info(f"Task {item['task_id']} started after waiting {waited:.1f}s in queue")
+            item['func'](item['task_id'])
+        except Exception as e:
+            logger.error(f"Task {item['task_id']} failed: {e}")
+        finally:
+            with self._lock:
+                self._running.pop(item['task_id'], None)
+                if item['db_id'] is not None:
+                    self._release_slot(item['db_id'])
+            self._dispatch()
+
+    def _release_slot(self, db_id):
+        # 调用方持有 self._lock
+        self._db_running[db_id] -= 1
+        if not self._db_running[db_id]:
+            del self._db_running[db_id]
+        self._slot_freed.notify_all()
+
+    def acquire_db(self, db_id, db_limit=None, timeout=None):
+        """
+        多库任务在某个目标库上执行前占用该库的一个并发名额（与单库任务共用上限），
+        名额已满时等待，最多等待 timeout 秒（None 表示一直等待，0 表示不等待）。
+        返回是否占用成功；成功后必须调用 release_db
+        """
+        db_limit = db_limit or self.per_db_limit
+        with self._slot_freed:
+            self._db_limits[db_id] = db_limit
+            if not self._slot_freed.wait_for(lambda: self._db_running.get(db_id, 0) < db_limit, timeout):
+                return False
+            self._db_running[db_id] = self._db_running.get(db_id, 0) + 1
+            return True
+
+    def wait_released(self, timeout):
+        """等待任意目标库释放名额，最多 timeout 秒"""
+        with self._slot_freed:
+            self._slot_freed.wait(timeout)
+
+    def release_db(self, db_id):
+        """释放 acquire_db 占用的名额，并启动因该库已满而排队的任务"""
+        with self._lock:
+            self._release_slot(db_id)
+        self._dispatch()
+
+    def task_state(self, task_id):
+        """单个任务的执行状态：running / queued（含排队位置）/ None"""
+        now = time.time()
+        with self._lock:
+            item = self._running.get(task_id)
+            if item:
+                return {'state': 'running', 'since': round(now - item['started_at'], 1)}
+            item = self._queued.get(task_id)
+            if item:
+                position = next(i for i, queued in enumerate(self._queue) if queued is item) + 1
+                return {'state': 'queued', 'position': position, 'since': round(now - item['queued_at'], 1)}
+        return None
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            # running 包括多库任务在该库上占用的名额
+            databases = {db_id: {'running': count, 'queued': 0,
+                                 'limit': self._db_limits.get(db_id, self.per_db_limit)}
+                         for db_id, count in self._db_running.items()}
+            for item in self._queue:
+                if item['db_id'] is not None:
+                    entry = databases.setdefault(item['db_id'], {'running': 0, 'queued': 0, 'limit': item['db_limit']})
+                    entry['queued'] += 1
+            return {
+                'max_workers': self.max_workers,
+                'per_db_limit': self.per_db_limit,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'oldest_wait': round(now - self._queue[0]['queued_at'], 1) if self._queue else 0,
+                'databases': [{'db_id': db_id, **entry} for db_id, entry in sorted(databases.items())]
+            }
+
+
+task_executor = TaskExecutor()
@@ -0,0 +1,162 @@
+import base64
+import json
+import sys
+import zlib
+from array import array
+from datetime import date, datetime, time
+from decimal import Decimal
+from flask import Response, jsonify, request
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+# 列式结果格式的 Accept 类型
+COLUMNAR_MIMETYPE = 'application/vnd.dbmonitor.columnar+json'
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_BYTES = 1024
+
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+# float64 可精确表示的整数范围
+SAFE_INT = 2 ** 53
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def dumps(obj):
+    """序列化为 JSON 字节串，优先使用 orjson（超出 64 位的整数等 orjson 不支持的值回退到标准库）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_json_default)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=_json_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _typed_array(typecode, values):
+    """将数值列编码为小端字节序的 base64 字符串，前端可直接转为 Int32Array / Float64Array"""
+    arr = array(typecode, values)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return base64.b64encode(arr.tobytes()).decode('ascii')
+
+
+def _to_text(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def encode_column(name, values):
+    """
+    编码单列数据：
+      int32 / float64 - 数值列，typed 编码（base64 小端字节）
+      string          - 重复值较多时字典编码（dictionary + int32 codes，-1 表示 NULL），否则原样列表
+    NULL 位置记录在 nulls 中，typed 编码时对应位置填 0
+    """
+    count = len(values)
+    nulls = [i for i, v in enumerate(values) if v is None]
+    present = [v for v in values if v is not None]
+    column = {'name': name}
+    if nulls:
+        column['nulls'] = nulls
+
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        if INT32_MIN <= min(present) and max(present) <= INT32_MAX:
+            column.update(type='int32', encoding='typed',
+                          data=_typed_array('i', (0 if v is None else v for v in values)))
+            return column
+        if -SAFE_INT <= min(present) and max(present) <= SAFE_INT:
+            column.update(type='float64', encoding='typed',
+                          data=_typed_array('d', (0 if v is None else v for v in values)))
+            return column
+
+    if present and all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in present):
+        # 超过 float64 精度的 Decimal 和整数（如 BIGINT 主键）保持字符串，避免丢失精度
+        exact = all(len(v.as_tuple().digits) <= 15 if isinstance(v, Decimal)
+                    else not isinstance(v, int) or abs(v) <= SAFE_INT for v in present)
+        if exact:
+            column.update(type='float64', encoding='typed',
+                          data=_typed_array('d', (0.0 if v is None else float(v) for v in values)))
+            return column
+
+    if present and all(isinstance(v, bool) for v in present):
+        column.update(type='bool', encoding='plain', data=values)
+        return column
+
+    texts = [None if v is None else _to_text(v) for v in values]
+    dictionary = {}
+    for t in texts:
+        if t is not None and t not in dictionary:
+            dictionary[t] = len(dictionary)
+    if count and len(dictionary) <= count // 2:
+        column.update(type='string', encoding='dict', dictionary=list(dictionary),
+                      data=_typed_array('i', (-1 if t is None else dictionary[t] for t in texts)))
+    else:
+        column.update(type='string', encoding='plain', data=texts)
+    return column
+
+
+def to_columnar(result):
+    """将 {'columns', 'rows', ...} 格式的结果转换为列式格式"""
+    columns = result['columns']
+    rows = result['rows']
+    vectors = [encode_column(name, [row[i] for row in rows]) for i, name in enumerate(columns)]
+    payload = {k: v for k, v in result.items() if k != 'rows'}
+    payload.update(format='columnar', count=len(rows), vectors=vectors)
+    return payload
+
+
+def wants_columnar():
+    if request.args.get('format') == 'columnar':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE
+
+
+def compress_response(response):
+    """按 Accept-Encoding 对响应进行 gzip / deflate 压缩"""
+    if response.direct_passthrough or response.status_code >= 300 or 'Content-Encoding' in response.headers:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if accepted['gzip']:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        encoding = 'gzip'
+    elif accepted['deflate']:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 15)
+        encoding = 'deflate'
+    else:
+        return response
+
+    response.set_data(compressor.compress(body) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def make_result_response(result, status=200):
+    """
+    返回查询结果：请求 Accept 为列式格式（或 format=columnar）时返回列式编码，否则保持行式格式；
+    响应按客户端支持进行压缩
+    """
+    if result.get('status') in ('success', 'partial') and 'rows' in result and wants_columnar():
+        response = Response(dumps(to_columnar(result)), status=status, mimetype='application/json')
+    else:
+        response = jsonify(result)
+        response.status_code = status
+    response.vary.add('Accept')
+    return compress_response(response)
@@ -0,0 +1,68 @@
+import tempfile
+from datetime import datetime, time
+from decimal import Decimal
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Excel 单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+
+def _cell_value(value):
+    """转换为 openpyxl 可写入的值"""
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value
+    if isinstance(value, (datetime, time)):
+        # Excel 不支持带时区的时间
+        return value.replace(tzinfo=None) if value.tzinfo else value
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if hasattr(value, 'isoformat'):
+        return value
+    return str(value)
+
+
+def write_xlsx(fileobj, columns, chunks, sheet_title='Sheet', max_sheet_rows=EXCEL_MAX_ROWS):
+    """
+    使用 write-only 模式将分块的行数据写入 xlsx，不在内存中保留整张表。
+    单个工作表写满 max_sheet_rows 行后自动新建工作表（每个工作表都带表头）。
+    返回写入的数据行数
+    """
+    wb = Workbook(write_only=True)
+    per_sheet = max_sheet_rows - 1
+    sheet = None
+    sheet_rows = 0
+    total = 0
+
+    def new_sheet(index):
+        ws = wb.create_sheet(sheet_title if index == 1 else f"{sheet_title}_{index}")
+        ws.append(list(columns))
+        return ws
+
+    sheet = new_sheet(1)
+    for chunk in chunks:
+        for row in chunk:
+            if sheet_rows >= per_sheet:
+                sheet = new_sheet(len(wb.worksheets) + 1)
+                sheet_rows = 0
+            sheet.append([_cell_value(v) for v in row])
+            sheet_rows += 1
+            total += 1
+
+    wb.save(fileobj)
+    return total
+
+
+def export_to_tempfile(columns, chunks, sheet_title='Sheet'):
+    """写入临时文件并返回已定位到开头的文件对象，关闭后自动删除"""
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_xlsx(tmp, columns, chunks, sheet_title=sheet_title)
+    except Exception:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return tmp
@@ -1,10 +1,25 @@
 import json
 import logging
-from datetime import datetime
-from flask import Blueprint, jsonify, request
+import os
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, stream_with_context
 from app import db, scheduler
-from app.models.database import DatabaseConfig, QueryHistory, ScheduledTask, SavedQuery, SystemConfig
-from app.utils.database_helper import DatabaseHelper
+from app.models.database import DatabaseConfig, QueryHistory, ResultArchive, ScheduledTask, SavedQuery, SystemConfig
+from app.utils.database_helper import DatabaseHelper, SCRIPT_MAX_ROWS
+from app.utils.result_cache import result_cache
+from app.utils.query_guard import cancel_query, list_running_queries
+from app.utils.query_jobs import job_manager, JobQueueFull
+from app.utils.wire_format import make_result_response
+from app.utils.aggregation import aggregate, result_to_frame
+from app.utils.xlsx_export import XLSX_MIMETYPE, export_to_tempfile
+from app.utils.result_archive import available_formats, result_archiver
+from app.utils.admission import check_admission
+from app.utils.sql_script import split_statements
+from app.utils.profiler import PROFILE_SAMPLE_ROWS, PROFILE_TOP_N
+from app.utils.fanout import fanout_runner, parse_tags, resolve_targets
+from app.utils.replica_router import replica_router
+from app.utils.schema_catalog import ENTRY_KINDS, schema_catalog
+from app.utils.task_executor import task_executor
 from app.utils.scheduler_helper import parse_cron
 from app.utils.email_helper import send_email
 from app.utils.feishu_helper import send_feishu_message
@@ -47,6 +62,11 @@ def save_smtp_config():
 def update_task(id):
     task = ScheduledTask.query.get_or_404(id)
     data = request.json
+    if 'result_format' in data:
+        try:
+            _result_format(data['result_format'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
     
     try:
         if 'name' in data: task.name = data['name']
@@ -60,6 +80,13 @@ def update_task(id):
         if 'notify_dingtalk' in data: task.notify_dingtalk = data['notify_dingtalk']
         if 'notify_wechat' in data: task.notify_wechat = data['notify_wechat']
         if 'notify_rule' in data: task.notify_rule = data['notify_rule']
+        if 'timeout' in data: task.timeout = _int_or_none(data['timeout'])
+        if 'result_format' in data: task.result_format = _result_format(data['result_format'])
+        if 'retention_days' in data: task.retention_days = _int_or_none(data['retention_days'])
+        if 'retention_max_mb' in data: task.retention_max_mb = _int_or_none(data['retention_max_mb'])
+        if 'plan_threshold' in data: task.plan_threshold = _float_or_none(data['plan_threshold'])
+        if 'target_db_ids' in data: task.target_db_ids = _id_list(data['target_db_ids'])
+        if 'target_tag' in data: task.target_tag = (data['target_tag'] or '').strip() or None
         
         db.session.commit()
         
@@ -97,7 +124,9 @@ def delete_task(id):
         except:
             pass
             
-        # Delete history
+        # Delete archived results and history
+        for record in ResultArchive.query.filter_by(task_id=id).all():
+            result_archiver.delete(record, commit=False)
         QueryHistory.query.filter_by(task_id=id).delete()
         
         db.session.delete(task)
@@ -262,6 +291,31 @@ def delete_saved_query(id):
         return jsonify({'status': 'success'})
     return jsonify({'status': 'error', 'message': 'Not found'}), 404
 
+def _float_or_none(value):
+    if value in (None, ''):
+        return None
+    return float(value)
+
+def _int_or_none(value):
+    """表单中的数字字段：空字符串/None 视为未设置"""
+    if value is None or value == '':
+        return None
+    return int(value)
+
+def _result_format(value):
+    """任务结果格式：为空时使用 csv，未知或当前环境缺少依赖的格式拒绝保存"""
+    fmt = value or 'csv'
+    if fmt not in available_formats():
+        raise ValueError(f"Result format {fmt} is not available")
+    return fmt
+
+def _id_list(value):
+    """ID 列表或逗号分隔的字符串 -> 规范化的 "1,2,3"，为空时返回 None"""
+    if isinstance(value, str):
+        value = value.split(',')
+    ids = [str(int(v)) for v in value or [] if str(v).strip()]
+    return ','.join(ids) or None
+
 @api_bp.route('/databases', methods=['GET'])
 def get_databases():
     databases = DatabaseConfig.query.all()
@@ -271,7 +325,20 @@ def get_databases():
         'type': d.db_type,
         'host': d.host,
         'port': d.port,
-        'database': d.database
+        'database': d.database,
+        'pool_size': d.pool_size,
+        'max_overflow': d.max_overflow,
+        'pool_recycle': d.pool_recycle,
+        'pool_timeout': d.pool_timeout,
+        'replica_hosts': d.replica_hosts,
+        'replica_policy': d.replica_policy or 'round_robin',
+        'min_idle': d.min_idle,
+        'task_concurrency': d.task_concurrency,
+        'max_estimated_rows': d.max_estimated_rows,
+        'max_estimated_cost': d.max_estimated_cost,
+        'admission_action': d.admission_action or 'confirm',
+        'auto_limit': d.auto_limit,
+        'tags': d.tags
     } for d in databases])
 
 @api_bp.route('/databases/test', methods=['POST'])
@@ -303,10 +370,26 @@ def add_database():
         port=data.get('port'),
         username=data.get('username'),
         password=data.get('password'),
-        database=data.get('database')
+        database=data.get('database'),
+        pool_size=_int_or_none(data.get('pool_size')),
+        max_overflow=_int_or_none(data.get('max_overflow')),
+        pool_recycle=_int_or_none(data.get('pool_recycle')),
+        pool_timeout=_int_or_none(data.get('pool_timeout')),
+        replica_hosts=(data.get('replica_hosts') or '').strip() or None,
+        replica_policy=data.get('replica_policy') or 'round_robin',
+        min_idle=_int_or_none(data.get('min_idle')),
+        task_concurrency=_int_or_none(data.get('task_concurrency')),
+        max_estimated_rows=_int_or_none(data.get('max_estimated_rows')),
+        max_estimated_cost=_float_or_none(data.get('max_estimated_cost')),
+        admission_action=data.get('admission_action') or 'confirm',
+        auto_limit=_int_or_none(data.get('auto_limit')),
+        tags=','.join(parse_tags(data.get('tags'))) or None
     )
     db.session.add(new_db)
     db.session.commit()
+    if current_app.config['POOL_WARMUP']:
+        DatabaseHelper.warm_up(new_db, background=True)
+    schema_catalog.refresh_async(current_app._get_current_object(), db_ids=[new_db.id])
     return jsonify({'status': 'success', 'id': new_db.id})
 
 @api_bp.route('/databases/<int:id>', methods=['PUT'])
@@ -322,16 +405,82 @@ def update_database(id):
         if 'username' in data: db_config.username = data['username']
         if 'password' in data: db_config.password = data['password']
         if 'database' in data: db_config.database = data['database']
+        if 'pool_size' in data: db_config.pool_size = _int_or_none(data['pool_size'])
+        if 'max_overflow' in data: db_config.max_overflow = _int_or_none(data['max_overflow'])
+        if 'pool_recycle' in data: db_config.pool_recycle = _int_or_none(data['pool_recycle'])
+        if 'pool_timeout' in data: db_config.pool_timeout = _int_or_none(data['pool_timeout'])
+        if 'replica_hosts' in data: db_config.replica_hosts = (data['replica_hosts'] or '').strip() or None
+        if 'replica_policy' in data: db_config.replica_policy = data['replica_policy'] or 'round_robin'
+        if 'min_idle' in data: db_config.min_idle = _int_or_none(data['min_idle'])
+        if 'task_concurrency' in data: db_config.task_concurrency = _int_or_none(data['task_concurrency'])
+        if 'max_estimated_rows' in data: db_config.max_estimated_rows = _int_or_none(data['max_estimated_rows'])
+        if 'max_estimated_cost' in data: db_config.max_estimated_cost = _float_or_none(data['max_estimated_cost'])
+        if 'admission_action' in data: db_config.admission_action = data['admission_action'] or 'confirm'
+        if 'auto_limit' in data: db_config.auto_limit = _int_or_none(data['auto_limit'])
+        if 'tags' in data: db_config.tags = ','.join(parse_tags(data['tags'])) or None
+        db_config.version = (db_config.version or 0) + 1
         
-        # 清理旧引擎缓存
+        # 清理旧引擎缓存、表结构缓存和副本状态
         DatabaseHelper.dispose_engine(db_config)
+        DatabaseHelper.invalidate_schema(db_config)
+        result_cache.invalidate(db_config.id)
+        replica_router.reset(db_config.id)
         
         db.session.commit()
+        if current_app.config['POOL_WARMUP']:
+            DatabaseHelper.warm_up(db_config, background=True)
+        schema_catalog.refresh_async(current_app._get_current_object(), db_ids=[db_config.id])
         return jsonify({'status': 'success'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@api_bp.route('/databases/<int:id>/pool_stats', methods=['GET'])
+def get_pool_stats(id):
+    """连接池统计：签出次数、签出等待时间、新建连接、失效连接和溢出使用"""
+    db_config = DatabaseConfig.query.get_or_404(id)
+    stats = DatabaseHelper.get_pool_stats(db_config)
+    return jsonify({'status': 'success', 'db_id': id, 'name': db_config.name, 'active': stats is not None,
+                    'stats': stats})
+
+@api_bp.route('/databases/health', methods=['GET'])
+def check_databases_health():
+    """
+    并发检查所有（或 ids 指定的）数据库的连通性，返回按状态排序的延迟列表；
+    connect_timeout / read_timeout 可覆盖默认超时（秒）
+    """
+    query = DatabaseConfig.query
+    ids = _id_list(request.args.get('ids'))
+    if ids:
+        query = query.filter(DatabaseConfig.id.in_([int(i) for i in ids.split(',')]))
+    configs = query.all()
+    connect_timeout = float(request.args.get('connect_timeout') or current_app.config['HEALTH_CONNECT_TIMEOUT'])
+    read_timeout = float(request.args.get('read_timeout') or current_app.config['HEALTH_READ_TIMEOUT'])
+
+    start_time = datetime.now()
+    results = DatabaseHelper.check_health(configs, connect_timeout=connect_timeout, read_timeout=read_timeout,
+                                          max_workers=current_app.config['HEALTH_CHECK_WORKERS'])
+    summary = {status: sum(1 for r in results if r['status'] == status) for status in ('ok', 'error', 'timeout')}
+    return jsonify({
+        'status': 'success',
+        'results': results,
+        'summary': summary,
+        'elapsed': round((datetime.now() - start_time).total_seconds(), 3)
+    })
+
+@api_bp.route('/databases/<int:id>/replicas', methods=['GET'])
+def get_replica_status(id):
+    """只读副本状态：是否可用、平均延迟、路由的查询数和最近的连接错误"""
+    db_config = DatabaseConfig.query.get_or_404(id)
+    return jsonify({'status': 'success', 'policy': db_config.replica_policy or 'round_robin',
+                    'replicas': replica_router.status(db_config)})
+
+@api_bp.route('/databases/pool_stats', methods=['GET'])
+def get_all_pool_stats():
+    """所有数据库的连接池统计（用于数据库列表页的汇总面板）"""
+    return jsonify([{'db_id': d.id, 'name': d.name, 'stats': DatabaseHelper.get_pool_stats(d)}
+                    for d in DatabaseConfig.query.all()])
+
 @api_bp.route('/databases/<int:id>', methods=['DELETE'])
 def delete_database(id):
     """删除数据库配置"""
@@ -345,8 +494,12 @@ def delete_database(id):
                 'message': f'该数据库下存在 {len(tasks)} 个关联任务，请先删除任务'
             }), 400
         
-        # 清理引擎缓存
+        # 清理引擎缓存和表结构缓存
         DatabaseHelper.dispose_engine(db_config)
+        DatabaseHelper.invalidate_schema(db_config)
+        result_cache.invalidate(db_config.id)
+        replica_router.reset(db_config.id)
+        schema_catalog.remove(db_config.id)
         
         # 删除关联的查询历史
         QueryHistory.query.filter_by(db_config_id=id).delete()
@@ -393,22 +546,417 @@ def execute_query():
     db_config = DatabaseConfig.query.get(db_id)
     if not db_config:
         return jsonify({'status': 'error', 'message': 'Database not found'})
-        
-    result = DatabaseHelper.execute_query(db_config, query)
+
+    admission = check_admission(db_config, query, params=data.get('params'), confirmed=bool(data.get('confirm')))
+    if admission['action'] != 'allow':
+        return _admission_response(admission)
+    query = admission['query']
+
+    if data.get('stream'):
+        return _stream_query_response(db_config, query, data)
+
+    start_time = datetime.now()
+    result = DatabaseHelper.execute_query(db_config, query, params=data.get('params'),
+                                          use_cache=bool(data.get('use_cache')),
+                                          cache_ttl=data.get('cache_ttl'),
+                                          timeout=_query_timeout(data),
+                                          run_id=data.get('run_id'))
+    execution_time = (datetime.now() - start_time).total_seconds()
     
     # 记录历史
     history = QueryHistory(
         db_config_id=db_id,
         sql_query=query,
         status=result['status'],
+        execution_time=execution_time,
         result_count=result.get('count', 0),
         error_message=result.get('error')
     )
     db.session.add(history)
     db.session.commit()
     
+    if admission['auto_limit'] and result['status'] == 'success':
+        result['auto_limit'] = admission['auto_limit']
+    return make_result_response(result)
+
+def _admission_response(admission):
+    """准入检查未通过：reject 返回错误，confirm 要求客户端带 confirm=true 重新提交"""
+    info = {k: v for k, v in admission.items() if k != 'query'}
+    reasons = '; '.join(admission['reasons'])
+    if admission['action'] == 'reject':
+        return jsonify({'status': 'error', 'error': f"Query rejected by pre-flight check: {reasons}",
+                        'admission': info})
+    return jsonify({'status': 'confirm_required', 'message': f"Query exceeds pre-flight limits: {reasons}",
+                    'admission': info})
+
+def _fanout_admission(targets, query, params=None, confirmed=False):
+    """
+    多库查询的准入检查：逐个目标库检查（不自动追加 LIMIT），任一库拒绝则整体拒绝，
+    任一库要求确认则整体要求确认。返回与 check_admission 相同格式的汇总结果
+    """
+    admission = {'action': 'allow', 'query': query, 'auto_limit': None, 'reasons': [], 'targets': []}
+    for target in targets:
+        item = check_admission(target, query, params=params, confirmed=confirmed, auto_limit=False)
+        if item['action'] == 'allow':
+            continue
+        admission['reasons'] += [f"{target.name}: {reason}" for reason in item['reasons']]
+        admission['targets'].append({'db_id': target.id, 'name': target.name, 'action': item['action'],
+                                     'estimated_rows': item['estimated_rows'], 'total_cost': item['total_cost']})
+        if item['action'] == 'reject':
+            admission['action'] = 'reject'
+        elif admission['action'] == 'allow':
+            admission['action'] = 'confirm'
+    return admission
+
+def _export_admission(db_config, query, data):
+    """导出前的准入检查（不自动追加 LIMIT）；未通过时返回非 200 响应，避免客户端把 JSON 当作文件下载"""
+    admission = check_admission(db_config, query, confirmed=bool(data.get('confirm')), auto_limit=False)
+    if admission['action'] == 'allow':
+        return None
+    response = _admission_response(admission)
+    response.status_code = 403 if admission['action'] == 'reject' else 409
+    return response
+
+def _query_timeout(data):
+    """请求中的 timeout（秒），未指定时使用系统默认值"""
+    timeout = data.get('timeout')
+    if timeout in (None, ''):
+        return current_app.config['QUERY_TIMEOUT']
+    return float(timeout)
+
+def _export_timeout(data):
+    """
+    导出的 timeout（秒）：只使用请求中显式指定的值，默认不限制。
+    流式导出的超时覆盖整个下载过程，默认的 QUERY_TIMEOUT 会截断耗时较长的大文件导出
+    """
+    timeout = data.get('timeout')
+    if timeout in (None, ''):
+        return None
+    return float(timeout)
+
+@api_bp.route('/query/explain', methods=['POST'])
+def explain_query():
+    """获取查询的执行计划（归一化的计划树），不执行语句本身"""
+    data = request.json
+    db_config = DatabaseConfig.query.get(data.get('db_id'))
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+    if not data.get('query'):
+        return jsonify({'status': 'error', 'message': 'Missing query'}), 400
+    return jsonify(DatabaseHelper.explain_query(db_config, data['query'], params=data.get('params')))
+
+@api_bp.route('/query/script', methods=['POST'])
+def execute_script():
+    """
+    脚本模式：按方言拆分多条语句，在同一连接上依次执行。
+    transaction 为 true 时在一个事务中执行，stop_on_error 为 false 时出错继续执行后续语句
+    """
+    data = request.json
+    db_config = DatabaseConfig.query.get(data.get('db_id'))
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+    script = data.get('query') or ''
+    statements = split_statements(script, db_config.db_type)
+    if not statements:
+        return jsonify({'status': 'error', 'message': 'Missing query'}), 400
+
+    # 逐条做准入检查，任一语句需要确认或被拒绝时整个脚本都不执行
+    for index, statement in enumerate(statements, 1):
+        admission = check_admission(db_config, statement, confirmed=bool(data.get('confirm')), auto_limit=False)
+        if admission['action'] != 'allow':
+            admission['statement_index'] = index
+            return _admission_response(admission)
+
+    result = DatabaseHelper.execute_script(db_config, script,
+                                           transaction=bool(data.get('transaction')),
+                                           stop_on_error=data.get('stop_on_error', True) is not False,
+                                           max_rows=_int_or_none(data.get('max_rows')) or SCRIPT_MAX_ROWS,
+                                           timeout=_query_timeout(data),
+                                           run_id=data.get('run_id'))
+
+    history = QueryHistory(
+        db_config_id=db_config.id,
+        sql_query=script,
+        status=result['status'],
+        execution_time=result.get('elapsed', 0),
+        result_count=result.get('count', 0),
+        error_message=result.get('error')
+    )
+    db.session.add(history)
+    db.session.commit()
     return jsonify(result)
 
+@api_bp.route('/query/fanout', methods=['POST'])
+def fanout_query():
+    """
+    在多个数据库上并发执行同一查询：db_ids 为目标库 ID 列表，tag 为目标库标签（可同时指定），
+    结果合并并增加来源库列；部分目标失败时 status 为 partial
+    """
+    data = request.json
+    query = data.get('query')
+    if not query:
+        return jsonify({'status': 'error', 'message': 'Missing query'}), 400
+    targets = resolve_targets(db_ids=data.get('db_ids'), tag=(data.get('tag') or '').strip() or None)
+    if not targets:
+        return jsonify({'status': 'error', 'message': 'No target databases'}), 404
+
+    admission = _fanout_admission(targets, query, params=data.get('params'), confirmed=bool(data.get('confirm')))
+    if admission['action'] != 'allow':
+        return _admission_response(admission)
+
+    result = fanout_runner.run(current_app._get_current_object(), targets, query, params=data.get('params'),
+                               timeout=_query_timeout(data))
+    for target in result['targets']:
+        db.session.add(QueryHistory(
+            db_config_id=target['db_id'],
+            sql_query=query,
+            status=target['status'],
+            execution_time=target['elapsed'] or 0,
+            result_count=target['count'],
+            error_message=target['error']
+        ))
+    db.session.commit()
+    return make_result_response(result)
+
+@api_bp.route('/query/<run_id>/cancel', methods=['POST'])
+def cancel_running_query(run_id):
+    """取消正在执行的查询"""
+    if cancel_query(run_id):
+        return jsonify({'status': 'success'})
+    return jsonify({'status': 'error', 'message': 'Query not running'}), 404
+
+@api_bp.route('/query/running', methods=['GET'])
+def get_running_queries():
+    return jsonify({'status': 'success', 'items': list_running_queries()})
+
+@api_bp.route('/query/jobs', methods=['POST'])
+def submit_query_job():
+    """提交后台查询任务，立即返回 job_id"""
+    data = request.json
+    db_config = DatabaseConfig.query.get(data.get('db_id'))
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+    if not data.get('query'):
+        return jsonify({'status': 'error', 'message': 'Missing query'}), 400
+
+    # 后台任务用于获取完整结果，只做代价检查，不自动追加 LIMIT
+    admission = check_admission(db_config, data['query'], confirmed=bool(data.get('confirm')), auto_limit=False)
+    if admission['action'] != 'allow':
+        return _admission_response(admission)
+
+    try:
+        job = job_manager.submit(current_app._get_current_object(), db_config, data['query'],
+                                 timeout=_query_timeout(data),
+                                 max_rows=current_app.config['QUERY_JOB_MAX_ROWS'])
+    except JobQueueFull as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    return jsonify({'status': 'success', 'job_id': job.job_id})
+
+@api_bp.route('/query/jobs/<job_id>', methods=['GET'])
+def get_query_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict()})
+
+@api_bp.route('/query/jobs/<job_id>/results', methods=['GET'])
+def get_query_job_results(job_id):
+    """分页获取后台查询结果（任务运行中也可读取已产出的部分）"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 10000)
+    return jsonify({
+        'status': 'success',
+        'job_status': job.status,
+        'columns': job.columns,
+        'rows': job.read(offset, limit),
+        'total': job.count,
+        'offset': offset,
+        'limit': limit
+    })
+
+@api_bp.route('/query/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_query_job(job_id):
+    if job_manager.cancel(job_id):
+        return jsonify({'status': 'success'})
+    return jsonify({'status': 'error', 'message': 'Job not running'}), 404
+
+@api_bp.route('/query/jobs/<job_id>', methods=['DELETE'])
+def delete_query_job(job_id):
+    if job_manager.remove(job_id):
+        return jsonify({'status': 'success'})
+    return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+@api_bp.route('/query/aggregate', methods=['POST'])
+def aggregate_query():
+    """
+    在服务端对查询结果做分组 / 透视 / Top-N / describe，只返回聚合后的结果。
+    数据来源：job_id 指定的已完成后台任务；source=cache 仅使用结果缓存；
+    source=live 直接执行查询；默认 auto（缓存命中则使用缓存，否则执行查询）
+    """
+    data = request.json
+    source = data.get('source') or 'auto'
+    start_time = datetime.now()
+    max_rows = current_app.config['QUERY_AGG_MAX_ROWS']
+    input_truncated = False
+
+    if data.get('job_id'):
+        job = job_manager.get(data['job_id'])
+        if not job:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+        if job.status != 'success':
+            return jsonify({'status': 'error', 'message': f"Job is {job.status}"}), 409
+        # 与实时查询相同，最多读取 QUERY_AGG_MAX_ROWS 行
+        input_truncated = job.count > max_rows
+        columns, rows, source = job.columns, job.read(0, min(job.count, max_rows)), 'job'
+    else:
+        db_config = DatabaseConfig.query.get(data.get('db_id'))
+        if not db_config:
+            return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+        query = data.get('query')
+        if not query:
+            return jsonify({'status': 'error', 'message': 'Missing query'}), 400
+
+        entry = None
+        if source in ('auto', 'cache'):
+            entry = result_cache.get(result_cache.make_key(db_config.id, query, data.get('params')))
+            if entry is None and source == 'cache':
+                return jsonify({'status': 'error', 'message': 'Result not cached'}), 404
+        if entry is not None:
+            columns, rows, source = entry['result'].get('columns'), entry['result'].get('rows'), 'cache'
+        else:
+            admission = check_admission(db_config, query, params=data.get('params'),
+                                        confirmed=bool(data.get('confirm')), auto_limit=False)
+            if admission['action'] != 'allow':
+                return _admission_response(admission)
+            columns, rows, error, input_truncated = _fetch_rows(db_config, query, data)
+            source = 'live'
+            if error:
+                return jsonify({'status': 'error', 'error': error})
+
+    if not columns:
+        return jsonify({'status': 'error', 'message': 'Query returned no result set'}), 400
+
+    try:
+        result = aggregate(result_to_frame(columns, rows), data)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return make_result_response({
+        'status': 'success',
+        **result,
+        'source': source,
+        'input_rows': len(rows),
+        'input_truncated': input_truncated,
+        'execution_time': round((datetime.now() - start_time).total_seconds(), 3)
+    })
+
+def _fetch_rows(db_config, query, data):
+    """流式读取实时查询的全部结果行（受 QUERY_AGG_MAX_ROWS 限制），返回 (columns, rows, error, truncated)"""
+    start_time = datetime.now()
+    result = DatabaseHelper.stream_query(db_config, query,
+                                         max_rows=current_app.config['QUERY_AGG_MAX_ROWS'],
+                                         max_bytes=current_app.config['QUERY_STREAM_MAX_BYTES'],
+                                         timeout=_query_timeout(data), run_id=data.get('run_id'))
+    columns, rows, error, truncated = None, [], result.get('error'), False
+    if 'stream' in result:
+        stream = result['stream']
+        columns = stream.columns
+        try:
+            for chunk in stream:
+                rows.extend(chunk)
+        except Exception as e:
+            error = stream.error_message(e)
+        finally:
+            stream.close()
+        truncated = stream.truncated
+
+    history = QueryHistory(
+        db_config_id=db_config.id,
+        sql_query=query,
+        status='error' if error else 'success',
+        execution_time=(datetime.now() - start_time).total_seconds(),
+        result_count=len(rows),
+        error_message=error
+    )
+    db.session.add(history)
+    db.session.commit()
+    return columns, rows, error, truncated
+
+@api_bp.route('/query/cache', methods=['GET'])
+def get_query_cache_stats():
+    """查询结果缓存统计"""
+    return jsonify({'status': 'success', **result_cache.stats()})
+
+@api_bp.route('/query/cache', methods=['DELETE'])
+def clear_query_cache():
+    """清空查询结果缓存，可通过 db_id 参数只清理指定数据库"""
+    result_cache.invalidate(request.args.get('db_id', type=int))
+    return jsonify({'status': 'success'})
+
+def _stream_query_response(db_config, query, data):
+    """
+    以 NDJSON 分块返回查询结果：首行为列名，随后每行一个数据块，末行为汇总信息
+    """
+    config = current_app.config
+    chunk_size = int(data.get('chunk_size') or config['QUERY_STREAM_CHUNK_SIZE'])
+    max_rows = int(data.get('max_rows') or config['QUERY_STREAM_MAX_ROWS'])
+    max_bytes = config['QUERY_STREAM_MAX_BYTES']
+
+    start_time = datetime.now()
+    result = DatabaseHelper.stream_query(db_config, query, chunk_size=chunk_size,
+                                         max_rows=max_rows, max_bytes=max_bytes,
+                                         timeout=_query_timeout(data), run_id=data.get('run_id'))
+    if 'stream' not in result:
+        history = QueryHistory(
+            db_config_id=db_config.id,
+            sql_query=query,
+            status=result['status'],
+            execution_time=(datetime.now() - start_time).total_seconds(),
+            result_count=result.get('count', 0),
+            error_message=result.get('error')
+        )
+        db.session.add(history)
+        db.session.commit()
+        return jsonify(result)
+
+    stream = result['stream']
+
+    def generate():
+        status, error = 'success', None
+        try:
+            yield json.dumps({'columns': stream.columns, 'run_id': stream.run_id}, default=str) + '\n'
+            for chunk in stream:
+                yield json.dumps({'rows': chunk}, default=str) + '\n'
+        except Exception as e:
+            status, error = 'error', stream.error_message(e)
+            logger.error(f"Stream query error: {error}")
+        finally:
+            stream.close()
+
+        yield json.dumps({
+            'status': status,
+            'error': error,
+            'count': stream.count,
+            'truncated': stream.truncated
+        }) + '\n'
+
+        history = QueryHistory(
+            db_config_id=db_config.id,
+            sql_query=query,
+            status=status,
+            execution_time=(datetime.now() - start_time).total_seconds(),
+            result_count=stream.count,
+            error_message=error
+        )
+        db.session.add(history)
+        db.session.commit()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @api_bp.route('/tasks', methods=['GET'])
 def get_tasks():
     tasks = ScheduledTask.query.all()
@@ -427,21 +975,97 @@ def get_tasks():
         'notify_feishu': t.notify_feishu,
         'notify_dingtalk': t.notify_dingtalk,
         'notify_wechat': t.notify_wechat,
-        'notify_rule': t.notify_rule
+        'notify_rule': t.notify_rule,
+        'timeout': t.timeout,
+        'result_format': t.result_format or 'csv',
+        'retention_days': t.retention_days,
+        'retention_max_mb': t.retention_max_mb,
+        'plan_threshold': t.plan_threshold,
+        'target_db_ids': t.target_db_ids,
+        'target_tag': t.target_tag,
+        'queue_state': task_executor.task_state(t.id)
     } for t in tasks])
 
+@api_bp.route('/tasks/queue', methods=['GET'])
+def get_task_queue():
+    """定时任务执行池状态：运行中 / 排队任务数和各目标库的并发情况"""
+    status = task_executor.status()
+    names = dict(db.session.query(DatabaseConfig.id, DatabaseConfig.name).all())
+    for item in status['databases']:
+        item['name'] = names.get(item['db_id'])
+    return jsonify({'status': 'success', **status})
+
 @api_bp.route('/tasks/<int:id>/history', methods=['GET'])
 def get_task_history(id):
     history = QueryHistory.query.filter_by(task_id=id).order_by(QueryHistory.created_at.desc()).limit(20).all()
+    archives = {a.history_id: a for a in ResultArchive.query.filter(
+        ResultArchive.history_id.in_([h.id for h in history])).all()}
     return jsonify([{
         'id': h.id,
         'status': h.status,
         'execution_time': h.execution_time,
         'result_count': h.result_count,
         'error_message': h.error_message,
-        'created_at': h.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        'created_at': h.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'plan_hash': h.plan_hash,
+        'archive': _archive_to_dict(archives[h.id]) if h.id in archives else None
     } for h in history])
 
+def _archive_to_dict(record):
+    return {
+        'id': record.id,
+        'task_id': record.task_id,
+        'history_id': record.history_id,
+        'format': record.format,
+        'size_bytes': record.size_bytes,
+        'row_count': record.row_count,
+        'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+@api_bp.route('/tasks/<int:id>/results', methods=['GET'])
+def get_task_results(id):
+    """从索引表分页列出任务的归档结果，可按 start / end 日期过滤"""
+    query = ResultArchive.query.filter_by(task_id=id)
+    start = request.args.get('start')
+    end = request.args.get('end')
+    try:
+        if start:
+            query = query.filter(ResultArchive.created_at >= datetime.strptime(start, '%Y-%m-%d'))
+        if end:
+            query = query.filter(ResultArchive.created_at < datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date, expected YYYY-MM-DD'}), 400
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    total = query.count()
+    records = query.order_by(ResultArchive.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    return jsonify({
+        'status': 'success',
+        'items': [_archive_to_dict(r) for r in records],
+        'total': total,
+        'page': page,
+        'per_page': per_page
+    })
+
+@api_bp.route('/results/formats', methods=['GET'])
+def get_result_formats():
+    return jsonify({'status': 'success', 'formats': available_formats()})
+
+@api_bp.route('/results/<int:id>/download', methods=['GET'])
+def download_result(id):
+    record = ResultArchive.query.get_or_404(id)
+    path = result_archiver.full_path(record)
+    if not os.path.exists(path):
+        return jsonify({'status': 'error', 'message': 'Result file missing'}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(record.path))
+
+@api_bp.route('/results/<int:id>', methods=['DELETE'])
+def delete_result(id):
+    record = ResultArchive.query.get_or_404(id)
+    result_archiver.delete(record)
+    return jsonify({'status': 'success'})
+
 @api_bp.route('/tasks/<int:id>/toggle', methods=['POST'])
 def toggle_task(id):
     task = ScheduledTask.query.get(id)
@@ -480,7 +1104,7 @@ def add_task():
     try:
         new_task = ScheduledTask(
             name=data['name'],
-            db_config_id=data['db_config_id'],
+            db_config_id=data.get('db_config_id') or None,
             sql_query=data.get('sql_query') or data.get('query'),
             cron_expression=data.get('cron_expression') or data.get('cron'),
             check_type=data.get('check_type', 'has_results'),
@@ -489,7 +1113,14 @@ def add_task():
             notify_feishu=data.get('notify_feishu', False),
             notify_dingtalk=data.get('notify_dingtalk', False),
             notify_wechat=data.get('notify_wechat', False),
-            notify_rule=data.get('notify_rule', 'none')
+            notify_rule=data.get('notify_rule', 'none'),
+            timeout=_int_or_none(data.get('timeout')),
+            result_format=_result_format(data.get('result_format')),
+            retention_days=_int_or_none(data.get('retention_days')),
+            retention_max_mb=_int_or_none(data.get('retention_max_mb')),
+            plan_threshold=_float_or_none(data.get('plan_threshold')),
+            target_db_ids=_id_list(data.get('target_db_ids')),
+            target_tag=(data.get('target_tag') or '').strip() or None
         )
         db.session.add(new_task)
         db.session.commit()
@@ -515,15 +1146,16 @@ def add_task():
 @api_bp.route('/query/export_csv', methods=['POST'])
 def export_csv():
     """
-    将查询结果导出为 CSV 格式
+    将查询结果以流式方式导出为 CSV 格式，可选 gzip 压缩
     """
     from io import StringIO
     import csv
-    from flask import Response
-    
+    import zlib
+
     data = request.json
     db_id = data.get('db_id')
     query = data.get('query')
+    use_gzip = bool(data.get('gzip'))
 
     if not db_id or not query:
         return jsonify({'status': 'error', 'message': 'Missing db_id or query'}), 400
@@ -531,44 +1163,102 @@ def export_csv():
     db_config = DatabaseConfig.query.get(db_id)
     if not db_config:
         return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+    rejected = _export_admission(db_config, query, data)
+    if rejected is not None:
+        return rejected
 
-    result = DatabaseHelper.execute_query(db_config, query)
+    chunk_size = current_app.config['QUERY_STREAM_CHUNK_SIZE']
+    result = DatabaseHelper.stream_query(db_config, query, chunk_size=chunk_size, max_rows=0, max_bytes=0,
+                                         timeout=_export_timeout(data))
     if result['status'] != 'success':
         return jsonify(result), 400
-        
-    if 'columns' not in result:
+
+    if 'stream' not in result:
         return jsonify({'status': 'error', 'message': 'No data to export'}), 400
 
-    # 创建 CSV 内容
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # 写入表头
-    writer.writerow(result['columns'])
-    
-    # 写入数据行
-    for row in result['rows']:
-        # 将 None 转换为 'NULL' 以匹配前端显示
-        processed_row = []
-        for cell in row:
-            if cell is None:
-                processed_row.append('NULL')
-            else:
-                processed_row.append(cell)
-        writer.writerow(processed_row)
-
-    # 获取 CSV 字符串
-    csv_content = output.getvalue()
-    output.close()
+    stream = result['stream']
+
+    def generate():
+        # 复用同一个缓冲区，每批数据写完即输出并清空
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        compressor = zlib.compressobj(wbits=31) if use_gzip else None
+
+        def flush():
+            content = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            return compressor.compress(content) if compressor else content
+
+        try:
+            # 写入表头
+            writer.writerow(stream.columns)
+            yield flush()
+
+            for chunk in stream:
+                # 将 None 转换为 'NULL' 以匹配前端显示
+                writer.writerows(
+                    ['NULL' if cell is None else cell for cell in row] for row in chunk
+                )
+                yield flush()
+        finally:
+            stream.close()
+
+        if compressor:
+            yield compressor.flush()
 
     # 返回 CSV 文件作为下载
     filename = f"query_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    mimetype = 'text/csv'
+    if use_gzip:
+        filename += '.gz'
+        mimetype = 'application/gzip'
     return Response(
-        csv_content,
-        mimetype='text/csv',
+        stream_with_context(generate()),
+        mimetype=mimetype,
         headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
+@api_bp.route('/query/export_xlsx', methods=['POST'])
+def export_xlsx():
+    """
+    将查询结果导出为 Excel：按块从游标读取并以 write-only 模式写入，
+    超过 Excel 单表行数上限时自动拆分到多个工作表
+    """
+    data = request.json
+    db_id = data.get('db_id')
+    query = data.get('query')
+
+    if not db_id or not query:
+        return jsonify({'status': 'error', 'message': 'Missing db_id or query'}), 400
+
+    db_config = DatabaseConfig.query.get(db_id)
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+    rejected = _export_admission(db_config, query, data)
+    if rejected is not None:
+        return rejected
+
+    chunk_size = current_app.config['QUERY_STREAM_CHUNK_SIZE']
+    result = DatabaseHelper.stream_query(db_config, query, chunk_size=chunk_size, max_rows=0, max_bytes=0,
+                                         timeout=_export_timeout(data))
+    if result['status'] != 'success':
+        return jsonify(result), 400
+
+    if 'stream' not in result:
+        return jsonify({'status': 'error', 'message': 'No data to export'}), 400
+
+    stream = result['stream']
+    try:
+        fileobj = export_to_tempfile(stream.columns, stream, sheet_title='Result')
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': stream.error_message(e)}), 400
+    finally:
+        stream.close()
+
+    filename = f"query_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return send_file(fileobj, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename)
+
 @api_bp.route('/tasks/<int:id>/run', methods=['POST'])
 def run_task(id):
     """
@@ -601,6 +1291,39 @@ def get_database_tables(id):
     result = DatabaseHelper.get_tables(db_config)
     return jsonify(result)
 
+@api_bp.route('/databases/<int:id>/schema/refresh', methods=['POST'])
+def refresh_database_schema(id):
+    """手动刷新表结构缓存"""
+    db_config = DatabaseConfig.query.get(id)
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+
+    DatabaseHelper.invalidate_schema(db_config)
+    result = DatabaseHelper.get_tables(db_config)
+    schema_catalog.invalidate(db_config.id)
+    schema_catalog.refresh_async(current_app._get_current_object(), db_ids=[db_config.id])
+    return jsonify(result)
+
+@api_bp.route('/schema/search', methods=['GET'])
+def search_schema():
+    """
+    跨库搜索数据库 / 表 / 列名：q 为关键词（前缀、子串和模糊匹配），
+    type 限定 database / table / column，db_id 限定数据库，fuzzy=0 关闭模糊匹配
+    """
+    kind = request.args.get('type') or None
+    if kind and kind not in ENTRY_KINDS:
+        return jsonify({'status': 'error', 'message': f'Unknown type: {kind}'}), 400
+    result = schema_catalog.search(request.args.get('q', ''), kind=kind,
+                                   db_id=request.args.get('db_id', type=int),
+                                   limit=request.args.get('limit', 50, type=int),
+                                   fuzzy=request.args.get('fuzzy', '1') != '0')
+    return jsonify({'status': 'success', **result})
+
+@api_bp.route('/schema/catalog', methods=['GET'])
+def get_schema_catalog():
+    """表结构索引状态：已索引的数据库 / 表 / 列数和加载失败的数据库"""
+    return jsonify({'status': 'success', **schema_catalog.status()})
+
 @api_bp.route('/databases/<int:id>/tables/<table_name>/data', methods=['GET'])
 def get_table_data(id, table_name):
     db_config = DatabaseConfig.query.get(id)
@@ -619,7 +1342,53 @@ def get_table_data(id, table_name):
         except:
             pass
             
-    result = DatabaseHelper.get_table_data(db_config, table_name, limit, offset, filters=column_filters)
+    # 键集分页：paging=keyset 开启，cursor 为上一次响应返回的游标
+    cursor = request.args.get('cursor') or None
+    keyset = request.args.get('paging') == 'keyset'
+    key_columns = request.args.get('key')
+    key_columns = [k.strip() for k in key_columns.split(',') if k.strip()] if key_columns else None
+
+    result = DatabaseHelper.get_table_data(db_config, table_name, limit, offset, filters=column_filters,
+                                           cursor=cursor, keyset=keyset, key_columns=key_columns,
+                                           count=request.args.get('count', 'estimate'),
+                                           order_by=request.args.get('order_by') or None)
+    return make_result_response(result)
+
+@api_bp.route('/databases/<int:id>/tables/<table_name>/profile', methods=['GET'])
+def get_table_profile(id, table_name):
+    """
+    表数据概况（采样）：sample 为采样行数，top 为每列高频值个数，refresh=1 时忽略缓存重新采样
+    """
+    db_config = DatabaseConfig.query.get(id)
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+
+    result = DatabaseHelper.profile_table(db_config, table_name,
+                                          sample_rows=request.args.get('sample', PROFILE_SAMPLE_ROWS, type=int),
+                                          top_n=min(max(request.args.get('top', PROFILE_TOP_N, type=int), 1), 50),
+                                          refresh=request.args.get('refresh') == '1')
+    return jsonify(result)
+
+@api_bp.route('/databases/<int:id>/tables/<table_name>/count', methods=['GET'])
+def get_table_count(id, table_name):
+    """
+    获取表总行数：count=estimate 返回目录估算值或已缓存的精确值，
+    count=async 在后台计算精确值，count=exact 同步计算
+    """
+    db_config = DatabaseConfig.query.get(id)
+    if not db_config:
+        return jsonify({'status': 'error', 'message': 'Database not found'}), 404
+
+    filters_json = request.args.get('filters')
+    column_filters = {}
+    if filters_json:
+        try:
+            column_filters = json.loads(filters_json)
+        except:
+            pass
+
+    result = DatabaseHelper.get_table_count(db_config, table_name, filters=column_filters,
+                                            count=request.args.get('count', 'estimate'))
     return jsonify(result)
 
 @api_bp.route('/logs', methods=['GET'])
@@ -652,6 +1421,7 @@ def get_logs():
             'execution_time': item.execution_time,
             'result_count': item.result_count,
             'error_message': item.error_message,
+            'plan_hash': item.plan_hash,
             'created_at': item.created_at.strftime('%Y-%m-%d %H:%M:%S')
         })
         
@@ -661,3 +1431,34 @@ def get_logs():
         'pages': pagination.pages,
         'current_page': pagination.page
     })
+
+@api_bp.route('/logs/<int:id>/plan', methods=['GET'])
+def get_log_plan(id):
+    """
+    获取执行历史中保存的执行计划，并与同一任务（或同一手动查询）上一次采集的计划比较
+    """
+    item = QueryHistory.query.get_or_404(id)
+    if not item.plan:
+        return jsonify({'status': 'error', 'message': 'No plan captured'}), 404
+
+    query = QueryHistory.query.filter(QueryHistory.plan_hash.isnot(None),
+                                      QueryHistory.created_at < item.created_at)
+    if item.task_id:
+        query = query.filter(QueryHistory.task_id == item.task_id)
+    else:
+        query = query.filter(QueryHistory.db_config_id == item.db_config_id,
+                             QueryHistory.sql_query == item.sql_query)
+    previous = query.order_by(QueryHistory.created_at.desc()).first()
+
+    return jsonify({
+        'status': 'success',
+        **json.loads(item.plan),
+        'execution_time': item.execution_time,
+        'previous': {
+            'id': previous.id,
+            'plan_hash': previous.plan_hash,
+            'execution_time': previous.execution_time,
+            'created_at': previous.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        } if previous else None,
+        'plan_changed': bool(previous and previous.plan_hash != item.plan_hash)
+    })
@@ -0,0 +1,31 @@
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import database  # noqa: F401  注册模型，create_all 时建表
+
+
+@pytest.fixture
+def app():
+    """只初始化 SQLAlchemy 的最小应用（内存 SQLite，不启动调度器）"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def add_database(app):
+    from app.models.database import DatabaseConfig
+
+    def add(name, tags=None, **fields):
+        config = DatabaseConfig(name=name, db_type='sqlite', host=':memory:', tags=tags, **fields)
+        db.session.add(config)
+        db.session.commit()
+        return config
+    return add
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+import pytest
+
+from app.utils.aggregation import aggregate, result_to_frame
+
+COLUMNS = ['id', 'region', 'amount']
+ROWS = [
+    [1, 'east', Decimal('10.5')],
+    [2, 'west', Decimal('3')],
+    [3, 'east', Decimal('7')],
+    [4, 'west', Decimal('12')],
+    [5, 'north', None],
+]
+
+
+def run(spec):
+    return aggregate(result_to_frame(COLUMNS, ROWS), spec)
+
+
+def test_decimal_columns_become_numeric():
+    df = result_to_frame(COLUMNS, ROWS)
+    assert df['amount'].dtype.kind == 'f'
+
+
+def test_duplicate_columns_are_rejected():
+    with pytest.raises(ValueError):
+        result_to_frame(['a', 'a'], [[1, 2]])
+
+
+def test_groupby_sum_sorted():
+    result = run({'op': 'groupby', 'group_by': 'region',
+                  'metrics': [{'column': 'amount', 'func': 'sum', 'alias': 'total'}],
+                  'sort_by': 'total'})
+    assert result['columns'] == ['region', 'total']
+    assert result['rows'][:2] == [['east', 17.5], ['west', 15.0]]
+
+
+def test_groupby_without_keys_returns_one_row():
+    result = run({'op': 'groupby', 'metrics': [{'column': '*', 'func': 'count'}]})
+    assert result['columns'] == ['count']
+    assert result['rows'] == [[5]]
+
+
+def test_top_n_without_groups_has_no_index_column():
+    result = run({'op': 'top_n', 'sort_by': 'amount', 'n': 2})
+    assert result['columns'] == COLUMNS
+    assert [row[0] for row in result['rows']] == [4, 1]
+
+
+def test_top_n_per_group():
+    result = run({'op': 'top_n', 'sort_by': 'amount', 'n': 1, 'group_by': 'region'})
+    assert result['columns'] == COLUMNS
+    assert sorted(row[0] for row in result['rows']) == [1, 4, 5]
+
+
+def test_pivot_counts_without_values():
+    result = run({'op': 'pivot', 'index': 'region', 'columns': 'id'})
+    assert result['columns'][0] == 'region'
+    assert len(result['rows']) == 3
+
+
+def test_output_limit_sets_truncated():
+    result = run({'op': 'top_n', 'sort_by': 'id', 'n': 5, 'limit': 2})
+    assert result['count'] == 2
+    assert result['truncated'] is True
+
+
+def test_unknown_operation_and_function_are_rejected():
+    with pytest.raises(ValueError):
+        run({'op': 'nope'})
+    with pytest.raises(ValueError):
+        run({'op': 'groupby', 'metrics': [{'column': 'amount', 'func': 'evil'}]})
@@ -0,0 +1,42 @@
+from app.utils.fanout import SOURCE_COLUMN, merge_results, parse_tags, resolve_targets
+
+
+def test_parse_tags_strips_and_dedupes():
+    assert parse_tags(' a, b,,a ,c ') == ['a', 'b', 'c']
+    assert parse_tags(None) == []
+
+
+def test_resolve_targets_by_ids(add_database):
+    a, b, _ = add_database('a'), add_database('b'), add_database('c')
+    assert [t.name for t in resolve_targets(db_ids=[str(b.id), a.id])] == ['a', 'b']
+
+
+def test_resolve_targets_ignores_blank_ids(add_database):
+    add_database('a', tags='prod')
+    add_database('b', tags='dev')
+    # 只设置了标签的任务：''.split(',') == ['']
+    assert [t.name for t in resolve_targets(db_ids=[''], tag='prod')] == ['a']
+    assert [t.name for t in resolve_targets(db_ids=[' ', '\t'])] == []
+    assert [t.name for t in resolve_targets(db_ids=None, tag='dev')] == ['b']
+
+
+def test_resolve_targets_merges_ids_and_tag(add_database):
+    a = add_database('a', tags='prod,eu')
+    add_database('b', tags='production')
+    c = add_database('c', tags='eu')
+    targets = resolve_targets(db_ids=[a.id], tag='eu')
+    assert [t.id for t in targets] == [a.id, c.id]
+
+
+def test_merge_results_unions_columns():
+    columns, rows = merge_results([
+        {'name': 'a', 'columns': ['id', 'x'], 'rows': [[1, 'p']]},
+        {'name': 'b', 'columns': ['y', 'id'], 'rows': [['q', 2]]},
+        {'name': 'c', 'columns': None, 'rows': []},
+    ])
+    assert columns == [SOURCE_COLUMN, 'id', 'x', 'y']
+    assert rows == [['a', 1, 'p', None], ['b', 2, None, 'q']]
+
+
+def test_merge_results_without_result_sets():
+    assert merge_results([{'name': 'a', 'columns': None, 'rows': []}]) == (None, [])
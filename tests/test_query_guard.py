@@ -0,0 +1,63 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.utils.query_guard import QueryRun, cancel_query, list_running_queries
+
+# 不依赖任何表、足够慢的 SQLite 查询
+SLOW_QUERY = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) "
+              "SELECT count(*) FROM n")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    yield engine
+    engine.dispose()
+
+
+def run_guarded(engine, run, sql):
+    with engine.connect() as conn:
+        run.attach(conn)
+        try:
+            return conn.execute(text(sql)).scalar()
+        except OperationalError as e:
+            return run.error_message(e)
+        finally:
+            run.detach()
+
+
+def test_sqlite_timeout_interrupts_query(engine):
+    run = QueryRun(engine, SimpleNamespace(name='t'), timeout=0.2)
+    assert run_guarded(engine, run, SLOW_QUERY) == 'Query timed out after 0.2 seconds'
+    assert run.reason == 'timeout'
+    assert list_running_queries() == []
+
+
+def test_fast_query_unaffected(engine):
+    run = QueryRun(engine, SimpleNamespace(name='t'), timeout=5)
+    assert run_guarded(engine, run, 'SELECT 42') == 42
+    assert run.reason is None
+
+
+def test_cancel_by_run_id(engine):
+    run = QueryRun(engine, SimpleNamespace(name='t'), run_id='guard-test')
+    timer = threading.Timer(0.2, cancel_query, args=('guard-test',))
+    timer.start()
+    assert run_guarded(engine, run, SLOW_QUERY) == 'Query cancelled'
+    timer.join()
+    assert not cancel_query('guard-test')
+
+
+def test_running_queries_listed_while_attached(engine):
+    run = QueryRun(engine, SimpleNamespace(name='db'), timeout=30, run_id='listed')
+    with engine.connect() as conn:
+        run.attach(conn)
+        try:
+            assert [(r['run_id'], r['db_name'], r['timeout']) for r in list_running_queries()] == [('listed', 'db', 30)]
+        finally:
+            run.detach()
+    assert list_running_queries() == []
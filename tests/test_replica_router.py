@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils.replica_router import ReplicaRouter, is_replica_safe, parse_replicas
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT * FROM users',
+    'select count(*) from orders where status = 1',
+    "SELECT 'nextval(x)' AS note",
+    "SELECT * FROM t WHERE note = 'for update'",
+    '-- for update\nSELECT 1',
+    'WITH x AS (SELECT 1) SELECT * FROM x',
+])
+def test_replica_safe(sql):
+    assert is_replica_safe(sql)
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT nextval('orders_id_seq')",
+    "SELECT setval('orders_id_seq', 100)",
+    'SELECT currval ( \'s\' )',
+    'SELECT * FROM t WHERE id = 1 FOR UPDATE',
+    'SELECT * FROM t FOR NO KEY UPDATE',
+    'SELECT * FROM t FOR KEY SHARE',
+    'SELECT * FROM t LOCK IN SHARE MODE',
+    'SELECT pg_advisory_lock(1)',
+    'SELECT pg_try_advisory_xact_lock(1)',
+    "SELECT GET_LOCK('job', 10)",
+    'SELECT LAST_INSERT_ID()',
+    'PRAGMA journal_mode = WAL',
+    'UPDATE t SET a = 1',
+])
+def test_not_replica_safe(sql):
+    assert not is_replica_safe(sql)
+
+
+def _config(**fields):
+    defaults = {'id': 1, 'db_type': 'mysql', 'port': 3306, 'replica_hosts': None, 'replica_policy': 'round_robin'}
+    return SimpleNamespace(**{**defaults, **fields})
+
+
+def test_parse_replicas_defaults_port_and_dedupes():
+    config = _config(replica_hosts=' r1, r2:3307,,r1:3306 ')
+    assert parse_replicas(config) == ['r1:3306', 'r2:3307']
+    assert parse_replicas(_config(db_type='sqlite', port=None, replica_hosts='/tmp/a.db')) == ['/tmp/a.db']
+
+
+def test_candidates_skip_down_replicas():
+    router = ReplicaRouter(retry_seconds=60)
+    config = _config(replica_hosts='r1,r2')
+    assert router.candidates(config) == ['r1:3306', 'r2:3306']
+    assert router.candidates(config) == ['r2:3306', 'r1:3306']
+    router.mark_down(1, 'r1:3306', 'refused')
+    assert router.candidates(config) == ['r2:3306']
+    router.mark_down(1, 'r2:3306', 'refused')
+    assert router.candidates(config) == []
+    router.reset(1)
+    assert len(router.candidates(config)) == 2
+
+
+def test_least_latency_prefers_fastest():
+    router = ReplicaRouter()
+    config = _config(replica_hosts='r1,r2', replica_policy='least_latency')
+    router.record(1, 'r1:3306', 0.5)
+    router.record(1, 'r2:3306', 0.1)
+    assert router.candidates(config) == ['r2:3306', 'r1:3306']
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Integer, Text, create_engine, text
+
+from app.utils import database_helper
+from app.utils.database_helper import DatabaseHelper
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """10 行数据，ANALYZE 后再插入 5 行，使统计信息（10）与实际行数（15）不同"""
+    monkeypatch.setattr(database_helper, '_count_cache', {})
+    engine = create_engine(f"sqlite:///{tmp_path / 'count.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, note TEXT)"))
+        conn.execute(text("INSERT INTO items (name, note) VALUES (:name, :note)"),
+                     [{'name': f"n{i}", 'note': None if i % 2 else 'x'} for i in range(10)])
+        conn.execute(text("ANALYZE"))
+        conn.execute(text("INSERT INTO items (name, note) VALUES (:name, NULL)"),
+                     [{'name': f"m{i}"} for i in range(5)])
+    yield engine
+    engine.dispose()
+
+
+COLUMNS = [{'name': 'id', 'type': Integer()}, {'name': 'name', 'type': Text()}, {'name': 'note', 'type': Text()}]
+
+
+def resolve(engine, filters=None, count='estimate'):
+    query_str, params, conditions = DatabaseHelper._build_table_query(COLUMNS, 'items', filters)
+    return DatabaseHelper._resolve_count(engine, SimpleNamespace(id=1), 'items', query_str, params, conditions, count)
+
+
+def test_unfiltered_uses_catalog_estimate(engine):
+    assert resolve(engine) == {'total': 10, 'total_type': 'estimated', 'count_pending': False}
+
+
+def test_parameterless_condition_counts_exactly(engine):
+    # IS NULL 条件没有绑定参数，不能返回整表估算值
+    result = resolve(engine, {'note': {'op': 'is_null'}})
+    assert result['total_type'] == 'exact'
+    assert result['total'] == 10
+
+
+def test_exact_and_none(engine):
+    assert resolve(engine, count='exact')['total'] == 15
+    assert resolve(engine, count='none') == {'total': None, 'total_type': 'none', 'count_pending': False}
+
+
+def test_cached_exact_count_preferred(engine):
+    resolve(engine, count='exact')
+    assert resolve(engine) == {'total': 15, 'total_type': 'exact', 'count_pending': False}
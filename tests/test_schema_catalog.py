@@ -0,0 +1,67 @@
+from app.utils.schema_catalog import SchemaCatalog
+
+
+def col(name, type_='INTEGER'):
+    return {'name': name, 'type': type_}
+
+
+def make_catalog():
+    catalog = SchemaCatalog()
+    catalog._replace_database(1, {'name': 'shop', 'version': 1, 'loaded_at': 0, 'error': None}, {
+        'orders': [col('id'), col('customer_id'), col('created_at', 'DATETIME')],
+        'customers': [col('id'), col('email', 'TEXT')],
+    })
+    catalog._replace_database(2, {'name': 'crm', 'version': 1, 'loaded_at': 0, 'error': None}, {
+        'customer': [col('id'), col('email', 'TEXT')],
+    })
+    return catalog
+
+
+def names(result):
+    return [(r['type'], r['db_id'], r['table'], r['column']) for r in result['results']]
+
+
+def test_exact_then_prefix_then_substring():
+    result = make_catalog().search('customer', kind='table')
+    assert names(result) == [('table', 2, 'customer', None), ('table', 1, 'customers', None)]
+    assert result['results'][0]['score'] == 1.0
+    assert result['results'][0]['db_name'] == 'crm'
+
+    result = make_catalog().search('customer', kind='column')
+    assert names(result) == [('column', 1, 'orders', 'customer_id')]
+    assert result['results'][0]['column_type'] == 'INTEGER'
+
+    assert names(make_catalog().search('_at')) == [('column', 1, 'orders', 'created_at')]
+
+
+def test_fuzzy_match_and_filters():
+    catalog = make_catalog()
+    result = catalog.search('custmer')
+    assert names(result) == [('table', 2, 'customer', None), ('table', 1, 'customers', None)]
+    # 模糊匹配得分低于子串匹配
+    assert 0 < result['results'][0]['score'] <= 0.6
+    assert names(catalog.search('orderz', fuzzy=False)) == []
+    result = catalog.search('email', db_id=2)
+    assert names(result) == [('column', 2, 'customer', 'email')]
+    assert catalog.search('email')['total'] == 2
+    assert catalog.search('id', limit=1)['total'] == 3
+    assert len(catalog.search('id', limit=1)['results']) == 1
+
+
+def test_replace_and_remove_database():
+    catalog = make_catalog()
+    catalog._replace_database(1, {'name': 'shop', 'version': 2, 'loaded_at': 0, 'error': None}, {
+        'invoices': [col('id')],
+    })
+    assert catalog.search('orders')['total'] == 0
+    assert names(catalog.search('invoices')) == [('table', 1, 'invoices', None)]
+    assert catalog.search('email')['total'] == 1
+
+    catalog.remove(2)
+    assert catalog.search('email')['total'] == 0
+    assert catalog.search('crm')['total'] == 0
+    status = catalog.status()
+    assert (status['databases'], status['tables'], status['columns']) == (1, 1, 1)
+    # 名称和三元组索引中不留下已删除数据库的条目
+    assert set(catalog._names) == {'shop', 'invoices', 'id'}
+    assert all(name in catalog._names for posting in catalog._trigrams.values() for name in posting)
@@ -0,0 +1,45 @@
+from app.utils.sql_script import split_statements
+
+
+def test_splits_and_ignores_empty_statements():
+    sql = "SELECT 1; ;\n-- only a comment\n;\n-- leading\nSELECT 2;"
+    assert split_statements(sql, 'sqlite') == ['SELECT 1', '-- leading\nSELECT 2']
+
+
+def test_semicolons_in_literals_and_comments():
+    sql = "SELECT 'a;b', \"c;d\"; /* x; y */ SELECT 2 -- z;\n; SELECT 'it''s;'"
+    assert split_statements(sql, 'sqlite') == ["SELECT 'a;b', \"c;d\"", '/* x; y */ SELECT 2 -- z;', "SELECT 'it''s;'"]
+
+
+def test_postgresql_dollar_quotes_and_nested_comments():
+    sql = ("CREATE FUNCTION f() RETURNS int AS $body$ BEGIN RETURN 1; END; $body$ LANGUAGE plpgsql;\n"
+           "/* outer /* inner; */ still comment; */ SELECT $$a;b$$;")
+    statements = split_statements(sql, 'postgresql')
+    assert len(statements) == 2
+    assert statements[0].endswith('LANGUAGE plpgsql')
+    assert statements[1].endswith('SELECT $$a;b$$')
+
+
+def test_mysql_delimiter_backticks_and_escapes():
+    sql = ("SELECT `a;b` FROM t WHERE x = 'it\\'s;'; # note;\n"
+           "DELIMITER //\n"
+           "CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END//\n"
+           "DELIMITER ;\n"
+           "SELECT 3;")
+    statements = split_statements(sql, 'mysql')
+    assert statements[0] == "SELECT `a;b` FROM t WHERE x = 'it\\'s;'"
+    assert statements[1] == 'CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END'
+    assert statements[2] == 'SELECT 3'
+    assert len(statements) == 3
+
+
+def test_sqlite_trigger_body_is_one_statement():
+    sql = ("CREATE TRIGGER trg AFTER INSERT ON t BEGIN\n"
+           "  UPDATE c SET n = CASE WHEN n IS NULL THEN 1 ELSE n + 1 END;\n"
+           "  DELETE FROM q;\n"
+           "END;\n"
+           "SELECT 1;")
+    statements = split_statements(sql, 'sqlite')
+    assert len(statements) == 2
+    assert statements[0].startswith('CREATE TRIGGER') and statements[0].endswith('END')
+    assert statements[1] == 'SELECT 1'
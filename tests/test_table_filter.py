@@ -0,0 +1,83 @@
+from datetime import date, datetime, time
+
+import pytest
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, Text
+
+from app.utils.table_filter import build_conditions, column_kinds, parse_order_by
+
+COLUMNS = [
+    {'name': 'id', 'type': Integer()},
+    {'name': 'price', 'type': Numeric(10, 2)},
+    {'name': 'ratio', 'type': Float()},
+    {'name': 'name', 'type': Text()},
+    {'name': 'active', 'type': Boolean()},
+    {'name': 'day', 'type': Date()},
+    {'name': 'created', 'type': DateTime()},
+]
+
+
+def test_column_kinds():
+    assert column_kinds(COLUMNS) == {'id': 'number', 'price': 'number', 'ratio': 'number', 'name': 'text',
+                                     'active': 'bool', 'day': 'date', 'created': 'datetime'}
+
+
+def test_legacy_string_filter_is_escaped_contains():
+    conditions, params = build_conditions(COLUMNS, {'name': '50%_off!'})
+    assert conditions == ["name LIKE :filter_name ESCAPE '!'"]
+    assert params == {'filter_name': '%50!%!_off!!%'}
+
+
+def test_typed_comparisons():
+    conditions, params = build_conditions(COLUMNS, {
+        'id': {'op': 'gte', 'value': '10'},
+        'price': {'op': 'eq', 'value': '19.99'},
+        'ratio': {'op': 'lt', 'value': 0.5},
+        'active': {'op': 'eq', 'value': 'yes'},
+        'name': {'op': 'prefix', 'value': 'ab'},
+    })
+    assert conditions == ['id >= :filter_id', 'price = :filter_price', 'ratio < :filter_ratio',
+                          'active = :filter_active', "name LIKE :filter_name ESCAPE '!'"]
+    assert params == {'filter_id': 10, 'filter_price': '19.99', 'filter_ratio': 0.5,
+                      'filter_active': True, 'filter_name': 'ab%'}
+
+
+def test_in_between_and_null():
+    conditions, params = build_conditions(COLUMNS, {
+        'id': {'op': 'in', 'value': '1, 2,,3'},
+        'day': {'op': 'between', 'value': ['2024-01-01', None]},
+        'created': {'op': 'between', 'value': ['2024-01-01T08:00:00', '2024-01-31']},
+        'name': {'op': 'is_null'},
+        'ratio': {'op': 'not_null'},
+    })
+    assert conditions == ['id IN (:filter_id_0, :filter_id_1, :filter_id_2)', 'day >= :filter_day_min',
+                          'created >= :filter_created_min', 'created <= :filter_created_max',
+                          'name IS NULL', 'ratio IS NOT NULL']
+    assert params['filter_day_min'] == date(2024, 1, 1)
+    assert params['filter_created_min'] == datetime(2024, 1, 1, 8)
+    # 只给出日期的上界包含当天
+    assert params['filter_created_max'] == datetime.combine(date(2024, 1, 31), time.max)
+
+
+def test_blank_values_and_unknown_columns_are_ignored():
+    assert build_conditions(COLUMNS, {'id': {'op': 'eq', 'value': ' '}, 'missing': 'x', 'name': None}) == ([], {})
+
+
+@pytest.mark.parametrize('filters', [
+    {'id': {'op': 'contains', 'value': '1'}},
+    {'id': {'op': 'eq', 'value': '1.5'}},
+    {'price': {'op': 'eq', 'value': 'NaN'}},
+    {'active': {'op': 'eq', 'value': 'maybe'}},
+    {'day': {'op': 'gt', 'value': 'yesterday'}},
+    {'name': {'op': 'regex', 'value': '.*'}},
+    {'id': {'op': 'in', 'value': list(range(1001))}},
+])
+def test_invalid_filters_raise(filters):
+    with pytest.raises(ValueError):
+        build_conditions(COLUMNS, filters)
+
+
+def test_parse_order_by():
+    assert parse_order_by(COLUMNS, '-created, id,+name,id') == [('created', 'DESC'), ('id', 'ASC'), ('name', 'ASC')]
+    assert parse_order_by(COLUMNS, None) == []
+    with pytest.raises(ValueError):
+        parse_order_by(COLUMNS, 'id; DROP TABLE t')
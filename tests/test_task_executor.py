@@ -0,0 +1,67 @@
+import threading
+import time
+
+from app.utils.fanout import FanOutRunner
+from app.utils.task_executor import TaskExecutor
+
+
+def test_per_db_limit_queues_excess_tasks():
+    executor = TaskExecutor(max_workers=4, per_db_limit=1)
+    release = threading.Event()
+    started = []
+
+    def job(task_id):
+        started.append(task_id)
+        release.wait(5)
+
+    assert executor.submit(1, job, db_id=10) == 'queued'
+    assert executor.submit(2, job, db_id=10) == 'queued'
+    assert executor.submit(3, job, db_id=20) == 'queued'
+    # 重复触发与排队中的同一任务合并
+    assert executor.submit(2, job, db_id=10) == 'merged'
+    time.sleep(0.1)
+    assert sorted(started) == [1, 3]
+    assert executor.task_state(2)['state'] == 'queued'
+    release.set()
+    for _ in range(50):
+        if executor.status()['running'] == 0 and not executor.status()['queued']:
+            break
+        time.sleep(0.02)
+    assert sorted(started) == [1, 2, 3]
+
+
+def test_acquire_db_shares_limit_and_times_out():
+    executor = TaskExecutor(per_db_limit=1)
+    assert executor.acquire_db(10, timeout=0)
+    assert not executor.acquire_db(10, timeout=0)
+    assert not executor.acquire_db(10, timeout=0.05)
+    assert executor.status()['databases'] == [{'db_id': 10, 'running': 1, 'queued': 0, 'limit': 1}]
+    threading.Timer(0.05, executor.release_db, args=(10,)).start()
+    assert executor.acquire_db(10, timeout=2)
+    executor.release_db(10)
+    assert executor.status()['databases'] == []
+
+
+def test_fanout_reports_targets_without_slot(app, add_database, monkeypatch):
+    from app.utils import fanout
+
+    executor = TaskExecutor(per_db_limit=1)
+    monkeypatch.setattr(fanout, 'task_executor', executor)
+    busy, free = add_database('busy'), add_database('free')
+    # busy 的名额被单库任务占满，不能阻塞共享线程池，超时后记为失败
+    assert executor.acquire_db(busy.id)
+    runner = FanOutRunner(max_workers=1, slot_timeout=0.3)
+    result = runner.run(app, [busy, free], 'SELECT 1 AS x', task_slots=True)
+
+    assert result['status'] == 'partial'
+    by_name = {t['name']: t for t in result['targets']}
+    assert by_name['free']['status'] == 'success'
+    assert by_name['busy']['status'] == 'error'
+    assert 'waiting for a task slot' in by_name['busy']['error']
+    assert result['rows'] == [['free', 1]]
+    # free 的名额在执行完成后（future 回调中）释放，busy 仍由原持有者占用
+    for _ in range(50):
+        if len(executor.status()['databases']) == 1:
+            break
+        time.sleep(0.02)
+    assert executor.status()['databases'] == [{'db_id': busy.id, 'running': 1, 'queued': 0, 'limit': 1}]
@@ -0,0 +1,96 @@
+import base64
+import json
+from array import array
+from datetime import date
+from decimal import Decimal
+
+from app.utils.wire_format import SAFE_INT, dumps, encode_column, to_columnar
+
+
+def decode(column):
+    """按前端 decodeResult() 的规则还原一列"""
+    encoding = column['encoding']
+    if encoding == 'typed':
+        typecode = 'i' if column['type'] == 'int32' else 'd'
+        values = list(array(typecode, base64.b64decode(column['data'])))
+    elif encoding == 'dict':
+        codes = array('i', base64.b64decode(column['data']))
+        values = [None if c < 0 else column['dictionary'][c] for c in codes]
+    else:
+        values = list(column['data'])
+    for i in column.get('nulls', []):
+        values[i] = None
+    return values
+
+
+def test_small_ints_use_int32():
+    column = encode_column('id', [1, None, -5])
+    assert column['type'] == 'int32'
+    assert decode(column) == [1, None, -5]
+
+
+def test_ints_within_safe_range_use_float64():
+    values = [2 ** 40, -(2 ** 52)]
+    column = encode_column('id', values)
+    assert column['type'] == 'float64'
+    assert decode(column) == values
+
+
+def test_ints_beyond_safe_range_are_sent_as_strings():
+    values = [2 ** 60 + 1, 1, None]
+    column = encode_column('id', values)
+    assert column['type'] == 'string'
+    assert decode(column) == [str(2 ** 60 + 1), '1', None]
+
+
+def test_mixed_int_and_float_beyond_safe_range_are_sent_as_strings():
+    column = encode_column('v', [SAFE_INT + 1, 1.5])
+    assert column['type'] == 'string'
+
+
+def test_precise_decimals_stay_strings():
+    column = encode_column('amount', [Decimal('1234567890.1234567'), Decimal('1.5')])
+    assert column['type'] == 'string'
+    assert decode(column) == ['1234567890.1234567', '1.5']
+
+
+def test_short_decimals_use_float64():
+    column = encode_column('amount', [Decimal('1.25'), None])
+    assert column['type'] == 'float64'
+    assert decode(column) == [1.25, None]
+
+
+def test_bools_are_not_numbers():
+    column = encode_column('flag', [True, False, None])
+    assert column['type'] == 'bool'
+    assert decode(column) == [True, False, None]
+
+
+def test_repeated_strings_use_dictionary():
+    values = ['a', 'b', 'a', 'a', None, 'b']
+    column = encode_column('s', values)
+    assert column['encoding'] == 'dict'
+    assert decode(column) == values
+
+
+def test_dates_are_iso_strings():
+    column = encode_column('d', [date(2024, 1, 2), date(2024, 1, 3)])
+    assert decode(column) == ['2024-01-02', '2024-01-03']
+
+
+def test_to_columnar_round_trip():
+    result = {'status': 'success', 'columns': ['id', 'name'], 'rows': [[1, 'x'], [2 ** 60, 'y']]}
+    payload = to_columnar(result)
+    assert payload['format'] == 'columnar'
+    assert payload['count'] == 2
+    assert 'rows' not in payload
+    assert [decode(v) for v in payload['vectors']] == [['1', str(2 ** 60)], ['x', 'y']]
+
+
+def test_dumps_handles_non_native_values():
+    payload = json.loads(dumps({'d': date(2024, 1, 2), 'n': Decimal('1.10'), 'b': b'\x01'}))
+    assert payload == {'d': '2024-01-02', 'n': '1.10', 'b': '01'}
+
+
+def test_dumps_falls_back_for_ints_beyond_64_bits():
+    assert json.loads(dumps({'v': 2 ** 70})) == {'v': 2 ** 70}